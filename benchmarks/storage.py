@@ -0,0 +1,119 @@
+"""
+Row storage vs columnar storage on a synthetic ledger.
+
+    python -m lipafast.benchmarks.storage [rows]
+
+Rows are loaded from JSON, as on startup. Reports the memory held by each
+table (tracemalloc) and the time of a few typical scans, best of three runs;
+columnar scans run in batches (db/vector.py), with and without NumPy.
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from lipafast.db import vector
+from lipafast.db.aggregate import group_rows
+from lipafast.db.table import Table
+from lipafast.db.predicate import Predicate
+from lipafast.parser.where import parse_where
+
+COLUMNS = {
+    "transaction_id": int,
+    "wallet_id": int,
+    "owner": str,
+    "amount": float,
+    "direction": str,
+    "timestamp": str,
+}
+
+
+def ledger_rows(n, seed=7):
+    rnd = random.Random(seed)
+    for i in range(n):
+        wallet = rnd.randrange(500)
+        yield {
+            "transaction_id": i + 1,
+            "wallet_id": wallet,
+            "owner": f"driver-{wallet}",
+            "amount": rnd.randint(1, 50000) / 100,
+            "direction": rnd.choice(("debit", "credit")),
+            "timestamp": f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} "
+                         f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}",
+        }
+
+
+def build(storage, payload):
+    gc.collect()
+    tracemalloc.start()
+    table = Table("ledger", COLUMNS, primary_key="transaction_id", storage=storage)
+    table.insert_many(json.loads(payload), log=False)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return table, size
+
+
+def best(fn, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+REPORT = "direction = 'debit' AND timestamp BETWEEN '2026-03-01' AND '2026-05-31 23:59:59'"
+
+
+def scans(table):
+    debit = Predicate(parse_where("direction = 'debit' AND amount > 250"), table.columns)
+    report = Predicate(parse_where(REPORT), table.columns)
+    total = [{"func": "SUM", "column": "amount", "alias": "total"}]
+    keys = random.Random(1).sample(range(1, len(table.rows) + 1), min(10000, len(table.rows)))
+    return {
+        "filter scan": lambda: sum(1 for _ in table.scan(debit)),
+        "SUM(amount) debit in quarter": lambda: list(group_rows(table, total, predicate=report)),
+        "SUM(amount) row at a time": lambda: sum(r["amount"] for r in table.rows),
+        "10k primary key finds": lambda: [table.find("transaction_id", k) for k in keys],
+    }
+
+
+def main(n):
+    payload = json.dumps(list(ledger_rows(n)))
+    results = {}
+    for storage in ("rows", "columnar"):
+        table, size = build(storage, payload)
+        table.create_index("timestamp", kind="sorted")  # as on the ledger
+        timings = {name: best(fn) for name, fn in scans(table).items()}
+        if storage == "columnar":
+            amount = table._store.columns["amount"].data
+            timings["SUM(amount) one column"] = best(lambda: sum(amount))
+            if vector.np is not None:
+                numpy, vector.np = vector.np, None
+                for name, fn in scans(table).items():
+                    if name.startswith(("filter", "SUM")):
+                        timings[name + ", no NumPy"] = best(fn)
+                vector.np = numpy
+            print("columnar encodings:", table._store.stats()["columns"])
+        results[storage] = (size, timings)
+        del table
+        gc.collect()
+
+    rows_size, rows_t = results["rows"]
+    col_size, col_t = results["columnar"]
+    print(f"\n{n:,} ledger rows")
+    print(f"{'':40}{'rows':>12}{'columnar':>12}{'ratio':>8}")
+    print(f"{'memory (MB)':40}{rows_size / 1e6:12.1f}{col_size / 1e6:12.1f}{rows_size / col_size:8.2f}x")
+    for name in col_t:
+        r, c = rows_t.get(name.replace(", no NumPy", "")), col_t[name]
+        if r is None:
+            print(f"{name + ' (ms)':40}{'-':>12}{c * 1e3:12.1f}")
+        else:
+            print(f"{name + ' (ms)':40}{r * 1e3:12.1f}{c * 1e3:12.1f}{r / c:8.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
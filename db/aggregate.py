@@ -0,0 +1,330 @@
+import re
+
+from .vector import BatchScan, prefers_batches
+
+MATERIALIZABLE = ("SUM", "COUNT")
+
+
+class MaterializedAggregate:
+    """
+    A running SUM/COUNT over the rows of one table, optionally restricted to
+    rows matching an equality filter such as {"direction": "debit"}. The table
+    calls add/remove on every mutation, so reading the value is O(1).
+    """
+
+    def __init__(self, name, func, column=None, where=None):
+        func = func.upper()
+        if func not in MATERIALIZABLE:
+            raise ValueError(f"Only {', '.join(MATERIALIZABLE)} can be materialized, got {func}")
+        if func == "SUM" and column is None:
+            raise ValueError("SUM needs a column")
+
+        self.name = name
+        self.func = func
+        self.column = column
+        self.where = dict(where or {})
+        self.total = 0
+        self.count = 0  # rows contributing a non-NULL value
+        self.deltas = []  # [version, total delta, count delta] kept for snapshot readers
+
+    def _matches(self, row):
+        return all(row.get(k) == v for k, v in self.where.items())
+
+    def contribution(self, row):
+        """What `row` adds to the total, or None when it does not count."""
+        if not self._matches(row):
+            return None
+        value = 1 if self.column is None else row.get(self.column)
+        if value is None:
+            return None
+        return 1 if self.func == "COUNT" else value
+
+    # add/remove return the (total, count) delta they applied, or None
+    def add(self, row):
+        delta = self.contribution(row)
+        if delta is None:
+            return None
+        self.count += 1
+        self.total += delta
+        return delta, 1
+
+    def remove(self, row):
+        delta = self.contribution(row)
+        if delta is None:
+            return None
+        self.count -= 1
+        self.total -= delta
+        return -delta, -1
+
+    def depends_on(self, columns):
+        return self.column in columns or any(c in self.where for c in columns)
+
+    def build(self, rows):
+        self.total = self.count = 0
+        for r in rows:
+            self.add(r)
+
+    # SQL semantics: SUM over no rows is NULL, COUNT is 0
+    @property
+    def value(self):
+        if self.func == "SUM" and self.count == 0:
+            return None
+        return self.total
+
+    def value_at(self, snapshot):
+        """The value `snapshot` sees: newer or uncommitted deltas are backed out."""
+        total, count = self.total, self.count
+        for version, d_total, d_count in self.deltas:
+            if snapshot.hides(version):
+                total -= d_total
+                count -= d_count
+        if self.func == "SUM" and count == 0:
+            return None
+        return total
+
+    def to_dict(self):
+        return {"name": self.name, "func": self.func, "column": self.column, "where": self.where}
+
+
+def equality_filter(node):
+    """WHERE tree -> {col: value} when it is only `col = literal` terms joined by AND."""
+    if node is None:
+        return {}
+    terms = node[1] if node[0] == "and" else [node]
+    result = {}
+    for term in terms:
+        if term[0] != "cmp" or term[1] != "=" or term[2][0] != "col" or term[3][0] != "lit":
+            return None
+        result[term[2][1].rsplit(".", 1)[-1]] = term[3][1]
+    return result
+
+
+# ---------------- GROUP BY ----------------
+AGGREGATE_FUNCS = ("SUM", "COUNT", "AVG", "MIN", "MAX")
+DATE_RE = re.compile(r'DATE\((\w+)\)$')
+
+
+def group_column(expr):
+    """Table column a GROUP BY expression reads: `wallet_id` or `DATE(timestamp)`."""
+    match = DATE_RE.match(expr)
+    return match.group(1) if match else expr
+
+
+def group_getter(expr):
+    match = DATE_RE.match(expr)
+    if match:
+        # timestamps are stored as 'YYYY-MM-DD HH:MM:SS' strings
+        name = match.group(1)
+        return lambda row: None if (v := row.get(name)) is None else str(v)[:10]
+    return lambda row: row.get(expr)
+
+
+def _updater(func, column):
+    """Per-row update for one aggregate; state is [non-NULL count, running value]."""
+    if column is None:  # COUNT(*)
+        def update(state, row):
+            state[0] += 1
+    elif func == "COUNT":
+        def update(state, row):
+            if row.get(column) is not None:
+                state[0] += 1
+    elif func in ("SUM", "AVG"):
+        def update(state, row):
+            value = row.get(column)
+            if value is not None:
+                state[0] += 1
+                state[1] += value
+    elif func == "MIN":
+        def update(state, row):
+            value = row.get(column)
+            if value is not None:
+                if state[0] == 0 or value < state[1]:
+                    state[1] = value
+                state[0] += 1
+    else:
+        def update(state, row):
+            value = row.get(column)
+            if value is not None:
+                if state[0] == 0 or value > state[1]:
+                    state[1] = value
+                state[0] += 1
+    return update
+
+
+def _accumulate(states, updaters, row):
+    for state, update in zip(states, updaters):
+        update(state, row)
+
+
+def _result(func, state):
+    count, value = state
+    if func == "COUNT":
+        return count
+    if count == 0:
+        return None
+    return value / count if func == "AVG" else value
+
+
+def _indexed_groups(table, group_by, specs, skip=None):
+    """
+    Groups straight from a secondary index on the GROUP BY column: one bucket
+    per group. Rows whose id is in `skip` are left out.
+    """
+    index = table.indexes[group_by[0]]
+    if index.kind == "sorted":
+        keys = list(index.keys) + ([None] if None in index.buckets else [])
+    else:
+        keys = list(index.buckets)
+
+    skipped = {}
+    for row in (skip or {}).values():
+        value = row.get(index.column)
+        if id(row) in index.buckets.get(value, ()):
+            skipped[value] = skipped.get(value, 0) + 1
+
+    count_only = all(func == "COUNT" and column is None for func, column in specs)
+    for key in keys:
+        bucket = index.buckets.get(key)
+        if not bucket or len(bucket) == skipped.get(key, 0):
+            continue
+        if count_only:
+            yield (key,), [[len(bucket) - skipped.get(key, 0), 0] for _ in specs]
+            continue
+        states = [[0, 0] for _ in specs]
+        updaters = [_updater(func, column) for func, column in specs]
+        for row in bucket.values():
+            if not skip or id(row) not in skip:
+                _accumulate(states, updaters, row)
+        yield (key,), states
+
+
+def _snapshot_groups(table, group_by, specs, snapshot):
+    # rows with no MVCC history are the same in every open snapshot: group them
+    # off the index, then fold in the snapshot images of the changed ones
+    with table._lock:
+        changed = {id(row): row for row, _ in table._history.values()}
+        groups = dict(_indexed_groups(table, group_by, specs, changed))
+        images = [snapshot.view(table, row) for row in changed.values()]
+    return _scanned_groups((r for r in images if r is not None), group_by, specs, groups)
+
+
+def _scanned_groups(rows, group_by, specs, groups=None):
+    getters = [group_getter(expr) for expr in group_by]
+    updaters = [_updater(func, column) for func, column in specs]
+    groups = {} if groups is None else groups
+    for row in rows:
+        key = tuple(get(row) for get in getters)
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = [[0, 0] for _ in specs]
+        _accumulate(states, updaters, row)
+    return groups.items()
+
+
+def _merge(func, state, count, value):
+    """Fold a batch's partial (count, value) into a [count, value] state."""
+    if not count:
+        return
+    if func in ("MIN", "MAX"):
+        if state[0]:
+            value = min(state[1], value) if func == "MIN" else max(state[1], value)
+    else:
+        value += state[1]
+    state[0] += count
+    state[1] = value
+
+
+def _batch_names(group_by, specs):
+    return list(dict.fromkeys([group_column(expr) for expr in group_by] + [c for _, c in specs if c is not None]))
+
+
+def _batch_groups(scan, group_by, specs):
+    # columnar tables: the WHERE clause and the aggregates run a batch of
+    # column values at a time (db/vector.py); GROUP BY on one INT / STR column
+    # is grouped per batch too when NumPy is installed, anything else folds
+    # the selected rows through _scanned_groups
+    names = _batch_names(group_by, specs)
+    groups = {}
+    if not group_by:
+        states = groups[()] = [[0, 0] for _ in specs]
+        for batch in scan:
+            for (func, column), state in zip(specs, states):
+                _merge(func, state, *(batch.reduce(func, column) if column else (batch.count(), 0)))
+        return _scanned_groups(scan.images, group_by, specs, groups)
+
+    direct = len(group_by) == 1 and group_by[0] in scan.table.columns
+    for batch in scan:
+        partial = batch.group_reduce(group_by[0], specs) if direct else None
+        if partial is None:
+            _scanned_groups(batch.records(names), group_by, specs, groups)
+            continue
+        for key, results in partial.items():
+            states = groups.get((key,))
+            if states is None:
+                states = groups[(key,)] = [[0, 0] for _ in specs]
+            for (func, _), state, result in zip(specs, states, results):
+                _merge(func, state, *result)
+    return _scanned_groups(scan.images, group_by, specs, groups)
+
+
+def group_rows(table, items, group_by=None, predicate=None, having=None, extra=(), snapshot=None):
+    """
+    Evaluate a SELECT list of aggregates (and GROUP BY expressions) in a single
+    streaming pass over the table, over the buckets of a secondary index on
+    the grouping column when there is no WHERE clause, or in column batches
+    for a columnar table. Rows are never copied;
+    each group only holds a [count, value] pair per aggregate.
+
+    `items` are the parsed select items ({'func', 'column', 'alias'}, with
+    func None for a grouping expression), `extra` holds aggregates referenced
+    only by HAVING, and `having` is a compiled Predicate over the output row.
+    With a snapshot, rows are read as of that snapshot.
+    """
+    group_by = group_by or []
+    aggregates = [i for i in items if i["func"] is not None] + list(extra)
+    specs = [(a["func"], a["column"]) for a in aggregates]
+
+    for expr in group_by:
+        if group_column(expr) not in table.columns:
+            raise ValueError(f"Unknown column '{group_column(expr)}' for table '{table.name}'")
+    for func, column in specs:
+        if column is not None and column not in table.columns:
+            raise ValueError(f"Unknown column '{column}' for table '{table.name}'")
+
+    count_only = all(func == "COUNT" and column is None for func, column in specs)
+    indexed = (
+        predicate is None and len(group_by) == 1 and group_by[0] in table.indexes
+        and (table._store is None or count_only)
+    )
+    if indexed or prefers_batches(table, predicate):
+        # the live rows and the sealed partitions are picked under one latch
+        # hold: a seal moves rows from one to the other
+        with table._lock:
+            sealed = table._sealed_keys()
+            if not indexed:
+                scan = BatchScan(table, predicate, _batch_names(group_by, specs), snapshot)
+            elif snapshot is None:
+                groups = list(_indexed_groups(table, group_by, specs))
+            else:
+                groups = _snapshot_groups(table, group_by, specs, snapshot)
+        if not indexed:
+            groups = _batch_groups(scan, group_by, specs)
+    else:
+        groups = _scanned_groups(table.scan(predicate, snapshot=snapshot), group_by, specs)
+        sealed = []  # Table.scan reads the sealed partitions too
+    if sealed:
+        # sealed partitions are outside the live indexes and column store (db/partition.py)
+        groups = _scanned_groups(table.partitions.scan(predicate, keys=sealed), group_by, specs, dict(groups))
+    if not group_by and not groups:
+        # aggregates without GROUP BY always produce one row
+        groups = [((), [[0, 0] for _ in specs])]
+
+    positions = {expr: i for i, expr in enumerate(group_by)}
+    for key, states in groups:
+        values = {a["alias"]: _result(a["func"], s) for a, s in zip(aggregates, states)}
+        out = {}
+        for item in items:
+            out[item["alias"]] = values[item["alias"]] if item["func"] else key[positions[item["column"]]]
+        if having is not None and not having.test({**values, **out}):
+            continue
+        yield out
@@ -0,0 +1,78 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from .predicate import check_type
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "ndjson"}
+
+
+def _csv_rows(path, table):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [h.strip() for h in header]
+        for col in header:
+            if col not in table.columns:
+                raise ValueError(f"Unknown column '{col}' for table '{table.name}'")
+
+        converters = [(col, table.columns[col]) for col in header]
+        for line_no, values in enumerate(reader, start=2):
+            if not values:
+                continue
+            if len(values) != len(converters):
+                raise ValueError(f"{path}:{line_no}: expected {len(converters)} values, got {len(values)}")
+            row = {}
+            for (col, col_type), raw in zip(converters, values):
+                if raw == "":
+                    row[col] = None
+                    continue
+                try:
+                    row[col] = col_type(raw)
+                except ValueError:
+                    raise TypeError(f"{path}:{line_no}: column '{col}' expects type {col_type.__name__}, got {raw!r}")
+            yield row
+
+
+def _ndjson_rows(path, table):
+    columns = table.columns
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            for col, value in row.items():
+                if col not in columns:
+                    raise ValueError(f"{path}:{line_no}: unknown column '{col}' for table '{table.name}'")
+                row[col] = check_type(col, columns[col], value)
+            yield row
+
+
+def copy_from(table, path, fmt=None):
+    """
+    Bulk-load a CSV (with header) or NDJSON file into `table` as one batch:
+    rows are type-checked in a single pass, indexes are updated once, and the
+    batch is logged as one insert_many WAL record instead of one per row, so
+    recovery and replicas replay it like any other write.
+    """
+    path = Path(path)
+    fmt = (fmt or FORMATS.get(path.suffix.lower(), "")).lower()
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Unknown COPY format for '{path}'. Expected CSV or NDJSON")
+
+    start = time.perf_counter()
+    reader = _csv_rows if fmt == "csv" else _ndjson_rows
+    rows = list(reader(path, table))
+
+    count = table.insert_many(rows)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_affected": count,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(count / elapsed) if elapsed else count,
+    }
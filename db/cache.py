@@ -0,0 +1,86 @@
+"""
+Result cache for repeated reads of unchanged tables.
+
+Every table carries `version`: the commit timestamp of the last published
+change to it (db/mvcc.py stamps it when a statement or transaction
+commits). A cached result is stored under its statement key together with
+the versions of the tables it read; a lookup whose tables still have those
+versions is a hit, any commit to one of them turns the next lookup into a
+miss that recomputes and replaces the entry. Nothing has to be invalidated
+explicitly, and a hit costs one dict lookup.
+
+Versions are read before the reader takes its snapshot, so an entry can
+only ever be newer than its key, never older. Reads inside a transaction
+see their own uncommitted writes and bypass the cache.
+
+Entries are kept in LRU order within `max_bytes`, estimated from the
+result's rows. Cached results are shared: callers must not modify them.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+
+def _size(value):
+    """Rough bytes held by a result: the container plus every row and value in it."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, enabled=True):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries = OrderedDict()  # key -> (table versions, result, size), least recently used first
+        self._bytes = 0
+        self._mutex = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def cached(self, db, key, tables, compute):
+        """`compute()`'s result for `key` over `tables`, reused while none of them has changed."""
+        if not self.enabled or db.versions.current() is not None:
+            return compute()
+        versions = tuple(table.version for table in tables)
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = compute()
+        size = _size(result)
+        with self._mutex:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (versions, result, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._mutex:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
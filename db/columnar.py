@@ -0,0 +1,261 @@
+from array import array
+
+# dictionary-encoded string columns fall back to a plain list past this many
+# distinct values (codes are unsigned 16-bit; 0 stands for NULL)
+DICT_LIMIT = 0xFFFF
+
+
+class TypedColumn:
+    """INT / FLOAT values unboxed in an array('q') / array('d'); NULL slots are kept in a set."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.encoding = "int64" if kind is int else "float64"
+        self.data = array("q" if kind is int else "d")
+        self.nulls = set()
+
+    def fits(self, value):
+        if value is None:
+            return True
+        if type(value) is not self.kind:
+            return False  # e.g. bool in an INT column keeps its type in a plain list
+        return self.kind is float or -(1 << 63) <= value < (1 << 63)
+
+    def fits_all(self, values):
+        return all(map(self.fits, values))
+
+    def get(self, slot):
+        if self.nulls and slot in self.nulls:
+            return None
+        return self.data[slot]
+
+    def set(self, slot, value):
+        if value is None:
+            self.data[slot] = 0
+            self.nulls.add(slot)
+        else:
+            self.data[slot] = value
+            self.nulls.discard(slot)
+
+    def extend(self, values):
+        start = len(self.data)
+        if None in values:
+            self.nulls.update(start + i for i, v in enumerate(values) if v is None)
+            values = [0 if v is None else v for v in values]
+        self.data.extend(values)
+
+    def values(self):
+        values = self.data.tolist()
+        for slot in self.nulls:
+            values[slot] = None
+        return values
+
+
+class DictColumn:
+    """Low-cardinality strings (`direction`, `status`): one code per row, each distinct value stored once."""
+
+    encoding = "dict"
+
+    def __init__(self):
+        self.codes = array("H")
+        self.dictionary = [None]
+        self.lookup = {None: 0}
+
+    def fits(self, value):
+        if value is None or value in self.lookup:
+            return True
+        return type(value) is str and len(self.dictionary) <= DICT_LIMIT
+
+    def fits_all(self, values):
+        new = set(values).difference(self.lookup)
+        return all(type(v) is str for v in new) and len(self.dictionary) + len(new) <= DICT_LIMIT + 1
+
+    def _code(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+    def get(self, slot):
+        return self.dictionary[self.codes[slot]]
+
+    def set(self, slot, value):
+        self.codes[slot] = self._code(value)
+
+    def extend(self, values):
+        self.codes.extend(map(self._code, values))
+
+    def values(self):
+        return list(map(self.dictionary.__getitem__, self.codes))
+
+
+class ObjectColumn:
+    """Anything else (high-cardinality strings, mixed types): a plain list."""
+
+    encoding = "object"
+
+    def __init__(self, values=()):
+        self.data = list(values)
+
+    def fits(self, value):
+        return True
+
+    def fits_all(self, values):
+        return True
+
+    def get(self, slot):
+        return self.data[slot]
+
+    def set(self, slot, value):
+        self.data[slot] = value
+
+    def extend(self, values):
+        self.data.extend(values)
+
+    def values(self):
+        return list(self.data)
+
+
+def make_column(col_type):
+    if col_type in (int, float):
+        return TypedColumn(col_type)
+    if col_type is str:
+        return DictColumn()
+    return ObjectColumn()
+
+
+class Row:
+    """
+    A stored row of a columnar table: only its slot number, while the values
+    live in the columns of its store. It behaves like the row dicts of the
+    default storage (get / [] / update / dict(row) / {**row}) and, like them,
+    compares by identity. A deleted row keeps its slot and values, so undo
+    logs and snapshot readers still holding it can read it or put it back.
+
+    Each ColumnStore makes its own subclass carrying `_store`.
+    """
+
+    __slots__ = ("_slot",)
+    _store = None
+
+    def __init__(self, slot):
+        self._slot = slot
+
+    def __getitem__(self, name):
+        column = self._store.columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        return column.get(self._slot)
+
+    def get(self, name, default=None):
+        column = self._store.columns.get(name)
+        return default if column is None else column.get(self._slot)
+
+    def __setitem__(self, name, value):
+        self._store.set(self._slot, name, value)
+
+    def update(self, values=(), **more):
+        for name, value in dict(values, **more).items():
+            self._store.set(self._slot, name, value)
+
+    def setdefault(self, name, default=None):
+        return self.get(name, default)  # every column is always present
+
+    def __contains__(self, name):
+        return name in self._store.columns
+
+    def keys(self):
+        return list(self._store.columns)
+
+    def __iter__(self):
+        return iter(self._store.columns)
+
+    def __len__(self):
+        return len(self._store.columns)
+
+    def values(self):
+        return [column.get(self._slot) for column in self._store.columns.values()]
+
+    def items(self):
+        slot = self._slot
+        return [(name, column.get(slot)) for name, column in self._store.columns.items()]
+
+    def copy(self):
+        slot = self._slot
+        return {name: column.get(slot) for name, column in self._store.columns.items()}
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class ColumnStore:
+    """
+    Column-at-a-time storage behind Table(storage="columnar"). Each column is
+    kept in a typed array (INT / FLOAT), a dictionary-encoded array (STR) or a
+    plain list, indexed by slot. A column that meets a value it cannot encode
+    (a bool in an INT column, too many distinct strings) is converted to a
+    plain list once.
+
+    Slots are never reused: deleted rows stay readable for rollbacks and older
+    snapshots, and their space is reclaimed when the table is next loaded from
+    a checkpoint. Columnar storage suits append-mostly tables like the ledger.
+    """
+
+    def __init__(self, columns):
+        self.columns = {name: make_column(col_type) for name, col_type in columns.items()}
+        self.row_type = type("Row", (Row,), {"__slots__": (), "_store": self})
+        self.by_slot = []  # slot -> Row, None once deleted
+        self.deleted = set()
+
+    def attach(self, row):
+        """Store `row` (a dict, or a deleted Row being put back) and return the live Row."""
+        if isinstance(row, self.row_type):
+            self.by_slot[row._slot] = row
+            self.deleted.discard(row._slot)
+            return row
+        return self.attach_many([row])[0]
+
+    def attach_many(self, rows):
+        """Append a batch of row dicts one column at a time; returns their Rows."""
+        start = len(self.by_slot)
+        for name in self.columns:
+            self._extend(name, [r.get(name) for r in rows])
+        stored = list(map(self.row_type, range(start, start + len(rows))))
+        self.by_slot.extend(stored)
+        return stored
+
+    def detach(self, row):
+        self.by_slot[row._slot] = None
+        self.deleted.add(row._slot)
+
+    def set(self, slot, name, value):
+        column = self.columns.get(name)
+        if column is None:
+            raise ValueError(f"Unknown column '{name}'")
+        if not column.fits(value):
+            column = self._plain(name)
+        column.set(slot, value)
+
+    def _extend(self, name, values):
+        column = self.columns[name]
+        if not column.fits_all(values):
+            column = self._plain(name)
+        column.extend(values)
+
+    def _plain(self, name):
+        column = self.columns[name] = ObjectColumn(self.columns[name].values())
+        return column
+
+    def __len__(self):
+        return len(self.by_slot) - len(self.deleted)
+
+    def stats(self):
+        return {
+            "rows": len(self),
+            "slots": len(self.by_slot),
+            "columns": {
+                name: column.encoding + (f"({len(column.dictionary) - 1})" if column.encoding == "dict" else "")
+                for name, column in self.columns.items()
+            },
+        }
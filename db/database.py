@@ -1,44 +1,372 @@
+import atexit
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from .table import Table
+from .locks import LockManager
+from .transaction import Transaction
+from .mvcc import VersionManager
+from .cache import ResultCache
+from .query import join
+from .wal import WriteAheadLog, Checkpointer
+from .snapfile import SnapshotFile, write as write_snapshot
+
+SNAPSHOT_FORMATS = ("binary", "json")
+
+
+class Catalog(dict):
+    """
+    name -> Table. Tables of a binary snapshot are entered as None and
+    decoded, with their indexes, the first time they are looked up.
+    Membership, len() and iterating names never load a table.
+    """
+
+    def __init__(self, load):
+        super().__init__()
+        self._load = load
+
+    def __getitem__(self, name):
+        table = super().__getitem__(name)
+        return table if table is not None else self._load(name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def entries(self):
+        """name -> Table, or None for a table still in the snapshot file."""
+        return dict(super().items())
+
 
 class Database:
-    def __init__(self, path="data/db.json"):
+    read_only = False  # see db/replica.py
+
+    def __init__(
+        self,
+        path="data/db.json",
+        fsync="commit",
+        batch_window=0.005,
+        max_batch=256,
+        checkpoint_interval=5.0,
+        checkpoint_bytes=4 * 1024 * 1024,
+        snapshot_format="binary",
+        shard=(0, 1),
+    ):
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(
+                f"Unknown snapshot format '{snapshot_format}'. Expected one of: {', '.join(SNAPSHOT_FORMATS)}"
+            )
         self.path = Path(path)
-        self.tables = {}
+        self.shard = shard  # (index, count) when this database is one shard of a cluster (db/shard.py)
+        # "binary" checkpoints go to db.snap next to db.json (db/snapfile.py)
+        self.snapshot_format = snapshot_format
+        self.snap_path = self.path.with_suffix(".snap")
+        self._snapfile = None  # the open binary snapshot tables are loaded from
+        self._load_lock = threading.Lock()
+        self.tables = Catalog(self._load_table)
+        self.lock = threading.RLock()  # catalog: the tables dict and checkpoints
+        self.locks = LockManager()  # per-table latches and per-row locks
+        self.versions = VersionManager()  # snapshot reads
+        self.results = ResultCache()  # SELECT results of unchanged tables
+        self._local = threading.local()  # the open Transaction of each thread
+        self._txn_state = threading.Condition()
+        self._open_txns = 0
+        self._checkpointing = 0
+        self.wal = WriteAheadLog(
+            self.path.with_suffix(".wal"),
+            fsync=fsync,
+            batch_window=batch_window,
+            max_batch=max_batch,
+        )
+        self._recovering = False
+        self.replication = None  # its ReplicationServer, or the Replica itself (db/replica.py)
         self._load()
 
+        self._checkpointer = Checkpointer(self, interval=checkpoint_interval, max_bytes=checkpoint_bytes)
+        self._checkpointer.start()
+        atexit.register(self.close)
+
     def _load(self):
-        if self.path.exists():
+        snapshot_lsn = 0
+        if self.snap_path.exists():
+            # only the header index is read here; tables load on first use
+            self._snapfile = SnapshotFile(self.snap_path)
+            snapshot_lsn = self._snapfile.lsn
+            for name in self._snapfile.segments:
+                dict.__setitem__(self.tables, name, None)
+        elif self.path.exists():
             raw = json.loads(self.path.read_text())
+            # Older files are a bare {table: data} mapping without a checkpoint LSN
+            if isinstance(raw.get("lsn"), int) and "tables" in raw:
+                snapshot_lsn = raw["lsn"]
+                raw = raw["tables"]
             for name, table_data in raw.items():
                 self.tables[name] = Table.from_dict(table_data, self)
 
-    def save(self):
-        data = {name: t.to_dict() for name, t in self.tables.items()}
-        self.path.parent.mkdir(exist_ok=True)
-        self.path.write_text(json.dumps(data, indent=2))
+        # Replay whatever was logged after the snapshot was taken
+        self._recovering = True
+        try:
+            for record in self.wal.recover():
+                if record["lsn"] > snapshot_lsn:
+                    self._apply(record)
+        finally:
+            self._recovering = False
 
-    def create_table(self, name, columns, primary_key=None, unique_keys=None):
-        if name in self.tables:
+        self.wal.open(snapshot_lsn)
+
+    def _load_table(self, name):
+        with self._load_lock:
+            table = self.tables.entries()[name]
+            if table is None:
+                schema, columns, count = self._snapfile.read_table(name)
+                table = Table.from_columns(schema, columns, count, self)
+                dict.__setitem__(self.tables, name, table)
+            return table
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "txn":
+            for inner in record["records"]:
+                self._apply(inner)
             return
-        
-        self.tables[name] = Table(name, columns, self, primary_key=primary_key, unique_keys=unique_keys)
-        self.save()
+        if op == "create_table":
+            self.tables[record["table"]] = Table.from_dict(record["schema"], self)
+            self.results.clear()  # the new table starts again at version 0
+            return
+
+        table = self.tables[record["table"]]
+        if op == "insert":
+            table.insert(record["row"])
+        elif op == "insert_many":
+            table.insert_many(record["rows"])
+        elif op == "update":
+            table._update_row(table._locate(record["key"]), record["set"])
+        elif op == "delete":
+            table._delete_row(table._locate(record["key"]))
+        elif op == "create_aggregate":
+            spec = record["spec"]
+            table.create_aggregate(spec["name"], spec["func"], spec["column"], spec["where"])
+        elif op == "create_index":
+            table.create_index(record["column"], kind=record["kind"], name=record["name"])
+        elif op == "partition_by":
+            spec = record["spec"]
+            table.partition_by(spec["column"], spec["interval"], spec["width"], spec["keep"])
+        elif op == "seal":
+            table._apply_seal(record["partition"])
+        else:
+            raise ValueError(f"Unknown WAL record type: {op}")
+
+    def log(self, record):
+        return self.wal.append(record)
+
+    # raises on a read-only replica; writes call it before changing anything
+    def check_writable(self):
+        pass
+
+    # everything committed up to `lsn` is visible here (a replica may have to wait)
+    def wait_for(self, lsn, timeout=None):
+        return True
+
+    @property
+    def visible_lsn(self):
+        return self.wal.lsn
+
+    # returns once the record is on disk (only blocks in fsync="group" mode)
+    def wait_durable(self, lsn):
+        self.wal.wait(lsn)
+
+    # group commit knobs: flush every `batch_window` seconds or `max_batch` records
+    @property
+    def batch_window(self):
+        return self.wal.batch_window
+
+    @batch_window.setter
+    def batch_window(self, seconds):
+        self.wal.batch_window = seconds
+
+    @property
+    def max_batch(self):
+        return self.wal.max_batch
+
+    @max_batch.setter
+    def max_batch(self, size):
+        self.wal.max_batch = size
+
+    def commit_stats(self):
+        return self.wal.stats.summary()
+
+    # ---------------- transactions ----------------
+    def begin(self, lock_timeout=5.0):
+        if self.current_transaction() is not None:
+            raise ValueError("A transaction is already open on this thread")
+        with self._txn_state:
+            while self._checkpointing:
+                self._txn_state.wait()
+            self._open_txns += 1
+        txn = self._local.txn = Transaction(self, lock_timeout)
+        return txn
+
+    # `with db.transaction():` commits on success and rolls back on an exception
+    transaction = begin
+
+    def current_transaction(self):
+        return getattr(self._local, "txn", None)
+
+    def after_commit(self, callback):
+        """Run `callback` once this thread's transaction commits, or now outside one; a rollback drops it."""
+        txn = self.current_transaction()
+        if txn is None:
+            callback()
+        else:
+            txn.on_commit.append(callback)
+
+    def commit(self):
+        txn = self.current_transaction()
+        if txn is None:
+            raise ValueError("No transaction is open")
+        txn.commit()
+
+    def rollback(self):
+        txn = self.current_transaction()
+        if txn is None:
+            raise ValueError("No transaction is open")
+        txn.rollback()
+
+    def _end_transaction(self, txn):
+        if self.current_transaction() is txn:
+            self._local.txn = None
+        with self._txn_state:
+            self._open_txns -= 1
+            self._txn_state.notify_all()
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.current_transaction().__exit__(exc_type, exc, tb)
+
+    # ---------------- snapshot reads ----------------
+    def snapshot(self):
+        """A consistent point-in-time view for readers; close it (or use `with`) when done."""
+        return self.versions.snapshot()
+
+    # checkpoint: seal cold partitions, write a full snapshot, then drop the WAL
+    # records it covers. Waits for open transactions so uncommitted changes
+    # never reach the snapshot.
+    def save(self):
+        with self._quiesced():
+            # tables still in the snapshot file have had no new rows to seal
+            for table in self.tables.entries().values():
+                if table is not None:
+                    table.seal_cold()
+            self._write_snapshot()
+
+    # no transaction open and none starting until the block ends
+    @contextmanager
+    def _quiesced(self):
+        if self.current_transaction() is not None:
+            raise ValueError("Cannot checkpoint inside a transaction")
+        with self._txn_state:
+            while self._open_txns:
+                self._txn_state.wait()
+            self._checkpointing += 1
+        try:
+            yield
+        finally:
+            with self._txn_state:
+                self._checkpointing -= 1
+                self._txn_state.notify_all()
+
+    def export(self):
+        """The whole database as a JSON snapshot ({"lsn", "tables"}) of one consistent moment; seeds replicas."""
+        with self._quiesced(), self.lock, self.locks.latches(list(self.tables)):
+            data = {"lsn": self.wal.lsn, "tables": {name: t.to_dict() for name, t in self.tables.items()}}
+            # serialized under the latches: row dicts keep changing once they are released
+            return json.dumps(data, separators=(",", ":"))
+
+    def _write_snapshot(self):
+        with self.lock, self.locks.latches(list(self.tables)):
+            self.path.parent.mkdir(exist_ok=True)
+            if self.snapshot_format == "binary":
+                self._write_binary()
+                stale = self.path
+            else:
+                self._write_json()
+                stale = self.snap_path
+            # the other format's file is now older than the checkpoint; don't load it next time
+            if stale.exists():
+                stale.unlink()
+            self.wal.truncate()
+
+    def _write_json(self):
+        data = {
+            "lsn": self.wal.lsn,
+            "tables": {name: t.to_dict() for name, t in self.tables.items()},
+        }
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, separators=(",", ":")))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._close_snapfile()
+
+    def _write_binary(self):
+        tmp = self.snap_path.with_suffix(".tmp")
+        with self._load_lock:
+            # tables never loaded are copied over as their raw segments
+            with open(tmp, "wb") as f:
+                write_snapshot(f, self.wal.lsn, self.tables.entries(), source=self._snapfile)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snap_path)
+            self._close_snapfile()
+            self._snapfile = SnapshotFile(self.snap_path)
+
+    def _close_snapfile(self):
+        if self._snapfile is not None:
+            self._snapfile.close()
+            self._snapfile = None
+
+    def close(self):
+        self._checkpointer.stop()
+        if self.wal._file:
+            # committed work is already in the WAL; an open transaction must not be snapshotted
+            if not self._open_txns:
+                self.save()
+            self.wal.close()
+        self._close_snapfile()
+
+    def create_table(self, name, columns, primary_key=None, unique_keys=None, storage="rows"):
+        self.check_writable()
+        with self.lock:
+            if name in self.tables:
+                return
+
+            table = Table(name, columns, self, primary_key=primary_key, unique_keys=unique_keys, storage=storage)
+            self.tables[name] = table
+            lsn = self.log({"op": "create_table", "table": name, "schema": table.to_dict()})
+        self.wait_durable(lsn)
 
 
     def t(self, name):
         return self.tables[name]
-    
-    
-    def join(self, left, right, on_left, on_right):
-        t1 = self.tables[left]
-        t2 = self.tables[right]
-        result = []
-
-        for r1 in t1.rows:
-            for r2 in t2.rows:
-                if r1[on_left] == r2[on_right]:
-                    result.append({**r1, **r2})
-
-        return result
\ No newline at end of file
+
+    def schema(self, name):
+        """Table.schema() of `name`; a table still in the snapshot file is read from its header, not loaded."""
+        with self._load_lock:
+            table = self.tables.entries()[name]
+            if table is None:
+                return self._snapfile.schema(name)
+        return table.schema()
+
+
+    def join(self, left, right, on_left, on_right, where=None, columns=None):
+        return list(join(self.tables[left], self.tables[right], on_left, on_right, where=where, columns=columns))
@@ -0,0 +1,123 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class HashIndex:
+    """Non-unique equality index: value -> rows holding that value."""
+
+    kind = "hash"
+
+    def __init__(self, name, column):
+        self.name = name
+        self.column = column
+        self.buckets = {}
+
+    def add(self, row):
+        self.buckets.setdefault(row.get(self.column), {})[id(row)] = row
+
+    def remove(self, row):
+        value = row.get(self.column)
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            return
+        bucket.pop(id(row), None)
+        if not bucket:
+            del self.buckets[value]
+
+    def lookup(self, value):
+        return list(self.buckets.get(value, {}).values())
+
+    def count(self, value):
+        return len(self.buckets.get(value, ()))
+
+    def add_many(self, rows):
+        for r in rows:
+            self.add(r)
+
+    def build(self, rows):
+        self.add_many(rows)
+
+
+class SortedIndex(HashIndex):
+    """
+    Ordered index for range predicates: a sorted list of distinct keys next to
+    the hash buckets, searched with bisect. NULLs are kept out of the key list.
+    """
+
+    kind = "sorted"
+
+    def __init__(self, name, column):
+        super().__init__(name, column)
+        self.keys = []
+
+    def add(self, row):
+        value = row.get(self.column)
+        if value is not None and value not in self.buckets:
+            # appends (e.g. increasing timestamps) land at the end of the list
+            if not self.keys or value > self.keys[-1]:
+                self.keys.append(value)
+            else:
+                insort(self.keys, value)
+        super().add(row)
+
+    def add_many(self, rows):
+        # bucket everything first, then merge the new keys with one sort
+        column, buckets = self.column, self.buckets
+        new_keys = []
+        for r in rows:
+            value = r.get(column)
+            bucket = buckets.get(value)
+            if bucket is None:
+                bucket = buckets[value] = {}
+                if value is not None:
+                    new_keys.append(value)
+            bucket[id(r)] = r
+        if new_keys:
+            self.keys.extend(new_keys)
+            self.keys.sort()
+
+    def remove(self, row):
+        value = row.get(self.column)
+        super().remove(row)
+        if value is not None and value not in self.buckets:
+            i = bisect_left(self.keys, value)
+            if i < len(self.keys) and self.keys[i] == value:
+                del self.keys[i]
+
+    def _span(self, low, high, include_low, include_high):
+        if low is None:
+            start = 0
+        else:
+            start = bisect_left(self.keys, low) if include_low else bisect_right(self.keys, low)
+        if high is None:
+            end = len(self.keys)
+        else:
+            end = bisect_right(self.keys, high) if include_high else bisect_left(self.keys, high)
+        return start, end
+
+    def range(self, low=None, high=None, include_low=True, include_high=True, reverse=False):
+        """Yield rows with low <= value <= high in key order (either bound may be None)."""
+        start, end = self._span(low, high, include_low, include_high)
+        keys = self.keys[start:end]
+        if reverse:
+            keys.reverse()
+        for key in keys:
+            yield from self.buckets[key].values()
+
+    def range_size(self, low=None, high=None, include_low=True, include_high=True, limit=None):
+        """How many rows range() would yield; stops counting once past `limit`."""
+        start, end = self._span(low, high, include_low, include_high)
+        if limit is not None and end - start > limit:
+            return end - start  # every key has at least one row
+        total = 0
+        for key in self.keys[start:end]:
+            total += len(self.buckets[key])
+            if limit is not None and total > limit:
+                break
+        return total
+
+
+INDEX_TYPES = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+    "btree": SortedIndex,
+}
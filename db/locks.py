@@ -0,0 +1,86 @@
+import threading
+from contextlib import contextmanager
+
+
+class LockManager:
+    """
+    Row locks keyed by (table, primary key) plus one latch per table.
+
+    The latch guards a table's shared structures (rows list, pk/unique and
+    secondary indexes, aggregates) and is only held for the in-memory part of
+    a write. Row locks serialize check-then-write sequences such as "read the
+    balance, then debit it" on one wallet while other wallets proceed.
+
+    Lock order is always row locks first, then the table latch; several row
+    locks are taken in sorted key order (see rows()), so writers cannot
+    deadlock against each other. Row locks are re-entrant per thread.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._latches = {}
+        self._rows = {}  # (table, key) -> [RLock, threads holding or waiting]
+
+    def latch(self, table):
+        with self._mutex:
+            latch = self._latches.get(table)
+            if latch is None:
+                latch = self._latches[table] = threading.RLock()
+            return latch
+
+    @contextmanager
+    def latches(self, tables):
+        """Every latch in `tables`, in name order (used by checkpoints)."""
+        held = []
+        try:
+            for name in sorted(tables):
+                latch = self.latch(name)
+                latch.acquire()
+                held.append(latch)
+            yield
+        finally:
+            for latch in reversed(held):
+                latch.release()
+
+    def _enter(self, table, key, timeout=None):
+        with self._mutex:
+            entry = self._rows.get((table, key))
+            if entry is None:
+                entry = self._rows[(table, key)] = [threading.RLock(), 0]
+            entry[1] += 1
+        if not entry[0].acquire(timeout=-1 if timeout is None else timeout):
+            self._release_entry(table, key, entry)
+            raise TimeoutError(f"Timed out waiting for row lock on {table}[{key!r}]")
+        return entry
+
+    def _release_entry(self, table, key, entry):
+        with self._mutex:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._rows[(table, key)]
+
+    def _exit(self, table, key, entry):
+        entry[0].release()
+        self._release_entry(table, key, entry)
+
+    # `timeout` (seconds, None = wait forever) raises TimeoutError instead of deadlocking
+    @contextmanager
+    def row(self, table, key, timeout=None):
+        entry = self._enter(table, key, timeout)
+        try:
+            yield
+        finally:
+            self._exit(table, key, entry)
+
+    @contextmanager
+    def rows(self, table, keys, timeout=None):
+        """Lock several rows at once, always in the same (sorted) order."""
+        ordered = sorted(set(keys), key=lambda k: (type(k).__name__, k))
+        held = []
+        try:
+            for key in ordered:
+                held.append((key, self._enter(table, key, timeout)))
+            yield
+        finally:
+            for key, entry in reversed(held):
+                self._exit(table, key, entry)
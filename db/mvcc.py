@@ -0,0 +1,171 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+VOID = -1  # timestamp of a rolled-back version: its changes never happened
+
+
+class Version:
+    """
+    The changes of one autocommit statement or one transaction. `ts` stays
+    None while they are in flight and becomes the commit timestamp when they
+    are published; `entries` are the before-images and aggregate deltas the
+    tables recorded for it, kept until no snapshot older than `ts` remains.
+    """
+
+    __slots__ = ("ts", "entries", "tables")
+
+    def __init__(self):
+        self.ts = None
+        self.entries = []  # (table, kind, obj, entry)
+        self.tables = set()  # tables it changed; stamped with `ts` on publish (db/cache.py)
+
+    def after(self, ts):
+        """True when a snapshot taken at `ts` must not see this version."""
+        return self.ts is None or (self.ts != VOID and self.ts > ts)
+
+
+class Snapshot:
+    """A point-in-time read view; pass it to Table.scan / query.select / join."""
+
+    def __init__(self, manager, ts, own=None):
+        self.manager = manager
+        self.ts = ts
+        self.own = own  # the reader's own transaction: its writes stay visible
+        self._open = True
+
+    def hides(self, version):
+        return version is not self.own and version.after(self.ts)
+
+    def view(self, table, row):
+        """`row` as of this snapshot (a private copy), or None if it was not visible then."""
+        image = row.copy()
+        item = table._history.get(id(row))
+        if item is not None:
+            # the first change committed after the snapshot holds the image it saw
+            for version, before in list(item[1]):
+                if self.hides(version):
+                    return None if before is None else dict(before)
+            if id(row) in table._graveyard:
+                return None
+        return image
+
+    def aggregate(self, table, name):
+        with table._lock:
+            return table.aggregates[name].value_at(self)
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self.manager._release(self.ts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class VersionManager:
+    """
+    Multi-version reads for the in-memory tables.
+
+    Writers update rows in place, but first record the row's before-image
+    (and the delta applied to each materialized aggregate) against the
+    Version of the running statement or transaction. Publishing a version
+    stamps it with the next commit timestamp. A Snapshot taken at `ts`
+    sees every version published at or before `ts` and, through the
+    recorded images, nothing newer or still in flight, so readers never
+    block writers and never see half of a payment.
+
+    Images are dropped as soon as no open snapshot predates their version.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._local = threading.local()
+        self.clock = 0
+        self._readers = {}  # snapshot ts -> open snapshots
+        self._retained = deque()  # published versions, in ts order
+
+    def current(self):
+        return getattr(self._local, "version", None)
+
+    def begin(self):
+        version = self._local.version = Version()
+        return version
+
+    @contextmanager
+    def write(self):
+        """Scope of one autocommit statement; inside a transaction its version is used instead."""
+        if self.current() is not None:
+            yield
+            return
+        version = self.begin()
+        try:
+            yield
+        finally:
+            self._local.version = None
+            self.publish(version)
+
+    def publish(self, version):
+        if self.current() is version:
+            self._local.version = None
+        with self._mutex:
+            self.clock += 1
+            version.ts = self.clock
+            for table in version.tables:
+                table.version = version.ts
+            if version.entries:
+                self._retained.append(version)
+        self.collect()
+
+    def void(self, version):
+        # after the undo pass: readers ignore whatever is still recorded for it
+        version.ts = VOID
+
+    def discard(self, version):
+        if self.current() is version:
+            self._local.version = None
+        self._drop(version)
+
+    def snapshot(self):
+        with self._mutex:
+            ts = self.clock
+            self._readers[ts] = self._readers.get(ts, 0) + 1
+        return Snapshot(self, ts, self.current())
+
+    def _release(self, ts):
+        with self._mutex:
+            self._readers[ts] -= 1
+            if not self._readers[ts]:
+                del self._readers[ts]
+        self.collect()
+
+    def collect(self):
+        doomed = []
+        with self._mutex:
+            oldest = min(self._readers) if self._readers else None
+            while self._retained and (oldest is None or self._retained[0].ts <= oldest):
+                doomed.append(self._retained.popleft())
+        for version in doomed:
+            self._drop(version)
+
+    def _drop(self, version):
+        by_table = {}
+        for table, kind, obj, entry in version.entries:
+            by_table.setdefault(table, []).append((kind, obj, entry))
+        version.entries = []
+        for table, items in by_table.items():
+            with table._lock:
+                for kind, obj, entry in items:
+                    table._forget(kind, obj, entry)
+
+    def stats(self):
+        with self._mutex:
+            return {
+                "clock": self.clock,
+                "open_snapshots": sum(self._readers.values()),
+                "retained_versions": len(self._retained),
+            }
@@ -0,0 +1,259 @@
+"""
+Range partitioning and archival of cold partitions.
+
+A partitioned table splits its rows by one column: calendar buckets of a
+'YYYY-MM-DD HH:MM:SS' timestamp ("day", "month", "year") or fixed-width
+ranges of an INT ("range" with `width`). All partitions start hot, in the
+table's live rows. Partitions older than the newest `keep` are sealed at
+checkpoints: their rows are written to a read-only gzip segment file
+
+    data/db.archive/<table>/<partition>.json.gz
+
+and dropped from memory and from the table's indexes. Sealed rows still
+answer scans, GROUP BY and ORDER BY, and still count in materialized
+aggregates, but the live-row helpers (find(), Table.select(where), range(),
+update/delete) do not see them, and no new row may land in a sealed
+partition.
+
+Scans prune sealed partitions against the WHERE clause's bounds on the
+partitioning column, and on the primary key using the key range recorded
+when each partition was sealed, so a query over the last few days (or the
+newest ids) never opens a segment file; opened partitions are kept in a
+small LRU.
+"""
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from pathlib import Path
+
+from .predicate import column_name, conjuncts
+
+# calendar interval -> length of the timestamp prefix naming the partition
+INTERVALS = {"day": 10, "month": 7, "year": 4}
+PARTITION_KINDS = tuple(INTERVALS) + ("range",)
+
+
+class PartitionScheme:
+    def __init__(self, column, interval="month", width=None, keep=3):
+        if interval not in PARTITION_KINDS:
+            raise ValueError(f"Unknown partition interval '{interval}'. Expected one of: {', '.join(PARTITION_KINDS)}")
+        if interval == "range" and not (isinstance(width, int) and width > 0):
+            raise ValueError("Range partitioning needs a positive integer width")
+        if keep < 1:
+            raise ValueError("keep must be at least 1")
+        self.column = column
+        self.interval = interval
+        self.width = width if interval == "range" else None
+        self.keep = keep  # newest partitions always kept in memory
+
+    def key(self, value):
+        """Partition of a column value: '2026-03' for a month, the range start for an id range."""
+        if value is None:
+            return None  # NULLs stay hot
+        if self.interval == "range":
+            return value // self.width * self.width
+        return str(value)[:INTERVALS[self.interval]]
+
+    def span(self, key):
+        """[low, high) of the column values in partition `key`."""
+        if self.interval == "range":
+            return key, key + self.width
+        if self.interval == "year":
+            return key, str(int(key) + 1)
+        if self.interval == "month":
+            year, month = map(int, key.split("-"))
+            return key, f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+        return key, (date.fromisoformat(key) + timedelta(days=1)).isoformat()
+
+    def to_dict(self):
+        return {"column": self.column, "interval": self.interval, "width": self.width, "keep": self.keep}
+
+
+def column_bounds(node, column):
+    """(low, high, inc_low, inc_high) a WHERE tree puts on `column` through its AND terms."""
+    low = high = None
+    inc_low = inc_high = True
+
+    def tighten(lo, hi, i_lo, i_hi):
+        nonlocal low, high, inc_low, inc_high
+        if lo is not None and (low is None or lo > low or (lo == low and not i_lo)):
+            low, inc_low = lo, i_lo
+        if hi is not None and (high is None or hi < high or (hi == high and not i_hi)):
+            high, inc_high = hi, i_hi
+
+    for term in conjuncts(node):
+        kind = term[0]
+        if kind == "cmp" and term[2][0] == "col" and term[3][0] == "lit" and term[3][1] is not None:
+            if column_name(term[2][1]) != column:
+                continue
+            op, value = term[1], term[3][1]
+            if op == "=":
+                tighten(value, value, True, True)
+            elif op in (">", ">="):
+                tighten(value, None, op == ">=", True)
+            elif op in ("<", "<="):
+                tighten(None, value, True, op == "<=")
+        elif kind == "between" and not term[4] and term[1][0] == "col" and term[2][0] == "lit" and term[3][0] == "lit":
+            if column_name(term[1][1]) == column:
+                tighten(term[2][1], term[3][1], True, True)
+        elif kind == "in" and not term[3] and term[1][0] == "col" and all(i[0] == "lit" for i in term[2]):
+            values = [i[1] for i in term[2] if i[1] is not None]
+            if column_name(term[1][1]) == column and values:
+                tighten(min(values), max(values), True, True)
+    return low, high, inc_low, inc_high
+
+
+def _outside(key_range, low, high, inc_low, inc_high):
+    """True when no key of the closed [min, max] range can meet the bounds."""
+    first, last = key_range
+    if low is not None and (last < low if inc_low else last <= low):
+        return True
+    return high is not None and (first > high if inc_high else first >= high)
+
+
+class SealedPartition:
+    """Metadata of one sealed partition; its rows live in `file` until loaded."""
+
+    def __init__(self, key, file, rows, aggregates=None, key_range=None):
+        self.key = key
+        self.file = file  # relative to the table's archive directory
+        self.rows = rows
+        self.aggregates = aggregates or {}  # aggregate name -> [total, count] of the sealed rows
+        self.key_range = key_range  # [min, max] primary key of the sealed rows
+
+    def to_dict(self):
+        return {"key": self.key, "file": self.file, "rows": self.rows, "aggregates": self.aggregates, "key_range": self.key_range}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["key"], data["file"], data["rows"], data.get("aggregates"), data.get("key_range"))
+
+
+class PartitionSet:
+    """The partitioning of one table: its scheme, sealed partitions and the LRU of loaded ones."""
+
+    def __init__(self, scheme, directory=None, max_loaded=4, primary_key=None):
+        self.scheme = scheme
+        self.directory = Path(directory) if directory is not None else None
+        self.primary_key = primary_key
+        self.sealed = {}  # key -> SealedPartition
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()  # key -> rows, least recently used first
+        self._mutex = threading.Lock()
+
+    def check_writable(self, table, row):
+        key = self.scheme.key(row.get(self.scheme.column))
+        if key in self.sealed:
+            raise ValueError(f"Partition {key} of '{table}' is sealed and read-only")
+
+    # ---------------- pruning ----------------
+    def pruned(self, predicate=None, keys=None):
+        """Sealed partitions (of `keys`, default all) a scan with `predicate` has to read, oldest first."""
+        keys = sorted(self.sealed if keys is None else keys)
+        if predicate is None or not keys:
+            return keys
+        low, high, _, inc_high = column_bounds(predicate.node, self.scheme.column)
+        pk_bounds = column_bounds(predicate.node, self.primary_key) if self.primary_key else (None, None, True, True)
+        if low is None and high is None and pk_bounds[:2] == (None, None):
+            return keys
+        survivors = []
+        for key in keys:
+            start, end = self.scheme.span(key)
+            key_range = self.sealed[key].key_range
+            try:
+                # values of the partition lie in [start, end)
+                if low is not None and end <= low:
+                    continue
+                if high is not None and (start > high if inc_high else start >= high):
+                    continue
+                if key_range is not None and _outside(key_range, *pk_bounds):
+                    continue
+            except TypeError:
+                return keys  # literal of another type: let the predicate decide
+            survivors.append(key)
+        return survivors
+
+    def rows(self, predicate=None, keys=None):
+        """Rows of the sealed partitions that can match `predicate` (not yet tested against it)."""
+        for key in self.pruned(predicate, keys):
+            yield from self.load(key)
+
+    def scan(self, predicate=None, columns=None, keys=None):
+        test = predicate.test if predicate is not None else None
+        for r in self.rows(predicate, keys):
+            if test is None or test(r):
+                yield r if columns is None else {c: r[c] for c in columns}
+
+    # ---------------- segment files ----------------
+    def load(self, key):
+        with self._mutex:
+            rows = self._loaded.get(key)
+            if rows is not None:
+                self._loaded.move_to_end(key)
+                return rows
+            with gzip.open(self.directory / self.sealed[key].file, "rt", encoding="utf-8") as f:
+                rows = json.load(f)
+            self._loaded[key] = rows
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+            return rows
+
+    def write(self, key, rows, aggregates):
+        """Write `rows` as the segment file of partition `key`; returns its SealedPartition (not yet registered)."""
+        if self.directory is None:
+            raise ValueError("Sealing partitions needs a table attached to a Database")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"{key}.json.gz"
+        tmp = self.directory / (name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(rows, f, separators=(",", ":"))
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, self.directory / name)
+        totals = {}
+        for agg in aggregates:
+            total = count = 0
+            for row in rows:
+                delta = agg.contribution(row)
+                if delta is not None:
+                    total += delta
+                    count += 1
+            totals[agg.name] = [total, count]
+        key_range = None
+        if self.primary_key and rows:
+            ids = [row[self.primary_key] for row in rows]
+            key_range = [min(ids), max(ids)]
+        return SealedPartition(key, name, len(rows), totals, key_range)
+
+    def add(self, partition):
+        self.sealed[partition.key] = partition
+
+    def stats(self, live_rows):
+        counts = {}
+        for row in live_rows:
+            key = self.scheme.key(row.get(self.scheme.column))
+            counts[key] = counts.get(key, 0) + 1
+        partitions = [
+            {"partition": key, "rows": p.rows, "sealed": True, "loaded": key in self._loaded}
+            for key, p in sorted(self.sealed.items())
+        ]
+        partitions += [
+            {"partition": key, "rows": n, "sealed": False, "loaded": True}
+            for key, n in sorted(counts.items(), key=lambda kv: (kv[0] is not None, kv[0]))
+        ]
+        return partitions
+
+    def to_dict(self):
+        return {**self.scheme.to_dict(), "sealed": [p.to_dict() for p in self.sealed.values()]}
+
+    @classmethod
+    def from_dict(cls, data, directory, primary_key=None):
+        scheme = PartitionScheme(data["column"], data["interval"], data.get("width"), data.get("keep", 3))
+        partitions = cls(scheme, directory, primary_key=primary_key)
+        for spec in data.get("sealed", []):
+            partitions.add(SealedPartition.from_dict(spec))
+        return partitions
+
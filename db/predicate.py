@@ -0,0 +1,308 @@
+import operator
+import re
+
+OPS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+FLIPPED = {'=': '=', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+NUMERIC = (int, float)
+NEGATED = {'=': '!=', '!=': '=', '<': '>=', '<=': '>', '>': '<=', '>=': '<'}
+
+
+def column_name(name):
+    """`wallets.balance` -> `balance`; rows are keyed by bare column names."""
+    return name.rsplit('.', 1)[-1]
+
+
+def param_value(params, key):
+    try:
+        return params[key]
+    except (KeyError, IndexError, TypeError):
+        label = f"?{key + 1}" if isinstance(key, int) else f":{key}"
+        raise ValueError(f"Missing value for parameter {label}")
+
+
+def check_type(column, col_type, value):
+    """Strict check for bound parameters: the column's own type, or int widened to float."""
+    if value is None:
+        return value
+    if isinstance(value, col_type) and not (isinstance(value, bool) and col_type is not bool):
+        return value
+    if col_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    raise TypeError(
+        f"Parameter for column '{column}' expects type {col_type.__name__}, got {type(value).__name__}"
+    )
+
+
+class Predicate:
+    """
+    A parsed WHERE expression compiled once into a closure over a row dict.
+    Literals compared against a column are checked against its type up front,
+    so comparisons at scan time are plain Python operators: an int is widened
+    for a FLOAT column, any other number is compared as written (never
+    truncated), and a value of another kind is a TypeError. Placeholders are
+    bound from `params` and must already match the column type. Unknown
+    columns are a ValueError.
+
+    A row matches when the expression is TRUE. NOT is pushed down to the
+    leaves (De Morgan, inverted comparisons), so it selects rows where its
+    operand is FALSE, never where it is UNKNOWN because of a NULL.
+    """
+
+    def __init__(self, node, columns=None, params=None):
+        self.columns = columns or {}
+        self.params = params
+        if self.columns:
+            for name in columns_in(node):
+                if column_name(name) not in self.columns:
+                    raise ValueError(f"Unknown column '{name}'")
+        self.node = self._coerce(node)
+        self.test = self._compile(self.node)
+
+    def __call__(self, row):
+        return self.test(row)
+
+    # ---------------- typing ----------------
+    def _cast(self, column_node, value_node):
+        if value_node[0] == 'param':
+            value = param_value(self.params, value_node[1])
+            col_type = self.columns.get(column_name(column_node[1])) if column_node[0] == 'col' else None
+            return ('lit', check_type(column_node[1], col_type, value) if col_type else value)
+        if column_node[0] != 'col' or value_node[0] != 'lit' or value_node[1] is None:
+            return value_node
+        col_type = self.columns.get(column_name(column_node[1]))
+        value = value_node[1]
+        if col_type is None or isinstance(value, col_type):
+            return value_node
+        if col_type is float and isinstance(value, int) and not isinstance(value, bool):
+            return ('lit', float(value))
+        if col_type in NUMERIC and isinstance(value, NUMERIC):
+            return value_node  # compared as written: wallet_id = 1.9 matches no INT
+        raise TypeError(f"Column '{column_node[1]}' expects type {col_type.__name__}, got {value!r}")
+
+    def _coerce(self, node):
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return (kind, [self._coerce(n) for n in node[1]])
+        if kind == 'not':
+            return self._negate(self._coerce(node[1]))
+        if kind == 'cmp':
+            _, op, left, right = node
+            if left[0] in ('lit', 'param') and right[0] == 'col':
+                op, left, right = FLIPPED[op], right, left
+            return ('cmp', op, self._cast(right, left), self._cast(left, right))
+        if kind == 'in':
+            _, left, items, negated = node
+            return ('in', left, [self._cast(left, i) for i in items], negated)
+        if kind == 'between':
+            _, left, low, high, negated = node
+            return ('between', left, self._cast(left, low), self._cast(left, high), negated)
+        if kind == 'like':
+            _, left, pattern, negated = node
+            pattern = self._cast(('lit', None), pattern)
+            if not isinstance(pattern[1], str):
+                raise TypeError("LIKE expects a string pattern")
+            return ('like', left, pattern, negated)
+        return node
+
+    @classmethod
+    def _negate(cls, node):
+        """NOT `node` as a tree without NOT: TRUE exactly where `node` is FALSE."""
+        kind = node[0]
+        if kind == 'and':
+            return ('or', [cls._negate(n) for n in node[1]])
+        if kind == 'or':
+            return ('and', [cls._negate(n) for n in node[1]])
+        if kind == 'cmp':
+            # NULL operands make both the comparison and its inverse false
+            return ('cmp', NEGATED[node[1]], node[2], node[3])
+        if kind == 'isnull':
+            return ('isnull', node[1], not node[2])
+        # in / between / like: flip their own NOT
+        return node[:-1] + (not node[-1],)
+
+    # ---------------- compilation ----------------
+    def _operand(self, node):
+        if node[0] == 'col':
+            name = column_name(node[1])
+            return lambda row: row.get(name)
+        value = node[1]
+        return lambda row: value
+
+    def _compile(self, node):
+        kind = node[0]
+
+        if kind == 'and':
+            parts = [self._compile(n) for n in node[1]]
+            return lambda row: all(p(row) for p in parts)
+        if kind == 'or':
+            parts = [self._compile(n) for n in node[1]]
+            return lambda row: any(p(row) for p in parts)
+        if kind == 'cmp':
+            _, op, left, right = node
+            fn = OPS[op]
+            if left[0] == 'col' and right[0] == 'lit':
+                # the common case: column against a constant
+                name, value = column_name(left[1]), right[1]
+                if value is None:
+                    return lambda row: False
+                return lambda row: (v := row.get(name)) is not None and fn(v, value)
+            get_l, get_r = self._operand(left), self._operand(right)
+
+            def compare(row):
+                l, r = get_l(row), get_r(row)
+                return l is not None and r is not None and fn(l, r)
+            return compare
+
+        if kind == 'in':
+            _, left, items, negated = node
+            get = self._operand(left)
+            if all(i[0] == 'lit' for i in items):
+                values = frozenset(i[1] for i in items if i[1] is not None)
+                if negated and len(values) < len(items):
+                    return lambda row: False  # x NOT IN (.., NULL) is never TRUE
+                return lambda row: (v := get(row)) is not None and ((v in values) != negated)
+            getters = [self._operand(i) for i in items]
+
+            def member(row):
+                v = get(row)
+                if v is None:
+                    return False
+                values = [g(row) for g in getters]
+                if v in values:
+                    return not negated
+                return negated and None not in values
+            return member
+
+        if kind == 'between':
+            _, left, low, high, negated = node
+            get, get_lo, get_hi = self._operand(left), self._operand(low), self._operand(high)
+
+            def between(row):
+                v, lo, hi = get(row), get_lo(row), get_hi(row)
+                if v is None or lo is None or hi is None:
+                    return False
+                return (lo <= v <= hi) != negated
+            return between
+
+        if kind == 'like':
+            _, left, (_, pattern), negated = node
+            get = self._operand(left)
+            regex = re.compile(
+                ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern),
+                re.DOTALL,
+            )
+            return lambda row: (v := get(row)) is not None and (regex.fullmatch(str(v)) is not None) != negated
+
+        if kind == 'isnull':
+            _, left, negated = node
+            get = self._operand(left)
+            return lambda row: (get(row) is None) != negated
+
+        raise ValueError(f"Unsupported expression: {kind}")
+
+
+# ---------------- access paths ----------------
+def conjuncts(node):
+    if node is None:
+        return []
+    if node[0] == 'and':
+        return [c for n in node[1] for c in conjuncts(n)]
+    return [node]
+
+
+def columns_in(node):
+    """Column names referenced by an expression node, in order, with repeats."""
+    kind = node[0]
+    if kind == 'col':
+        return [node[1]]
+    if kind in ('lit', 'param'):
+        return []
+    if kind in ('and', 'or'):
+        return [c for n in node[1] for c in columns_in(n)]
+    if kind == 'not':
+        return columns_in(node[1])
+    if kind == 'in':
+        return columns_in(node[1]) + [c for n in node[2] for c in columns_in(n)]
+    if kind == 'cmp':
+        return columns_in(node[2]) + columns_in(node[3])
+    if kind == 'between':
+        return columns_in(node[1]) + columns_in(node[2]) + columns_in(node[3])
+    return columns_in(node[1])  # like / isnull
+
+
+def candidate_rows(table, node):
+    """
+    Smallest superset of matching rows reachable through an index, chosen from
+    the top-level AND terms: pk/unique equality, then the most selective hash
+    bucket, then a bounded range on a sorted index. Falls back to a full scan.
+    The caller still applies the full predicate to every candidate.
+    """
+    path = access_path(table, node)
+    if path[0] == 'rows':
+        return path[1]
+    if path[0] == 'range':
+        return path[1].range(*path[2])
+    return table.rows
+
+
+def access_path(table, node):
+    """
+    The access path behind candidate_rows: ('rows', list) for key and bucket
+    lookups, ('range', sorted index, (low, high, inc_low, inc_high)) for a
+    range, or ('scan', None).
+    """
+    best = None
+    bounds = {}
+
+    for term in conjuncts(node):
+        kind = term[0]
+        if kind == 'cmp' and term[2][0] == 'col' and term[3][0] == 'lit':
+            col, value = column_name(term[2][1]), term[3][1]
+            op = term[1]
+            if op == '=':
+                rows = _equality_lookup(table, col, [value])
+                if rows is not None and (best is None or len(rows) < len(best)):
+                    best = rows
+            elif op in ('<', '<=', '>', '>=') and value is not None:
+                low, high, inc_low, inc_high = bounds.get(col, (None, None, True, True))
+                if op in ('>', '>='):
+                    low, inc_low = value, op == '>='
+                else:
+                    high, inc_high = value, op == '<='
+                bounds[col] = (low, high, inc_low, inc_high)
+        elif kind == 'in' and not term[3] and term[1][0] == 'col' and all(i[0] == 'lit' for i in term[2]):
+            rows = _equality_lookup(table, column_name(term[1][1]), [i[1] for i in term[2]])
+            if rows is not None and (best is None or len(rows) < len(best)):
+                best = rows
+        elif kind == 'between' and not term[4] and term[1][0] == 'col' and term[2][0] == 'lit' and term[3][0] == 'lit':
+            bounds[column_name(term[1][1])] = (term[2][1], term[3][1], True, True)
+
+    if best is not None:
+        return ('rows', best)
+
+    for col, span in bounds.items():
+        index = table.indexes.get(col)
+        if index is not None and index.kind == 'sorted':
+            return ('range', index, span)
+
+    return ('scan', None)
+
+
+def _equality_lookup(table, col, values):
+    if col == table.primary_key:
+        source = table.pk_index
+    elif col in table.unique_indexes:
+        source = table.unique_indexes[col]
+    elif col in table.indexes:
+        index = table.indexes[col]
+        return [r for v in dict.fromkeys(values) for r in index.lookup(v)]
+    else:
+        return None
+    return [source[v] for v in dict.fromkeys(values) if v in source]
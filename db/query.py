@@ -1,22 +1,385 @@
-# def join(wallets, ledger):
-#     results = []
-
-#     wallet_index = {
-#         w["wallet_id"]: w for w in wallets.rows
-#     }
-
-#     for tx in ledger.rows:
-#         w = wallet_index.get(tx["wallet_id"])
-#         if not w:
-#             continue
-
-#         results.append({
-#             "transaction_id": tx.get("transaction_id"),
-#             "wallet_id": tx["wallet_id"],
-#             "owner": w["owner"],
-#             "amount": tx["amount"],
-#             "direction": tx["direction"],
-#             "timestamp": tx["timestamp"],
-#         })
-
-#     return results
+import base64
+import heapq
+import json
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from .predicate import Predicate, candidate_rows, column_name, columns_in, conjuncts
+
+
+def _side_of(name, left, right):
+    if '.' in name:
+        qualifier, bare = name.rsplit('.', 1)
+        for side, table in (('left', left), ('right', right)):
+            if qualifier == table.name:
+                if bare not in table.columns:
+                    raise ValueError(f"Unknown column '{bare}' for table '{table.name}'")
+                return side
+        raise ValueError(f"Unknown table '{qualifier}' in column '{name}'")
+
+    in_left, in_right = name in left.columns, name in right.columns
+    if in_left and in_right:
+        return None  # ambiguous: decide on the joined row
+    if not in_left and not in_right:
+        raise ValueError(f"Unknown column '{name}'")
+    return 'left' if in_left else 'right'
+
+
+def split_where(node, left, right):
+    """Split a WHERE tree into (left-only, right-only, residual) AND terms."""
+    parts = {'left': [], 'right': [], None: []}
+    for term in conjuncts(node):
+        sides = {_side_of(c, left, right) for c in columns_in(term)}
+        parts[sides.pop() if len(sides) == 1 else None].append(term)
+
+    def combine(terms):
+        if not terms:
+            return None
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    return combine(parts['left']), combine(parts['right']), combine(parts[None])
+
+
+def _archived(table):
+    """True when some of the table's rows are in sealed partitions (db/partition.py)."""
+    return table.partitions is not None and bool(table.partitions.sealed)
+
+
+def _probe(table, column):
+    """Index lookup function for `column`, or None when it isn't indexed."""
+    if _archived(table):
+        return None  # the live indexes do not cover sealed rows
+    if column == table.primary_key:
+        index = table.pk_index
+        return lambda v: [index[v]] if v in index else []
+    if column in table.unique_indexes:
+        index = table.unique_indexes[column]
+        return lambda v: [index[v]] if v in index else []
+    if column in table.indexes:
+        return table.indexes[column].lookup
+    return None
+
+
+def _hash_join(build_rows, build_col, probe_rows, probe_col):
+    buckets = {}
+    for r in build_rows:
+        key = r.get(build_col)
+        if key is not None:
+            buckets.setdefault(key, []).append(r)
+    for r in probe_rows:
+        for match in buckets.get(r.get(probe_col), ()):
+            yield r, match
+
+
+def _index_join(outer_rows, outer_col, lookup, inner_test=None):
+    for r in outer_rows:
+        key = r.get(outer_col)
+        if key is None:
+            continue
+        for match in lookup(key):
+            if inner_test is None or inner_test(match):
+                yield r, match
+
+
+def plan_join(left, right, on_left, on_right, where=None, params=None, snapshot=None):
+    """
+    Pick a join strategy for `left JOIN right ON left.on_left = right.on_right`.
+
+    Single-table WHERE terms are pushed below the join and answered through
+    Table.scan (so they can use indexes). The smaller input drives the join:
+    it probes the other side's pk/unique/secondary index when one exists on
+    the join column, otherwise a hash table is built on the smaller side.
+    Snapshot reads always hash join: the live indexes may not match the snapshot.
+    """
+    left_node, right_node, residual = split_where(where, left, right) if where else (None, None, None)
+    left_pred = Predicate(left_node, left.columns, params) if left_node else None
+    right_pred = Predicate(right_node, right.columns, params) if right_node else None
+
+    # filtered inputs are materialized so their real size drives the plan
+    if snapshot is not None:
+        left_rows = list(left.scan(left_pred, snapshot=snapshot))
+        right_rows = list(right.scan(right_pred, snapshot=snapshot))
+        probe_left = probe_right = None
+    else:
+        left_rows = list(left.scan(left_pred)) if left_pred or _archived(left) else left.rows
+        right_rows = list(right.scan(right_pred)) if right_pred or _archived(right) else right.rows
+        probe_left, probe_right = _probe(left, on_left), _probe(right, on_right)
+
+    if probe_right and len(left_rows) <= len(right_rows):
+        strategy = 'index_nested_loop'
+        pairs = _index_join(left_rows, on_left, probe_right, right_pred.test if right_pred else None)
+    elif probe_left and len(right_rows) < len(left_rows):
+        strategy = 'index_nested_loop'
+        pairs = ((l, r) for r, l in _index_join(right_rows, on_right, probe_left, left_pred.test if left_pred else None))
+    elif len(left_rows) <= len(right_rows):
+        strategy = 'hash'
+        pairs = ((l, r) for r, l in _hash_join(left_rows, on_left, right_rows, on_right))
+    else:
+        strategy = 'hash'
+        pairs = _hash_join(right_rows, on_right, left_rows, on_left)
+
+    residual_pred = Predicate(residual, {**left.columns, **right.columns}, params) if residual else None
+    return strategy, pairs, residual_pred
+
+
+def join(left, right, on_left, on_right, where=None, columns=None, params=None, snapshot=None):
+    """Yield joined rows ({**left_row, **right_row}), optionally projected."""
+    _, pairs, residual = plan_join(left, right, on_left, on_right, where, params, snapshot)
+
+    getters = None
+    if columns is not None:
+        getters = []
+        for name in columns:
+            bare = column_name(name)
+            side = _side_of(name, left, right)
+            index = {'left': 0, 'right': 1}.get(side, 1)
+            getters.append((name, index, bare))
+
+    for l, r in pairs:
+        if residual is not None and not residual.test({**l, **r}):
+            continue
+        if getters is None:
+            yield {**l, **r}
+        else:
+            pair = (l, r)
+            yield {name: pair[i][bare] for name, i, bare in getters}
+
+
+# ---------------- ORDER BY / LIMIT ----------------
+class _Descending:
+    """Sort-key wrapper that inverts comparisons, so mixed ASC/DESC keys sort in one pass."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def sort_key(order_by):
+    """Key function for [(column, descending), ...]; NULLs sort first ascending, last descending."""
+    def key(row):
+        parts = []
+        for column, desc in order_by:
+            value = row.get(column)
+            part = (value is not None, value)
+            parts.append(_Descending(part) if desc else part)
+        return tuple(parts)
+    return key
+
+
+def sort_rows(rows, order_by, limit=None, offset=0):
+    """ORDER BY over any row iterable: a bounded heap when LIMIT is given, else a full sort."""
+    key = sort_key(order_by)
+    if limit is None:
+        return sorted(rows, key=key)[offset:]
+    return heapq.nsmallest(offset + limit, rows, key=key)[offset:]
+
+
+def _index_ordered(table, order_by, after=None):
+    """
+    Rows in ORDER BY order read off the sorted index on the first ORDER BY
+    column, one key bucket at a time (buckets are sorted on the remaining
+    columns). `after` is a first-column value to start from, for keyset paging.
+    """
+    column, desc = order_by[0]
+    index = table.indexes[column]
+    keys, buckets = index.keys, index.buckets
+    key = sort_key(order_by[1:]) if len(order_by) > 1 else None
+
+    if after is None:
+        ordered = reversed(keys) if desc else iter(keys)
+    elif desc:
+        ordered = reversed(keys[:bisect_right(keys, after)])
+    else:
+        ordered = iter(keys[bisect_left(keys, after):])
+
+    # NULLs come first ascending and last descending
+    nulls = [None] if None in buckets and (desc or after is None) else []
+    for value in (list(ordered) + nulls) if desc else (nulls + list(ordered)):
+        bucket = list(buckets.get(value, {}).values())
+        if key is not None and len(bucket) > 1:
+            bucket.sort(key=key)
+        yield from bucket
+
+
+def _snapshot_ordered(table, order_by, predicate, snapshot, count, after=None):
+    """
+    The first `count` rows (past the keyset boundary `after`) of an index-ordered
+    snapshot read. Rows with no MVCC history look the same in every open
+    snapshot, so they come straight off the live index under the latch; rows
+    changed since then are merged in from their snapshot images.
+    """
+    key = sort_key(order_by)
+    boundary = None if after is None else key(after)
+    test = predicate.test if predicate is not None else None
+
+    def wanted(row):
+        return (test is None or test(row)) and (boundary is None or boundary < key(row))
+
+    with table._lock:
+        changed = {id(row): row for row, _ in table._history.values()}
+        rows = []
+        for r in _index_ordered(table, order_by, None if after is None else after[order_by[0][0]]):
+            if len(rows) == count:
+                break
+            if id(r) not in changed and wanted(r):
+                rows.append(r.copy())
+        for row in changed.values():
+            image = snapshot.view(table, row)
+            if image is not None and wanted(image):
+                rows.append(image)
+    return heapq.nsmallest(count, rows, key=key)
+
+
+def _archived_ordered(table, order_by, predicate, after=None):
+    """
+    Matching sealed rows in ORDER BY order, when ORDER BY starts with the
+    partitioning column: partitions cover disjoint ranges of it, so they are
+    read one at a time, newest first for DESC, and only as far as needed.
+    `after` is a first-column value to start from, for keyset paging.
+    """
+    partitions = table.partitions
+    column, desc = order_by[0]
+    keys = partitions.pruned(predicate)
+    if after is not None:
+        spans = {key: partitions.scheme.span(key) for key in keys}
+        keys = [k for k in keys if (spans[k][0] <= after if desc else spans[k][1] > after)]
+    test = predicate.test if predicate is not None else None
+    for key in reversed(keys) if desc else keys:
+        rows = partitions.load(key)
+        yield from sort_rows(rows if test is None else filter(test, rows), order_by)
+
+
+def _uses_index_order(table, order_by, predicate):
+    index = table.indexes.get(order_by[0][0])
+    if index is None or index.kind != "sorted":
+        return False
+    if _archived(table) and order_by[0][0] != table.partitions.scheme.column:
+        return False  # sealed rows would need a full sort anyway
+    # a WHERE clause that already narrows through an index is cheaper to sort directly
+    return predicate is None or candidate_rows(table, predicate.node) is table.rows
+
+
+def _project(rows, columns):
+    if columns is None:
+        return rows
+    return ({c: r[c] for c in columns} for r in rows)
+
+
+def _check_order(table, order_by):
+    for column, _ in order_by:
+        if column not in table.columns:
+            raise ValueError(f"Unknown column '{column}' for table '{table.name}'")
+
+
+def select(table, predicate=None, columns=None, order_by=None, limit=None, offset=0, snapshot=None):
+    """Single-table SELECT with optional ORDER BY / LIMIT / OFFSET, as a row generator."""
+    if columns is not None:
+        columns = [column_name(c) for c in columns]
+        for col in columns:
+            if col not in table.columns:
+                raise ValueError(f"Unknown column '{col}' for table '{table.name}'")
+    rows = table.scan(predicate, columns if not order_by else None, snapshot)
+
+    if order_by:
+        _check_order(table, order_by)
+        indexed = _uses_index_order(table, order_by, predicate)
+        if indexed and snapshot is not None and limit is not None:
+            rows = _snapshot_ordered(table, order_by, predicate, snapshot, offset + limit)
+        elif indexed and snapshot is None:
+            rows = _index_ordered(table, order_by)
+            if predicate is not None:
+                rows = filter(predicate.test, rows)
+        else:
+            rows = sort_rows(rows, order_by, limit, offset)
+            offset = 0
+            indexed = False  # Table.scan has read the sealed partitions already
+        if indexed and _archived(table):
+            rows = heapq.merge(rows, _archived_ordered(table, order_by, predicate), key=sort_key(order_by))
+        rows = _project(rows, columns)
+
+    end = None if limit is None else offset + limit
+    return islice(rows, offset, end)
+
+
+# ---------------- keyset pagination ----------------
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_order(order_by, primary_key):
+    """ORDER BY of a keyset page: the primary key is appended as a tie-breaker."""
+    order_by = list(order_by or [])
+    if primary_key and primary_key not in [c for c, _ in order_by]:
+        order_by.append((primary_key, order_by[-1][1] if order_by else False))
+    return order_by
+
+
+def keyset_page(table, predicate=None, columns=None, order_by=None, page_size=100, cursor=None, snapshot=None):
+    """
+    One page of an ordered SELECT plus the cursor for the next one. The cursor
+    holds the last row's ORDER BY values (with the primary key appended as a
+    tie-breaker), so each page seeks past it instead of skipping OFFSET rows;
+    with a sorted index on the first ORDER BY column a page costs O(page_size).
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+    if columns is not None:
+        columns = [column_name(c) for c in columns]
+        for col in columns:
+            if col not in table.columns:
+                raise ValueError(f"Unknown column '{col}' for table '{table.name}'")
+
+    order_by = keyset_order(order_by, table.primary_key)
+    if not order_by:
+        raise ValueError(f"Keyset pagination on '{table.name}' needs ORDER BY")
+    _check_order(table, order_by)
+
+    key = sort_key(order_by)
+    after = None
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(order_by):
+            raise ValueError("Pagination cursor does not match this query's ORDER BY")
+        after = dict(zip((c for c, _ in order_by), values))
+
+    indexed = _uses_index_order(table, order_by, predicate)
+    if indexed:
+        if snapshot is not None:
+            rows = _snapshot_ordered(table, order_by, predicate, snapshot, page_size, after)
+        else:
+            rows = _index_ordered(table, order_by, after[order_by[0][0]] if after else None)
+            if predicate is not None:
+                rows = filter(predicate.test, rows)
+        if _archived(table):
+            archived = _archived_ordered(table, order_by, predicate, after[order_by[0][0]] if after else None)
+            rows = heapq.merge(rows, archived, key=key)
+        if after is not None:
+            boundary = key(after)
+            rows = (r for r in rows if boundary < key(r))
+        page = list(islice(rows, page_size))
+    else:
+        rows = table.scan(predicate, snapshot=snapshot)
+        if after is not None:
+            boundary = key(after)
+            rows = (r for r in rows if boundary < key(r))
+        page = heapq.nsmallest(page_size, rows, key=key)
+
+    next_cursor = None
+    if len(page) == page_size:
+        next_cursor = encode_cursor([page[-1].get(c) for c, _ in order_by])
+
+    return list(_project(page, columns)), next_cursor
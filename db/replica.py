@@ -0,0 +1,276 @@
+"""
+Log-shipping read replicas.
+
+The primary streams every WAL record, in LSN order, to follower processes
+over a local socket; each follower applies them to its own in-memory tables
+and answers read-only queries, so reporting scans and joins stop competing
+with payments for the primary's latches and CPU.
+
+    export DB_REPLICATION_KEY=$(openssl rand -hex 32)                  # shared by both
+    DB_REPLICATION_PORT=7450 uvicorn lipafast.main:app                 # primary
+    DB_REPLICA_OF=127.0.0.1:7450 uvicorn lipafast.main:app --port 8001 # follower
+
+A follower starts from a consistent export of the primary (Database.export)
+and from then on receives records from the primary's in-memory backlog of
+recent records. A follower that falls further behind than the backlog, or
+reconnects after the primary lost records it had already shipped, is sent
+a fresh export. Each record is applied inside one MVCC version, so a
+snapshot read on the follower never sees half of a transaction.
+
+Followers reject writes. Read-your-writes: a write on the primary returns
+its LSN; a read on a follower passing it as `min_lsn` waits until the
+follower has applied that LSN (Replica.wait_for). Records are shipped when
+they are logged, before group commit has made them durable.
+
+Connections are authenticated with DB_REPLICATION_KEY, which has no
+default: messages are pickled, so anyone holding the key can run code in
+the primary or a follower.
+"""
+import json
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from .database import Database
+from .table import Table
+
+DEFAULT_PORT = 7450
+
+
+def _authkey():
+    key = os.environ.get("DB_REPLICATION_KEY")
+    if not key:
+        raise RuntimeError("DB_REPLICATION_KEY must be set to the shared secret of the primary and its followers")
+    return key.encode()
+
+
+class ReplicationServer:
+    """Primary side: keeps the backlog of recent WAL records and feeds every connected follower."""
+
+    def __init__(self, db, port=DEFAULT_PORT, host="127.0.0.1", backlog=100_000, batch=512, heartbeat=0.5):
+        self.db = db
+        self.address = (host, port)
+        self.backlog = backlog  # records kept for followers that reconnect
+        self.batch = batch
+        self.heartbeat = heartbeat
+        self._records = []  # (commit time, WAL line) of LSNs first_lsn, first_lsn + 1, ...
+        self._first_lsn = db.wal.lsn + 1
+        self._cond = threading.Condition()
+        self._listener = None
+        self._stop = threading.Event()
+        self.followers = {}  # connected follower -> last LSN sent to it
+
+    def start(self):
+        self.db.wal.listeners.append(self._publish)
+        self._listener = Listener(self.address, authkey=_authkey())
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._publish in self.db.wal.listeners:
+            self.db.wal.listeners.remove(self._publish)
+        if self._listener is not None:
+            self._listener.close()
+        with self._cond:
+            self._cond.notify_all()
+
+    # called under the WAL lock, so LSNs arrive in order and without gaps
+    def _publish(self, lsn, line):
+        with self._cond:
+            self._records.append((time.time(), line))
+            overflow = len(self._records) - self.backlog
+            if overflow > self.backlog // 10:
+                del self._records[:overflow]
+                self._first_lsn += overflow
+            self._cond.notify_all()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._stop.is_set():
+                    return
+                continue  # failed handshake, e.g. a client with the wrong key
+            threading.Thread(target=self._feed, args=(conn,), daemon=True).start()
+
+    def _pending(self, sent):
+        """Records after `sent`, or None when the backlog no longer reaches back that far."""
+        if sent + 1 < self._first_lsn or sent > self.db.wal.lsn:
+            return None
+        start = sent + 1 - self._first_lsn
+        return [(sent + 1 + i, ts, line) for i, (ts, line) in enumerate(self._records[start:start + self.batch])]
+
+    def _feed(self, conn):
+        peer = f"follower-{id(conn)}"
+        try:
+            _, sent = conn.recv()  # ("hello", last LSN the follower applied)
+            if sent == 0:
+                sent = -1  # a new follower always starts from an export
+            while not self._stop.is_set():
+                with self._cond:
+                    records = self._pending(sent)
+                    if records == []:
+                        self._cond.wait(self.heartbeat)
+                        records = self._pending(sent)
+                if records is None:
+                    data = self.db.export()
+                    sent = json.loads(data)["lsn"]
+                    conn.send(("snapshot", data))
+                elif records:
+                    sent = records[-1][0]
+                    conn.send(("records", records, self.db.wal.lsn))
+                else:
+                    conn.send(("heartbeat", self.db.wal.lsn))
+                self.followers[peer] = sent
+        except (OSError, EOFError):
+            pass  # the follower went away; it reconnects with its own LSN
+        finally:
+            self.followers.pop(peer, None)
+            conn.close()
+
+    def status(self):
+        lsn = self.db.wal.lsn
+        return {
+            "role": "primary",
+            "lsn": lsn,
+            "backlog_from": self._first_lsn,
+            "followers": [{"follower": peer, "sent_lsn": sent, "records_behind": lsn - sent} for peer, sent in self.followers.items()],
+        }
+
+
+def serve_replicas(db, port=None):
+    """Start shipping `db`'s WAL to followers on DB_REPLICATION_PORT (or `port`)."""
+    server = ReplicationServer(db, port or int(os.environ.get("DB_REPLICATION_PORT", DEFAULT_PORT))).start()
+    db.replication = server
+    return server
+
+
+class Replica(Database):
+    """
+    A read-only Database fed by a primary's ReplicationServer.
+
+    `path` should be the primary's, so that sealed partitions are read from
+    the same archive directory; the replica never writes a file of its own.
+    """
+
+    read_only = True
+
+    def __init__(self, primary, path="data/db.json", reconnect=1.0):
+        self.primary = primary  # (host, port) of the ReplicationServer
+        self._authkey = _authkey()  # checked here, not in the receiver thread
+        self.reconnect = reconnect
+        self.applied_lsn = 0
+        self.primary_lsn = 0
+        self.connected = False
+        self.synced = False  # has the first export arrived
+        self._applied = threading.Condition()
+        self._behind_since = None
+        self._stopped = threading.Event()
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        super().__init__(path, fsync="none")
+        self.replication = self
+        self._receiver.start()
+
+    def _load(self):
+        pass  # tables arrive from the primary
+
+    def save(self):
+        pass  # the primary checkpoints; a replica recovers by re-syncing
+
+    def close(self):
+        self._stopped.set()
+        super().close()
+
+    def check_writable(self):
+        if threading.current_thread() is not self._receiver:
+            raise ValueError("Database is a read-only replica")
+
+    def log(self, record):
+        return None  # already in the primary's WAL
+
+    @property
+    def visible_lsn(self):
+        return self.applied_lsn
+
+    def wait_for(self, lsn, timeout=None):
+        """Block until everything up to `lsn` has been applied; False on timeout."""
+        with self._applied:
+            return self._applied.wait_for(lambda: self.synced and self.applied_lsn >= lsn, timeout)
+
+    def wait_ready(self, timeout=None):
+        return self.wait_for(0, timeout)
+
+    # ---------------- applying ----------------
+    def _receive(self):
+        while not self._stopped.is_set():
+            try:
+                conn = Client(self.primary, authkey=self._authkey)
+            except (OSError, EOFError, AuthenticationError):
+                self._stopped.wait(self.reconnect)
+                continue
+            self.connected = True
+            try:
+                conn.send(("hello", self.applied_lsn))
+                while not self._stopped.is_set():
+                    message = conn.recv()
+                    if message[0] == "snapshot":
+                        self._restore(message[1])
+                    elif message[0] == "records":
+                        self._observe(message[2])
+                        for lsn, _, line in message[1]:
+                            if lsn > self.applied_lsn:
+                                with self.versions.write():
+                                    self._apply(json.loads(line))
+                                self._advance(lsn)
+                    else:
+                        self._observe(message[1])
+            except (OSError, EOFError):
+                pass
+            finally:
+                self.connected = False
+                conn.close()
+            self._stopped.wait(self.reconnect)
+
+    def _restore(self, data):
+        raw = json.loads(data)
+        tables = {name: Table.from_dict(table_data, self) for name, table_data in raw["tables"].items()}
+        with self.lock:
+            self.tables.clear()
+            self.tables.update(tables)
+            self.results.clear()
+        self._observe(raw["lsn"])
+        # may move applied_lsn back, if the primary lost records it had already shipped
+        with self._applied:
+            self.synced = True
+        self._advance(raw["lsn"])
+
+    def _observe(self, primary_lsn):
+        with self._applied:
+            self.primary_lsn = primary_lsn
+            if self._behind_since is None and primary_lsn > self.applied_lsn:
+                self._behind_since = time.time()
+
+    def _advance(self, lsn):
+        with self._applied:
+            self.applied_lsn = lsn
+            if lsn >= self.primary_lsn:
+                self._behind_since = None
+            self._applied.notify_all()
+
+    # ---------------- lag ----------------
+    def lag(self):
+        with self._applied:
+            behind_since = self._behind_since
+            return {
+                "applied_lsn": self.applied_lsn,
+                "primary_lsn": self.primary_lsn,
+                "records_behind": max(self.primary_lsn - self.applied_lsn, 0),
+                "seconds_behind": round(time.time() - behind_since, 3) if behind_since is not None else 0.0,
+            }
+
+    def status(self):
+        return {"role": "replica", "primary": f"{self.primary[0]}:{self.primary[1]}", "connected": self.connected, **self.lag()}
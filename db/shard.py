@@ -0,0 +1,543 @@
+"""
+Hash-sharded storage across owner processes.
+
+A cluster of N shards runs N owner processes. Each owns an ordinary
+Database in its own directory (data/shards/<i>/db.json), created with the
+same schema as db/store.py, and serves requests on a local socket. Tables
+with a `wallet_id` column (wallets, ledger) are split by it; other tables
+live on shard 0 only. A wallet's row, its ledger entries and its payments
+therefore all stay in one process, and payments on different shards run on
+different cores.
+
+API workers route through a ShardRouter instead of opening a Database:
+
+    python -m lipafast.db.shard 4                         # the owners
+    DB_SHARDS=4 uvicorn lipafast.main:app --workers 4     # any number of API workers
+
+Statements pinned to one wallet (`wallet_id = ?` or `wallet_id IN (...)`
+in the WHERE clause, or the wallet_id of each INSERTed row) go to the owning
+shard(s). Everything else is scattered to every shard and gathered here:
+ORDER BY / LIMIT and keyset pages are merged, aggregates are combined from
+per-shard partials (AVG as SUM and COUNT), and joins on wallet_id run on
+each shard since both sides are co-located. Transactions and COPY stay
+local to one Database and are not routed; a multi-shard INSERT is atomic
+per shard, not across shards.
+
+Owners listen on 127.0.0.1:(DB_SHARD_PORT + i), default port 7400, and
+authenticate clients with DB_SHARD_KEY, which has no default: requests are
+pickled, so anyone holding the key can run code in the owners.
+
+    DB_SHARD_KEY=$(openssl rand -hex 32) python -m lipafast.db.shard 4
+"""
+import heapq
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+import zlib
+from itertools import islice
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+
+from .aggregate import _result
+from .predicate import Predicate, column_name, conjuncts, param_value
+from .query import decode_cursor, encode_cursor, keyset_order, sort_key, sort_rows
+from .table import COLUMN_TYPES
+
+SHARD_KEY = "wallet_id"
+DEFAULT_PORT = 7400
+
+
+def shard_for(value, count):
+    """Shard owning shard-key `value`: ints by modulo, anything else by CRC32 of its text."""
+    if isinstance(value, int):
+        return value % count
+    return zlib.crc32(str(value).encode()) % count
+
+
+def _address(index, host="127.0.0.1", port=None):
+    return host, (port or int(os.environ.get("DB_SHARD_PORT", DEFAULT_PORT))) + index
+
+
+def _authkey():
+    key = os.environ.get("DB_SHARD_KEY")
+    if not key:
+        raise RuntimeError("DB_SHARD_KEY must be set to the shared secret of the shard owners and API workers")
+    return key.encode()
+
+
+# ---------------- owner processes ----------------
+def serve(index, count, root="data/shards", port=None):
+    """Run shard `index` of `count` in this process until it is terminated."""
+    # db/store.py opens the database named here, with the shared schema
+    os.environ["DB_PATH"] = os.path.join(root, str(index), "db.json")
+    os.environ["DB_SHARD"] = f"{index}/{count}"
+    os.environ.pop("DB_SHARDS", None)
+    from .. import repl
+    from ..fintech import ledger
+    from ..fintech.duplicates import detector
+    from ..fintech.reconcile import reconcile
+    from .store import db
+
+    operations = {
+        "execute": repl.execute,
+        "page": repl.execute_page,
+        "schema": lambda name: db.t(name).schema(),
+        "open_wallet": lambda *args: ledger.open_wallet(db, *args),
+        "edit_wallet": lambda *args: ledger.edit_wallet(db, *args),
+        "deactivate_wallet": lambda *args: ledger.deactivate_wallet(db, *args),
+        "pay": lambda *args: ledger.pay(db, *args),
+        "batch": lambda *args: ledger.batch(db, *args),
+        "dashboard": lambda: ledger.dashboard(db),
+        "duplicates": lambda: detector.summary(),
+        "reconcile": lambda *args: reconcile(db, *args),
+    }
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", _plain(operations[op](*args)))
+                except Exception as e:
+                    reply = ("error", type(e).__name__, str(e))
+                conn.send(reply)
+
+    # SIGTERM exits through atexit, so the database is checkpointed and closed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with Listener(_address(index, port=port), authkey=_authkey()) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue  # failed handshake, e.g. a client with the wrong key
+            threading.Thread(target=handle, args=(conn,), name=f"shard-{index}-client", daemon=True).start()
+
+
+def _plain(result):
+    """Results cross the socket pickled: columnar Row views become dicts."""
+    if isinstance(result, list):
+        return [dict(r) if hasattr(r, "keys") and type(r) is not dict else r for r in result]
+    if isinstance(result, dict):
+        return {k: _plain(v) for k, v in result.items()}
+    return result
+
+
+class ShardCluster:
+    """Starts and stops the owner processes of a `count`-shard cluster."""
+
+    def __init__(self, count, root="data/shards", port=None):
+        if count < 1:
+            raise ValueError("A cluster needs at least one shard")
+        self.count = count
+        self.root = root
+        self.port = port
+        self.processes = []
+
+    def start(self):
+        # a cluster started in-process (tests, benchmarks) gets a random key;
+        # the owners inherit it and routers in this process read it back
+        os.environ.setdefault("DB_SHARD_KEY", secrets.token_hex(32))
+        context = get_context("spawn")  # owners must not inherit this process's open database
+        for index in range(self.count):
+            process = context.Process(
+                target=serve, args=(index, self.count, self.root, self.port), name=f"lipafast-shard-{index}"
+            )
+            process.start()
+            self.processes.append(process)
+        return self
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+# ---------------- routing ----------------
+_ERRORS = {"ValueError": ValueError, "LookupError": LookupError, "KeyError": KeyError, "TypeError": TypeError}
+
+
+class ShardRouter:
+    """
+    Client side of a cluster: runs statements and wallet operations on the
+    shards that own them. Each thread keeps its own connection per shard,
+    so concurrent requests reach the owners concurrently.
+    """
+
+    def __init__(self, count, host="127.0.0.1", port=None):
+        self.count = count
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+        self._schemas = {}  # table -> schema of shard 0
+
+    # ---------------- transport ----------------
+    def _conn(self, index):
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        if index not in conns:
+            conns[index] = Client(_address(index, self.host, self.port), authkey=_authkey())
+        return conns[index]
+
+    def _drop(self, index):
+        """Close and forget the connection to shard `index`; the next request opens a new one."""
+        conn = getattr(self._local, "conns", {}).pop(index, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _send(self, index, op, args):
+        try:
+            self._conn(index).send((op, args))
+        except OSError:
+            self._drop(index)
+            raise
+
+    def _recv(self, index):
+        try:
+            reply = self._conn(index).recv()
+        except (EOFError, OSError):
+            self._drop(index)
+            raise ConnectionError(f"Shard {index} closed the connection")
+        except BaseException:
+            # a half-read reply would be taken for the next request's
+            self._drop(index)
+            raise
+        if reply[0] == "error":
+            raise _ERRORS.get(reply[1], RuntimeError)(reply[2])
+        return reply[1]
+
+    def _scatter(self, shards, op, *args):
+        return self._gather({index: (op, args) for index in shards})
+
+    def _gather(self, requests):
+        """
+        Send each shard its (op, args) before waiting on any, so they run in
+        parallel. Every shard that was sent a request has its reply read even
+        when another send or reply fails, so each connection stays in step;
+        one whose reply is never read is dropped.
+        """
+        pending, results, error = [], [], None
+        try:
+            for index, (op, args) in requests.items():
+                try:
+                    self._send(index, op, args)
+                except Exception as e:  # e.g. the shard refused the connection
+                    error = e
+                    break
+                pending.append(index)
+            while pending:
+                try:
+                    results.append(self._recv(pending[0]))
+                except Exception as e:
+                    error = error or e
+                del pending[0]
+        finally:
+            for index in pending:
+                self._drop(index)
+        if error is not None:
+            raise error
+        return results
+
+    def call(self, key, op, *args):
+        """Run wallet operation `op` (fintech/ledger.py) on the shard owning `key`."""
+        return self._scatter([shard_for(self._key("wallets", key), self.count)], op, *args)[0]
+
+    # ---------------- catalog ----------------
+    def schema(self, table):
+        if table not in self._schemas:
+            self._schemas[table] = self._scatter([0], "schema", table)[0]
+        return self._schemas[table]
+
+    def _sharded(self, table):
+        return SHARD_KEY in self.schema(table)["columns"]
+
+    def _key(self, table, value):
+        """Shard-key `value` as `table` stores it, so 3, 3.0 and '3' hash to the same shard."""
+        col_type = COLUMN_TYPES.get(self.schema(table)["columns"][SHARD_KEY])
+        if col_type is None or value is None or type(value) is col_type:
+            return value
+        try:
+            cast = col_type(value)
+        except (TypeError, ValueError):
+            return value  # the owning shard rejects it with the column's type error
+        return cast if isinstance(value, str) or cast == value else value
+
+    def _shards(self, table, where=None, params=None):
+        """Shards a statement on `table` has to reach."""
+        if not self._sharded(table):
+            return [0]
+        values = _pinned(where, params)
+        if values is None:
+            return list(range(self.count))
+        return sorted({shard_for(self._key(table, v), self.count) for v in values})
+
+    # ---------------- statements ----------------
+    def execute(self, parsed, params=None):
+        qtype = parsed["type"]
+        statement = _wire(parsed)
+
+        if qtype in ("CREATE_TABLE", "CREATE_INDEX"):
+            self._schemas.pop(parsed["table_name"], None)
+            return self._scatter(range(self.count), "execute", statement, params)[0]
+        if qtype == "SHOW_TABLES":
+            return self._scatter([0], "execute", statement, params)[0]
+        if qtype == "INSERT":
+            return self._insert(statement, params)
+        if qtype in ("UPDATE", "DELETE"):
+            table = parsed["table_name"]
+            if qtype == "UPDATE" and self._sharded(table) and SHARD_KEY in [column_name(p["column"]) for p in parsed["set_pairs"]]:
+                raise ValueError(f"'{SHARD_KEY}' cannot be updated: it decides which shard holds the row")
+            results = self._scatter(self._shards(table, parsed["where"], params), "execute", statement, params)
+            return {"rows_affected": sum(r["rows_affected"] for r in results)}
+        if qtype == "JOIN":
+            return self._join(statement, params)
+        if qtype == "SELECT":
+            if parsed.get("aggregates"):
+                return self._aggregate(statement, params)
+            return self._select(statement, params)
+        if qtype in ("BEGIN", "COMMIT", "ROLLBACK", "COPY"):
+            raise ValueError(f"{qtype} is not available in sharded mode")
+        raise ValueError(f"Unsupported query type: {qtype}")
+
+    def _insert(self, parsed, params):
+        table = parsed["table_name"]
+        if not self._sharded(table):
+            return self._scatter([0], "execute", parsed, params)[0]
+
+        cols = parsed["columns"] or list(self.schema(table)["columns"])
+        if SHARD_KEY not in cols:
+            raise ValueError(f"Rows inserted into '{table}' need a '{SHARD_KEY}'")
+        position = cols.index(SHARD_KEY)
+        by_shard = {}
+        for values in parsed["rows"]:
+            node = values[position] if position < len(values) else ("lit", None)
+            value = param_value(params, node[1]) if node[0] == "param" else node[1]
+            if value is None:
+                raise ValueError(f"Rows inserted into '{table}' need a '{SHARD_KEY}'")
+            by_shard.setdefault(shard_for(self._key(table, value), self.count), []).append(values)
+
+        results = self._gather({
+            index: ("execute", ({**parsed, "rows": rows}, params)) for index, rows in sorted(by_shard.items())
+        })
+        return {"rows_affected": sum(r["rows_affected"] for r in results)}
+
+    def _join(self, parsed, params):
+        left, right = parsed["table1"], parsed["table2"]
+        sharded = self._sharded(left), self._sharded(right)
+        if sharded == (False, False):
+            shards = [0]
+        elif sharded == (True, True) and parsed["left_column"] == parsed["right_column"] == SHARD_KEY:
+            # both sides are split by the join column: every match is within one shard
+            shards = self._shards(left, parsed["where"], params)
+        else:
+            raise ValueError(f"Sharded joins must join two sharded tables on '{SHARD_KEY}'")
+        return [row for rows in self._scatter(shards, "execute", parsed, params) for row in rows]
+
+    def _select(self, parsed, params):
+        order_by, limit, offset = parsed["order_by"], parsed["limit"], parsed["offset"]
+        columns = parsed["columns"]
+        statement = dict(parsed, offset=0, limit=None if limit is None else offset + limit)
+        if order_by:
+            statement["columns"] = None  # rows keep the ORDER BY columns for the merge
+        parts = self._scatter(self._shards(parsed["table_name"], parsed["where"], params), "execute", statement, params)
+
+        end = None if limit is None else offset + limit
+        if order_by:
+            # each shard's rows are already in order
+            return _project(islice(heapq.merge(*parts, key=sort_key(order_by)), offset, end), columns)
+        return list(islice((row for part in parts for row in part), offset, end))
+
+    def _aggregate(self, parsed, params):
+        """
+        Scatter an aggregate SELECT as per-shard partials and combine them here:
+        SUM and COUNT add up, MIN / MAX take the extreme, AVG is sent as SUM and
+        COUNT. HAVING, ORDER BY and LIMIT apply to the combined groups.
+        """
+        items, extra, group_by = parsed["aggregates"], parsed["having_aggregates"], parsed["group_by"] or []
+        grouping = {i["column"]: i["alias"] for i in items if i["func"] is None}
+        keys = [grouping.get(expr) or f"_group_{n}" for n, expr in enumerate(group_by)]
+
+        partial = [{"func": None, "column": expr, "alias": key} for expr, key in zip(group_by, keys)]
+        for agg in (i for i in items + extra if i["func"] is not None):
+            if agg["func"] == "AVG":
+                partial.append({**agg, "func": "SUM", "alias": agg["alias"] + "_sum"})
+                partial.append({**agg, "func": "COUNT", "alias": agg["alias"] + "_count"})
+            else:
+                partial.append(agg)
+        statement = dict(
+            parsed, aggregates=partial, having=None, having_aggregates=[], order_by=None, limit=None, offset=0
+        )
+        parts = self._scatter(self._shards(parsed["table_name"], parsed["where"], params), "execute", statement, params)
+
+        groups = {}
+        for row in (row for part in parts for row in part):
+            state = groups.setdefault(tuple(row[k] for k in keys), {})
+            for agg in partial[len(keys):]:
+                _combine(state, agg, row[agg["alias"]])
+
+        having = Predicate(parsed["having"], params=params) if parsed["having"] is not None else None
+        rows = []
+        for key, state in groups.items():
+            values = {}
+            for agg in (i for i in items + extra if i["func"] is not None):
+                alias = agg["alias"]
+                if agg["func"] == "AVG":
+                    total, count = state.get(alias + "_sum"), state.get(alias + "_count")
+                    values[alias] = _result("AVG", [count or 0, total])
+                else:
+                    values[alias] = state.get(alias)
+            out = {}
+            for item in items:
+                out[item["alias"]] = values[item["alias"]] if item["func"] else key[group_by.index(item["column"])]
+            if having is None or having.test({**values, **out}):
+                rows.append(out)
+
+        offset, limit = parsed["offset"], parsed["limit"]
+        if parsed["order_by"]:
+            return sort_rows(rows, parsed["order_by"], limit, offset)
+        return rows[offset:None if limit is None else offset + limit]
+
+    def execute_page(self, parsed, params=None, page_size=100, cursor=None):
+        """A keyset page merged from one page per shard, all seeking past the same cursor."""
+        if parsed["type"] != "SELECT" or parsed.get("aggregates"):
+            raise ValueError("Pagination is only supported for plain single-table SELECT")
+        table = parsed["table_name"]
+        order_by = keyset_order(parsed["order_by"], self.schema(table)["primary_key"])
+        if cursor is not None:
+            decode_cursor(cursor)  # reject a bad cursor before asking the shards
+        statement = dict(_wire(parsed), columns=None)
+        shards = self._shards(table, parsed["where"], params)
+        parts = self._scatter(shards, "page", statement, params, page_size, cursor)
+
+        page = heapq.nsmallest(page_size, (r for part in parts for r in part["result"]), key=sort_key(order_by))
+        next_cursor = None
+        if len(page) == page_size:
+            next_cursor = encode_cursor([page[-1].get(c) for c, _ in order_by])
+        return {"result": _project(page, parsed["columns"]), "next_cursor": next_cursor}
+
+    def dashboard(self):
+        parts = self._scatter(range(self.count), "dashboard")
+        recent = sort_rows((r for p in parts for r in p["recent_transactions"]), [("timestamp", True)], 10)
+        return {
+            "drivers": sorted((d for p in parts for d in p["drivers"]), key=lambda d: d["wallet_id"]),
+            "recent_transactions": recent,
+            "total_drivers": sum(p["total_drivers"] for p in parts),
+            "active_drivers": sum(p["active_drivers"] or 0 for p in parts),
+            "total_balance": sum(p["total_balance"] for p in parts),
+            "total_spent": sum(p["total_spent"] for p in parts),
+        }
+
+    def duplicates(self):
+        parts = self._scatter(range(self.count), "duplicates")
+        counters = ("tracked_events", "buckets", "checked", "flagged", "rejected", "evicted_early")
+        return {
+            "mode": parts[0]["mode"],
+            "window_seconds": parts[0]["window_seconds"],
+            **{name: sum(p[name] for p in parts) for name in counters},
+            "recent": sorted((f for p in parts for f in p["recent"]), key=lambda f: f["timestamp"]),
+        }
+
+    def reconcile(self, all_wallets=True):
+        """One reconciliation run on every shard, each against its own checkpoints."""
+        parts = self._scatter(range(self.count), "reconcile", all_wallets)
+        counters = ("rows_processed", "wallets_checked", "drifted")
+        return {
+            **{name: sum(p[name] for p in parts) for name in counters},
+            "drifted_wallets": sorted((w for p in parts for w in p["drifted_wallets"]), key=lambda w: w["wallet_id"]),
+            "shards": parts,
+        }
+
+    def batch(self, entries, atomic=True):
+        """ledger.batch() split by owning shard; `atomic` holds within each shard, not across them."""
+        started = time.perf_counter()
+        entries = [(self._key("wallets", entry[0]), *entry[1:]) for entry in entries]
+        groups = {}
+        for i, entry in enumerate(entries):
+            groups.setdefault(shard_for(entry[0], self.count), []).append(i)
+        parts = self._gather({index: ("batch", ([entries[i] for i in ids], atomic)) for index, ids in groups.items()})
+        results = [None] * len(entries)
+        for ids, part in zip(groups.values(), parts):
+            for i, result in zip(ids, part["results"]):
+                results[i] = result
+        seconds = time.perf_counter() - started
+        return {
+            "results": results,
+            "applied": sum(p["applied"] for p in parts),
+            "rejected": sum(p["rejected"] for p in parts),
+            "seconds": round(seconds, 6),
+            "entries_per_second": round(len(entries) / seconds) if seconds else None,
+        }
+
+
+def _wire(parsed):
+    """A parsed statement without its cached compiled predicates, which do not pickle."""
+    return {k: v for k, v in parsed.items() if not k.startswith("_")}
+
+
+def _project(rows, columns):
+    if columns is None:
+        return list(rows)
+    names = [column_name(c) for c in columns]
+    return [{c: r[c] for c in names} for r in rows]
+
+
+def _pinned(where, params):
+    """The shard-key values a WHERE clause restricts rows to, or None when it does not."""
+    for term in conjuncts(where) if where is not None else ():
+        if term[0] == "cmp" and term[1] == "=" and term[2][0] == "col" and column_name(term[2][1]) == SHARD_KEY:
+            if term[3][0] in ("lit", "param"):
+                return [_value(term[3], params)]
+        if term[0] == "in" and not term[3] and term[1][0] == "col" and column_name(term[1][1]) == SHARD_KEY:
+            if all(node[0] in ("lit", "param") for node in term[2]):
+                return [_value(node, params) for node in term[2]]
+    return None
+
+
+def _value(node, params):
+    return param_value(params, node[1]) if node[0] == "param" else node[1]
+
+
+def _combine(state, agg, value):
+    if value is None:
+        return
+    alias, func = agg["alias"], agg["func"]
+    current = state.get(alias)
+    if current is None:
+        state[alias] = value
+    elif func in ("SUM", "COUNT"):
+        state[alias] = current + value
+    elif func == "MIN":
+        state[alias] = min(current, value)
+    else:
+        state[alias] = max(current, value)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        sys.exit("usage: python -m lipafast.db.shard SHARDS")
+    if not os.environ.get("DB_SHARD_KEY"):
+        sys.exit("Set DB_SHARD_KEY to a shared secret; the API workers need the same value")
+    cluster = ShardCluster(int(sys.argv[1])).start()
+    print(f"{cluster.count} shards listening from port {_address(0)[1]}")
+    try:
+        for process in cluster.processes:
+            process.join()
+    except KeyboardInterrupt:
+        cluster.stop()
@@ -0,0 +1,215 @@
+"""
+Binary checkpoint format.
+
+    header   magic b"LIPAFAST", format version (u32), index offset, index length (u64)
+    segments one per table, each a run of length-prefixed blocks:
+               schema (JSON: Table.schema() plus row count and column layout)
+               per column, by encoding:
+                 int64 / float64  raw little-endian values, NULL slots (int64)
+                 dict             dictionary (JSON list), codes (uint16)
+                 object           values (JSON list)
+    index    JSON {"lsn": ..., "tables": {name: [offset, length]}}
+
+The file is memory-mapped and only the index is read at startup; a table's
+segment is decoded the first time the table is used (see Database.tables).
+Typed columns load with one memcpy instead of a JSON parse per value.
+
+Convert an existing JSON snapshot with
+
+    python -m lipafast.db.snapfile data/db.json [data/db.snap]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from .columnar import DictColumn, ObjectColumn, TypedColumn, make_column
+
+MAGIC = b"LIPAFAST"
+VERSION = 1
+_HEADER = struct.Struct("<8sIQQ")
+_LENGTH = struct.Struct("<Q")
+_SWAP = sys.byteorder != "little"
+
+
+def is_snapshot(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# ---------------- writing ----------------
+def _block(f, payload):
+    f.write(_LENGTH.pack(len(payload)))
+    f.write(payload)
+
+
+def _json(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _raw(values):
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _columns(table):
+    """The table's live rows column by column: a columnar store as is, anything else encoded here."""
+    store = table._store
+    if store is not None and not store.deleted:
+        return store.columns, len(store.by_slot)
+    columns = {}
+    for name, col_type in table.columns.items():
+        values = [r.get(name) for r in table.rows]
+        column = make_column(col_type)
+        if not column.fits_all(values):
+            column = ObjectColumn()
+        column.extend(values)
+        columns[name] = column
+    return columns, len(table.rows)
+
+
+def write_table(f, table):
+    columns, count = _columns(table)
+    layout = [[name, column.encoding] for name, column in columns.items()]
+    _block(f, _json(dict(table.schema(), count=count, layout=layout)))
+    for column in columns.values():
+        if column.encoding == "dict":
+            _block(f, _json(column.dictionary[1:]))
+            _block(f, _raw(column.codes[:count]))
+        elif column.encoding == "object":
+            _block(f, _json(column.data[:count]))
+        else:
+            _block(f, _raw(column.data[:count]))
+            _block(f, _raw(array("q", sorted(column.nulls))))
+
+
+def write(f, lsn, tables, source=None):
+    """
+    Write a snapshot to the binary file `f`. `tables` maps names to Table
+    objects, or to None for a table never loaded from `source` (the open
+    SnapshotFile), whose segment is copied over unchanged.
+    """
+    f.write(_HEADER.pack(MAGIC, VERSION, 0, 0))
+    index = {}
+    for name, table in tables.items():
+        start = f.tell()
+        if table is None:
+            f.write(source.segment(name))
+        else:
+            write_table(f, table)
+        index[name] = [start, f.tell() - start]
+
+    payload = _json({"lsn": lsn, "tables": index})
+    offset = f.tell()
+    f.write(payload)
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, VERSION, offset, len(payload)))
+
+
+# ---------------- reading ----------------
+def _array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+class SnapshotFile:
+    """A binary snapshot opened with mmap; tables are decoded one at a time."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, offset, length = _HEADER.unpack_from(self._map, 0)
+        except (ValueError, struct.error):
+            self._file.close()
+            raise ValueError(f"{self.path} is not a binary snapshot")
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a binary snapshot")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot format version {version} in {self.path}")
+        index = json.loads(self._map[offset:offset + length])
+        self.lsn = index["lsn"]
+        self.segments = index["tables"]  # name -> [offset, length]
+
+    def segment(self, name):
+        offset, length = self.segments[name]
+        return self._map[offset:offset + length]
+
+    def schema(self, name):
+        """A table's schema block alone (Table.schema() as written), without decoding its rows."""
+        pos = self.segments[name][0] + _LENGTH.size
+        (length,) = _LENGTH.unpack_from(self._map, pos - _LENGTH.size)
+        schema = json.loads(self._map[pos:pos + length])
+        del schema["layout"], schema["count"]
+        return schema
+
+    def read_table(self, name):
+        """(schema, {column: decoded column}, row count) of one table."""
+        pos = self.segments[name][0]
+
+        def block():
+            nonlocal pos
+            (length,) = _LENGTH.unpack_from(self._map, pos)
+            pos += _LENGTH.size
+            pos += length
+            return self._map[pos - length:pos]
+
+        schema = json.loads(block())
+        columns = {}
+        for column_name, encoding in schema.pop("layout"):
+            if encoding == "dict":
+                column = DictColumn()
+                column.dictionary.extend(json.loads(block()))
+                column.lookup = {value: code for code, value in enumerate(column.dictionary)}
+                column.codes = _array("H", block())
+            elif encoding == "object":
+                column = ObjectColumn(json.loads(block()))
+            else:
+                column = TypedColumn(int if encoding == "int64" else float)
+                column.data = _array(column.data.typecode, block())
+                column.nulls = set(_array("q", block()))
+            columns[column_name] = column
+        return schema, columns, schema.pop("count")
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# ---------------- JSON -> binary ----------------
+def convert(source, target=None):
+    """Rewrite a JSON snapshot (data/db.json) in the binary format; returns the new path."""
+    from .table import Table
+
+    source = Path(source)
+    target = Path(target) if target is not None else source.with_suffix(".snap")
+    raw = json.loads(source.read_text())
+    lsn = 0
+    if isinstance(raw.get("lsn"), int) and "tables" in raw:
+        lsn, raw = raw["lsn"], raw["tables"]
+    tables = {name: Table.from_dict(data, None) for name, data in raw.items()}
+
+    tmp = target.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        write(f, lsn, tables)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+    return target
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python -m lipafast.db.snapfile SOURCE.json [TARGET.snap]")
+    print(convert(*sys.argv[1:]))
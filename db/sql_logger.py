@@ -1,13 +1,181 @@
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
 LOG_FILE = Path("data/sql.log")
 
+
+class SQLLogger:
+    """
+    Append-only audit log of executed SQL, one `[timestamp] [source] sql` line per statement.
+
+    Lines are buffered and flushed at least every `flush_interval` seconds. With
+    `threaded=True` callers only enqueue the line and a worker thread does the I/O.
+    The file rolls over to `sql.log.1`, `sql.log.2`, ... once it reaches `max_bytes`
+    or is older than `rotate_interval` seconds; `compress=True` gzips rolled segments.
+    """
+
+    def __init__(
+        self,
+        path=LOG_FILE,
+        max_bytes=10 * 1024 * 1024,
+        rotate_interval=None,
+        backups=5,
+        compress=False,
+        flush_interval=1.0,
+        threaded=False,
+    ):
+        if backups < 0:
+            raise ValueError("backups must be 0 or more")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.threaded = threaded
+
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._last_flush = time.monotonic()
+
+        self._open()
+        target = self._drain_loop if threaded else self._flush_loop
+        self._worker = threading.Thread(target=target, name="sql-logger", daemon=True)
+        self._worker.start()
+
+    def log(self, sql, source="REPL"):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] [{source}] {sql}\n"
+        if self.threaded:
+            self._queue.put(line)
+        else:
+            with self._lock:
+                self._write(line)
+
+    def flush(self):
+        with self._lock:
+            if self.threaded:
+                self._drain()
+            if self._file:
+                self._file.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._worker.join()
+        self.flush()
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _write(self, line):
+        if self._should_rotate():
+            self._rotate()
+        self._file.write(line)
+        self._size += len(line)
+
+    def _drain(self):
+        while True:
+            try:
+                line = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._write(line)
+
+    def _should_rotate(self):
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self):
+        self._file.close()
+        suffix = ".gz" if self.compress else ""
+
+        def segment(n):
+            return self.path.with_name(f"{self.path.name}.{n}{suffix}")
+
+        if not self.backups:
+            # no backups kept: the full log is simply started over
+            self.path.unlink()
+            self._open()
+            return
+
+        segment(self.backups).unlink(missing_ok=True)
+        for n in range(self.backups - 1, 0, -1):
+            if segment(n).exists():
+                os.replace(segment(n), segment(n + 1))
+
+        if self.compress:
+            with open(self.path, "rb") as src, gzip.open(segment(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            self.path.unlink()
+        else:
+            os.replace(self.path, segment(1))
+
+        self._open()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _drain_loop(self):
+        while not self._stop.is_set():
+            try:
+                line = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                line = None
+            with self._lock:
+                if line is not None:
+                    self._write(line)
+                self._drain()
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._file.flush()
+                    self._last_flush = time.monotonic()
+
+
+_logger = None
+_logger_lock = threading.RLock()
+
+
+def configure(**options):
+    """Replace the shared logger, e.g. configure(threaded=True, compress=True)."""
+    global _logger
+    with _logger_lock:
+        if _logger:
+            _logger.close()
+        _logger = SQLLogger(**options)
+        atexit.register(_logger.close)
+    return _logger
+
+
+def get_logger():
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                return configure()
+    return _logger
+
+
 def log_sql(sql: str, source="REPL"):
-    LOG_FILE.parent.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    LOG_FILE.write_text(
-        LOG_FILE.read_text() + f"[{timestamp}] [{source}] {sql}\n"
-        if LOG_FILE.exists()
-        else f"[{timestamp}] [{source}] {sql}\n"
-    )
+    get_logger().log(sql, source)
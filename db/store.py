@@ -1,28 +1,105 @@
+import os
 from .database import Database
+from .replica import Replica, serve_replicas
+from .shard import ShardRouter
 
-db = Database("data/db.json")
 
-db.create_table(
-    "wallets",
-    columns= {
-        "wallet_id": int, 
-        "owner": str,
-        # "phone": str,
-        "balance": float,
-        "status": str
-        },
-    primary_key="wallet_id",
-)
-
-db.create_table(
-    "ledger",
-    columns= {
-        "transaction_id": int,
-        "wallet_id": int,
-        "owner": str,
-        "amount": float,
-        "direction": str,
-        "timestamp": str
+def create_schema(db):
+    db.create_table(
+        "wallets",
+        columns= {
+            "wallet_id": int, 
+            "owner": str,
+            # "phone": str,
+            "balance": float,
+            "status": str
+            },
+        primary_key="wallet_id",
+    )
+
+    db.create_table(
+        "ledger",
+        columns= {
+            "transaction_id": int,
+            "wallet_id": int,
+            "owner": str,
+            "amount": float,
+            "direction": str,
+            "timestamp": str
+            },
+        primary_key="transaction_id",
+        # append-mostly and the largest table: typed columns instead of a dict per row
+        storage="columnar",
+    )
+
+    # indexes, partitions and aggregates are added only where the schema lacks
+    # them: db.schema() reads a table still in the snapshot file from its
+    # header, so a restart leaves the wallets and ledger unloaded until used
+    wallets, ledger = db.schema("wallets"), db.schema("ledger")
+    ledger_indexes = {index["column"] for index in ledger["indexes"]}
+    wallet_aggregates = {aggregate["name"] for aggregate in wallets["aggregates"]}
+    ledger_aggregates = {aggregate["name"] for aggregate in ledger["aggregates"]}
+
+    # hottest ledger lookups: by wallet, and by time range
+    if "wallet_id" not in ledger_indexes:
+        db.t("ledger").create_index("wallet_id")
+    if "timestamp" not in ledger_indexes:
+        db.t("ledger").create_index("timestamp", kind="sorted")
+    # ledger rows since the last reconciliation (fintech/reconcile.py)
+    if "transaction_id" not in ledger_indexes:
+        db.t("ledger").create_index("transaction_id", kind="sorted")
+
+    # monthly ledger partitions; all but the last three are sealed to disk at checkpoints
+    if ledger["partitions"] is None:
+        db.t("ledger").partition_by("timestamp", "month", keep=3)
+
+    # dashboard totals, maintained on every write instead of rescanned per page load
+    if "total_balance" not in wallet_aggregates:
+        db.t("wallets").create_aggregate("total_balance", "SUM", "balance")
+    if "active_wallets" not in wallet_aggregates:
+        db.t("wallets").create_aggregate("active_wallets", "COUNT", where={"status": "active"})
+    if "total_spent" not in ledger_aggregates:
+        db.t("ledger").create_aggregate("total_spent", "SUM", "amount", where={"direction": "debit"})
+
+    # reconciliation: each wallet's ledger total as of the last run, and the runs themselves
+    db.create_table(
+        "ledger_checkpoints",
+        columns={"wallet_id": int, "total": float, "entries": int, "transaction_id": int},
+        primary_key="wallet_id",
+    )
+    db.create_table(
+        "reconciliations",
+        columns={
+            "run_id": int,
+            "through_id": int,
+            "timestamp": str,
+            "rows_processed": int,
+            "wallets_checked": int,
+            "drifted": int
         },
-    primary_key="transaction_id",
-)
+        primary_key="run_id",
+    )
+
+
+# DB_SHARDS=N: this process only routes to the N shard owners (db/shard.py)
+SHARDS = int(os.environ.get("DB_SHARDS", 0))
+if SHARDS:
+    db = None
+    router = ShardRouter(SHARDS)
+elif os.environ.get("DB_REPLICA_OF"):
+    # DB_REPLICA_OF=host:port: a read-only follower of that primary (db/replica.py)
+    host, port = os.environ["DB_REPLICA_OF"].rsplit(":", 1)
+    db = Replica((host, int(port)), os.environ.get("DB_PATH", "data/db.json"))
+    router = None
+    if not db.wait_ready(timeout=30):
+        raise RuntimeError(f"No snapshot from primary {host}:{port}")
+else:
+    # DB_SHARD=i/N is set in the owner process of shard i
+    shard = tuple(map(int, os.environ.get("DB_SHARD", "0/1").split("/")))
+    # DB_FSYNC=group batches concurrent payment writes into one fsync
+    db = Database(os.environ.get("DB_PATH", "data/db.json"), fsync=os.environ.get("DB_FSYNC", "commit"), shard=shard)
+    router = None
+    create_schema(db)
+    # DB_REPLICATION_PORT=p: ship the WAL to read replicas connecting on that port
+    if os.environ.get("DB_REPLICATION_PORT"):
+        serve_replicas(db)
@@ -1,51 +1,155 @@
+from contextlib import contextmanager, nullcontext
+from .index import INDEX_TYPES
+from .locks import LockManager
+from .aggregate import MaterializedAggregate
+from .columnar import ColumnStore
+from .partition import PartitionScheme, PartitionSet, SealedPartition
+from .predicate import candidate_rows, column_name
+from .vector import BatchScan, prefers_batches
+
+
+STORAGE = ("rows", "columnar")
+# column type names as stored in snapshots
+COLUMN_TYPES = {t.__name__: t for t in (int, float, str, bool)}
+
+
 class Table:
-    def __init__(self, name, columns, db=None, primary_key=None, unique_keys=None):
+    def __init__(self, name, columns, db=None, primary_key=None, unique_keys=None, storage="rows"):
+        if storage not in STORAGE:
+            raise ValueError(f"Unknown storage '{storage}'. Expected one of: {', '.join(STORAGE)}")
         self.name = name
         self.columns = columns
         self.primary_key = primary_key
         self.unique_keys = unique_keys or []
         self.db = db  # 🔹 NEW: reference to Database
 
+        # "rows": one dict per row; "columnar": typed column arrays behind Row views (db/columnar.py)
+        self.storage = storage
+        self._store = ColumnStore(columns) if storage == "columnar" else None
         self.rows = []
         self.pk_index = {}
         self.unique_indexes = {k: {} for k in self.unique_keys}
-        self._auto_id = 1
+        self.indexes = {}  # column -> HashIndex / SortedIndex
+        self.aggregates = {}  # name -> MaterializedAggregate
+        self.partitions = None  # PartitionSet once partition_by() is called (db/partition.py)
+        self.version = 0  # commit timestamp of the last change (db/cache.py)
+        # a shard hands out auto ids shard + 1, shard + 1 + count, ... so shards never repeat one (db/shard.py)
+        self._shard, self._id_step = (db.shard, db.shard[1]) if db is not None else ((0, 1), 1)
+        self._auto_id = self._shard[0] + 1
+        self._locks = db.locks if db is not None else LockManager()
+        self._lock = self._locks.latch(name)  # table latch: rows list, indexes, aggregates
+        # MVCC: id(row) -> (row, [(version, before-image)]) while a snapshot may need them
+        self._history = {}
+        self._graveyard = {}  # id(row) -> deleted row still visible to older snapshots
 
     def insert(self, row: dict):
-        if self.primary_key and self.primary_key not in row:
-            row[self.primary_key] = self._auto_id
-            self._auto_id += 1
+        with self._write_scope(), self._lock:
+            if self.primary_key and self.primary_key not in row:
+                row[self.primary_key] = self._auto_id
+                self._auto_id += self._id_step
 
-        if self.primary_key:
-            pk = row[self.primary_key]
-            if pk in self.pk_index:
-                raise ValueError(f"Primary key '{self.primary_key}' violation: {pk}")
+            if self.primary_key:
+                pk = row[self.primary_key]
+                if pk in self.pk_index:
+                    raise ValueError(f"Primary key '{self.primary_key}' violation: {pk}")
 
-        for col in self.unique_keys:
-            if row.get(col) in self.unique_indexes[col]:
-                raise ValueError(f"Unique constraint violated on '{col}': {row.get(col)}")
+            for col in self.unique_keys:
+                if row.get(col) in self.unique_indexes[col]:
+                    raise ValueError(f"Unique constraint violated on '{col}': {row.get(col)}")
 
-        for col in row:
-            if col not in self.columns:
-                raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
+            for col in row:
+                if col not in self.columns:
+                    raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
 
-        for col in self.columns:
-            row.setdefault(col, None)
+            for col in self.columns:
+                row.setdefault(col, None)
 
-        for col, col_type in self.columns.items():
-            if row[col] is not None and not isinstance(row[col], col_type):
-                raise TypeError(
-                    f"Column '{col}' expects type {col_type.__name__}, got {type(row[col]).__name__}"
-                )
+            self._cast(row)
+            if self.partitions is not None:
+                self.partitions.check_writable(self.name, row)
 
-        self.rows.append(row)
+            stored = self._add_row(row)
+            if self.primary_key:
+                pk = row[self.primary_key]
+                # keep auto ids ahead of explicit / replayed keys
+                if isinstance(pk, int) and pk >= self._auto_id:
+                    self._auto_id = self._next_id(pk)
 
-        if self.primary_key:
-            self.pk_index[row[self.primary_key]] = row
-        for col in self.unique_keys:
-            self.unique_indexes[col][row[col]] = row
+            self._hold_new([row])
+            lsn = self._persist("insert", undo=lambda: self._delete_row(stored), row=row)
+        self._wait_durable(lsn)
+
+    def insert_many(self, rows, log=True):
+        """
+        Validate and append a batch of rows all-or-nothing. Indexes are updated
+        once for the whole batch and the batch is logged as a single WAL record
+        (or not at all with log=False, when the caller checkpoints afterwards).
+        While replicas are being fed the batch is always logged: followers
+        only ever see what reaches the WAL.
+        """
+        db = self.db
+        if not log and db is not None and db.replication is not None and not db.read_only:
+            log = True
+        rows = list(rows)
+        columns = self.columns
+        pk_col = self.primary_key
+
+        with self._write_scope(), self._lock:
+            auto_id = self._auto_id
+            seen_pk = set()
+            seen_unique = {col: set() for col in self.unique_keys}
+            for row in rows:
+                if pk_col and pk_col not in row:
+                    row[pk_col] = auto_id
+                    auto_id += self._id_step
+
+                for col in row:
+                    if col not in columns:
+                        raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
+                for col in columns:
+                    row.setdefault(col, None)
+                self._cast(row)
+                if self.partitions is not None:
+                    self.partitions.check_writable(self.name, row)
 
-        self._persist()
+                if pk_col:
+                    pk = row[pk_col]
+                    if pk in self.pk_index or pk in seen_pk:
+                        raise ValueError(f"Primary key '{pk_col}' violation: {pk}")
+                    seen_pk.add(pk)
+                    if isinstance(pk, int) and pk >= auto_id:
+                        auto_id = self._next_id(pk)
+                for col, seen in seen_unique.items():
+                    value = row[col]
+                    if value in self.unique_indexes[col] or value in seen:
+                        raise ValueError(f"Unique constraint violated on '{col}': {value}")
+                    seen.add(value)
+
+            self._auto_id = auto_id
+            # the WAL gets the validated dicts; the table keeps `stored`
+            stored = rows if self._store is None else self._store.attach_many(rows)
+            version = self._version()
+            for row in stored:
+                self._track(row, version, existed=False)
+            self.rows.extend(stored)
+            if pk_col:
+                self.pk_index.update((row[pk_col], row) for row in stored)
+            for col in self.unique_keys:
+                self.unique_indexes[col].update((row[col], row) for row in stored)
+            for index in self.indexes.values():
+                index.add_many(stored)
+            for row in stored:
+                self._apply_aggregates(row, version)
+
+            self._hold_new(rows)
+            lsn = self._persist("insert_many", undo=lambda: self._delete_rows(stored), rows=rows) if log else None
+        self._wait_durable(lsn)
+        return len(rows)
+
+    def _next_id(self, pk):
+        """The first auto id above `pk` that belongs to this shard."""
+        index, count = self._shard
+        return pk + 1 + (index - pk) % count
 
     # get
     def find(self, column, value):
@@ -53,72 +157,691 @@ class Table:
             return self.pk_index.get(value)
         if column in self.unique_indexes:
             return self.unique_indexes[column].get(value)
+        if column in self.indexes:
+            return next(iter(self.indexes[column].buckets.get(value, {}).values()), None)
         return next((r for r in self.rows if r.get(column) == value), None)
 
+    # per-row lock on a primary key value; hold it across a read-check-write sequence
+    def lock_row(self, key):
+        if not self.primary_key:
+            raise ValueError(f"Table '{self.name}' has no primary key to lock rows by")
+        return self._locks.row(self.name, key)
+
+    def lock_rows(self, keys):
+        if not self.primary_key:
+            raise ValueError(f"Table '{self.name}' has no primary key to lock rows by")
+        return self._locks.rows(self.name, keys)
+
+    @contextmanager
+    def _locked_find(self, column, value):
+        """find() while holding the row's lock, retrying if the row changed while we waited."""
+        while True:
+            row = self.find(column, value)
+            if row is None or not self.primary_key:
+                yield row
+                return
+            with self._locks.row(self.name, row[self.primary_key], self._lock_timeout()):
+                if self.find(column, value) is row:
+                    self._hold([row])
+                    yield row
+                    return
+
     # Update / PUT
     def update(self, column, value, updates: dict):
-        row = self.find(column, value)
-        if not row:
-            raise ValueError(f"Row not found for {column}={value}")
-
         if self.primary_key in updates:
             raise ValueError("Primary key cannot be updated")
+        updates = self._cast(dict(updates))
+        self._check_partition(updates)
 
-        row.update(updates)
-        self._persist()
+        with self._locked_find(column, value) as row:
+            if not row:
+                raise ValueError(f"Row not found for {column}={value}")
+
+            with self._write_scope(), self._lock:
+                lsn = self._logged_update(row, updates)
+        self._wait_durable(lsn)
 
     # delete
     def delete(self, column, value):
-        row = self.find(column, value)
-        if not row:
+        with self._locked_find(column, value) as row:
+            if not row:
+                return
+
+            with self._write_scope(), self._lock:
+                lsn = self._logged_delete(row)
+        self._wait_durable(lsn)
+
+    # rows matching `predicate`, with their row locks held (primary-keyed tables only)
+    @contextmanager
+    def _locked_matches(self, predicate):
+        # sealed partitions are read-only: only live rows are candidates
+        with self._lock:
+            rows = list(self._live_scan(predicate))
+        if not self.primary_key:
+            with self._write_scope(), self._lock:
+                yield list(self._live_scan(predicate))
             return
 
-        self.rows.remove(row)
+        pk = self.primary_key
+        with self._locks.rows(self.name, [r[pk] for r in rows], self._lock_timeout()):
+            with self._write_scope(), self._lock:
+                # drop rows deleted or changed to no longer match while we queued for their locks
+                rows = [r for r in rows if self.pk_index.get(r[pk]) is r and (predicate is None or predicate(r))]
+                self._hold(rows)
+                yield rows
+
+    # update every row matching `predicate`; returns the number of rows changed
+    def update_where(self, predicate, updates: dict):
+        if self.primary_key in updates:
+            raise ValueError("Primary key cannot be updated")
+        updates = self._cast(dict(updates))
+        self._check_partition(updates)
+
+        lsn = None
+        with self._locked_matches(predicate) as rows:
+            for row in rows:
+                lsn = self._logged_update(row, updates)
+        self._wait_durable(lsn)
+        return len(rows)
+
+    def delete_where(self, predicate):
+        lsn = None
+        with self._locked_matches(predicate) as rows:
+            for row in rows:
+                lsn = self._logged_delete(row)
+        self._wait_durable(lsn)
+        return len(rows)
+
+    def scan(self, predicate=None, columns=None, snapshot=None):
+        """
+        Yield rows matching a compiled Predicate, projected to `columns` if given.
+        With a Snapshot, rows are private copies as of the snapshot (see db/mvcc.py).
+        """
+        if columns is not None:
+            columns = [column_name(c) for c in columns]
+            for col in columns:
+                if col not in self.columns:
+                    raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
+
+        # live rows and sealed partitions are picked under one latch hold:
+        # _seal() moves rows from one to the other
+        with self._lock:
+            live = self._live_scan(predicate, columns, snapshot)
+            sealed = self._sealed_keys()
+        yield from live
+        if sealed:
+            yield from self.partitions.scan(predicate, columns, sealed)
+
+    def _live_scan(self, predicate=None, columns=None, snapshot=None):
+        """
+        Iterator over the live rows matching `predicate`. The rows to visit are
+        picked under the latch when it is called, so writes and seals made while
+        it is consumed never make it skip or repeat a row.
+        """
+        if snapshot is not None:
+            return self._snapshot_scan(predicate, columns, snapshot)
+
+        with self._lock:
+            if predicate is None:
+                return _emit(list(self.rows), None, columns)
+            if self._store is not None and prefers_batches(self, predicate):
+                # columnar: evaluate the WHERE clause a batch at a time (db/vector.py)
+                by_slot = list(self._store.by_slot)
+                slots = BatchScan(self, predicate).slots()
+                return _emit(map(by_slot.__getitem__, slots), None, columns)
+            return _emit(list(candidate_rows(self, predicate.node)), predicate.test, columns)
+
+    def _sealed_keys(self):
+        """Keys of the sealed partitions; read them under the latch along with the live rows."""
+        return list(self.partitions.sealed) if self.partitions is not None else []
+
+    def hidden_from(self, snapshot, predicate=None):
+        """
+        Live rows matching `predicate` that `snapshot` does not see: inserted or
+        changed by a statement or transaction that had not committed when it was
+        taken (or that started later). Returned as copies of their current values.
+        """
+        with self._lock:
+            return [dict(r) for r in self._live_scan(predicate) if snapshot.view(self, r) is None]
+
+    def _snapshot_scan(self, predicate, columns, snapshot):
+        if self._store is not None and prefers_batches(self, predicate):
+            # columnar: unchanged rows come straight from batches of column copies
+            names = columns or list(self.columns)
+            return BatchScan(self, predicate, names, snapshot).records(names)
+
+        with self._lock:
+            base = list(self.rows if predicate is None else candidate_rows(self, predicate.node))
+            # rows changed, deleted or inserted since older snapshots: the current
+            # indexes may no longer point at them, so they are always re-checked
+            changed = [row for row, _ in self._history.values()]
+        return self._snapshot_images(base, changed, predicate, columns, snapshot)
+
+    def _snapshot_images(self, base, changed, predicate, columns, snapshot):
+        test = predicate.test if predicate is not None else None
+        if changed:
+            changed_ids = {id(r) for r in changed}
+            base = [r for r in base if id(r) not in changed_ids] + changed
+
+        history = self._history
+        for r in base:
+            # a row with no history looks the same to every open snapshot, so a
+            # failed test on the live row is final (writers record history first)
+            if test is not None and not test(r) and id(r) not in history:
+                continue
+            image = snapshot.view(self, r)
+            if image is not None and (test is None or test(image)):
+                yield image if columns is None else {c: image[c] for c in columns}
+
+    def select(self, where=None):
+        if not where:
+            return list(self.rows)
+
+        candidates = self._candidates(where)
+        return [r for r in candidates if all(r.get(k) == v for k, v in where.items())]
+
+    # rows with low <= column <= high, in key order when a sorted index exists
+    def range(self, column, low=None, high=None, include_low=True, include_high=True):
+        index = self.indexes.get(column)
+        if index is not None and index.kind == "sorted":
+            return list(index.range(low, high, include_low, include_high))
+
+        def in_range(value):
+            if value is None:
+                return False
+            if low is not None and (value < low if include_low else value <= low):
+                return False
+            if high is not None and (value > high if include_high else value >= high):
+                return False
+            return True
+
+        return [r for r in self.rows if in_range(r.get(column))]
+
+    def create_index(self, column, kind="hash", name=None):
+        if column not in self.columns:
+            raise ValueError(f"Unknown column '{column}' for table '{self.name}'")
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{kind}'. Expected one of: {', '.join(INDEX_TYPES)}")
+        if self.db is not None:
+            self.db.check_writable()
+
+        with self._lock:
+            if column in self.indexes:
+                return self.indexes[column]
+
+            index = INDEX_TYPES[kind](name or f"{self.name}_{column}_idx", column)
+            index.build(self.rows)
+            self.indexes[column] = index
+            lsn = self._persist("create_index", column=column, kind=index.kind, name=index.name)
+        self._wait_durable(lsn)
+        return index
+
+    def create_aggregate(self, name, func, column=None, where=None):
+        """Keep SUM(column) / COUNT(*) over rows matching `where` ({col: value}) up to date."""
+        if column is not None and column not in self.columns:
+            raise ValueError(f"Unknown column '{column}' for table '{self.name}'")
+        for col in where or {}:
+            if col not in self.columns:
+                raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
+        if self.db is not None:
+            self.db.check_writable()
+
+        with self._lock:
+            if name in self.aggregates:
+                return self.aggregates[name]
+
+            agg = MaterializedAggregate(name, func, column, where)
+            agg.build(self.rows)
+            if self.partitions is not None:
+                # sealed rows count too: read each sealed partition once and remember its share
+                for key, partition in self.partitions.sealed.items():
+                    total = count = 0
+                    for row in self.partitions.load(key):
+                        delta = agg.contribution(row)
+                        if delta is not None:
+                            total += delta
+                            count += 1
+                    partition.aggregates[name] = [total, count]
+                    agg.total += total
+                    agg.count += count
+            self.aggregates[name] = agg
+            lsn = self._persist("create_aggregate", spec=agg.to_dict())
+        self._wait_durable(lsn)
+        return agg
+
+    def aggregate(self, name):
+        return self.aggregates[name].value
+
+    # a materialized aggregate answering func(column) WHERE <equality filter>, if any
+    def find_aggregate(self, func, column, where):
+        for agg in self.aggregates.values():
+            if agg.func == func.upper() and agg.column == column and agg.where == where:
+                return agg
+        return None
+
+    # ---------------- partitioning (db/partition.py) ----------------
+    def partition_by(self, column, interval="month", width=None, keep=3):
+        """
+        Range-partition the table on `column`: by "day" / "month" / "year" of a
+        timestamp or by `width`-wide INT ranges. Partitions older than the
+        newest `keep` are sealed into segment files at checkpoints.
+        """
+        if column not in self.columns:
+            raise ValueError(f"Unknown column '{column}' for table '{self.name}'")
+        if self.db is not None:
+            self.db.check_writable()
+
+        with self._lock:
+            if self.partitions is not None:
+                if self.partitions.scheme.to_dict() != PartitionScheme(column, interval, width, keep).to_dict():
+                    raise ValueError(f"Table '{self.name}' is already partitioned by '{self.partitions.scheme.column}'")
+                return self.partitions
+            self.partitions = PartitionSet(
+                PartitionScheme(column, interval, width, keep), self._archive_dir(), primary_key=self.primary_key
+            )
+            lsn = self._persist("partition_by", spec=self.partitions.scheme.to_dict())
+        self._wait_durable(lsn)
+        return self.partitions
+
+    def seal_cold(self):
+        """
+        Seal every partition older than the newest `keep`: its rows go to a
+        read-only segment file and leave memory and the live indexes.
+        Partitions with changes still visible to an open snapshot wait for a
+        later pass. Returns the keys sealed.
+        """
+        if self.partitions is None:
+            return []
+        if self._transaction() is not None:
+            raise ValueError("Cannot seal partitions inside a transaction")
+
+        scheme = self.partitions.scheme
+        sealed, lsn = [], None
+        with self._lock:
+            groups = {}
+            for row in self.rows:
+                key = scheme.key(row.get(scheme.column))
+                if key is not None:
+                    groups.setdefault(key, []).append(row)
+            newest = sorted(set(groups) | set(self.partitions.sealed))[-scheme.keep:]
+            for key in sorted(groups):
+                if key >= newest[0]:
+                    break
+                rows = groups[key]
+                if any(id(r) in self._history for r in rows):
+                    continue
+                partition = self.partitions.write(key, [r.copy() for r in rows], self.aggregates.values())
+                lsn = self._persist("seal", partition=partition.to_dict())
+                self._seal(partition, rows)
+                sealed.append(key)
+        self._wait_durable(lsn)
+        return sealed
+
+    def _apply_seal(self, spec):
+        """WAL replay of a seal: the segment file is already written."""
+        partition = SealedPartition.from_dict(spec)
+        scheme = self.partitions.scheme
+        self._seal(partition, [r for r in self.rows if scheme.key(r.get(scheme.column)) == partition.key])
+
+    def _seal(self, partition, rows):
+        # unlike a delete, aggregates keep the rows' contribution
+        doomed = {id(r) for r in rows}
+        self.rows[:] = [r for r in self.rows if id(r) not in doomed]
+        for row in rows:
+            if self.primary_key:
+                self.pk_index.pop(row[self.primary_key], None)
+            for col in self.unique_keys:
+                self.unique_indexes[col].pop(row.get(col), None)
+            for index in self.indexes.values():
+                index.remove(row)
+            if self._store is not None:
+                self._store.detach(row)
+        self.partitions.add(partition)
+
+    def _cast(self, values):
+        """
+        Cast `values` to their column types in place: an int written to a FLOAT
+        column is stored as a float, so typed columnar storage keeps its array.
+        Any other mismatch is a TypeError.
+        """
+        for col, value in values.items():
+            col_type = self.columns.get(col)
+            if col_type is None:
+                raise ValueError(f"Unknown column '{col}' for table '{self.name}'")
+            if value is None or type(value) is col_type:
+                continue
+            if col_type is float and isinstance(value, int) and not isinstance(value, bool):
+                values[col] = float(value)
+            elif not isinstance(value, col_type):
+                raise TypeError(f"Column '{col}' expects type {col_type.__name__}, got {type(value).__name__}")
+        return values
+
+    def _check_partition(self, updates):
+        if self.partitions is not None and self.partitions.scheme.column in updates:
+            self.partitions.check_writable(self.name, updates)
+
+    def partition_stats(self):
+        if self.partitions is None:
+            return []
+        with self._lock:
+            return self.partitions.stats(self.rows)
+
+    def _archive_dir(self):
+        if self.db is None:
+            return None
+        return self.db.path.with_suffix(".archive") / self.name
+
+    # narrowest row set for an equality filter: a pk/unique hit or the smallest index bucket
+    def _candidates(self, where):
+        for col, value in where.items():
+            if col == self.primary_key:
+                row = self.pk_index.get(value)
+                return [row] if row else []
+            if col in self.unique_indexes:
+                row = self.unique_indexes[col].get(value)
+                return [row] if row else []
+
+        indexed = [col for col in where if col in self.indexes]
+        if indexed:
+            col = min(indexed, key=lambda c: self.indexes[c].count(where[c]))
+            return self.indexes[col].lookup(where[col])
+        return self.rows
+
+    # returns the stored row: `row` itself, or its Row in a columnar table
+    def _add_row(self, row, position=None):
+        if self._store is not None:
+            row = self._store.attach(row)
+        version = self._version()
+        self._track(row, version, existed=False)
+        self._graveyard.pop(id(row), None)  # a rolled-back delete brings the row back
+        if position is None:
+            self.rows.append(row)
+        else:
+            self.rows.insert(position, row)
+        if self.primary_key:
+            self.pk_index[row[self.primary_key]] = row
+        for col in self.unique_keys:
+            self.unique_indexes[col][row[col]] = row
+        for index in self.indexes.values():
+            index.add(row)
+        self._apply_aggregates(row, version)
+        return row
+
+    # apply + log one row change; the undo closure is only kept inside a transaction
+    def _logged_update(self, row, updates):
+        old = {col: row.get(col) for col in updates}
+        key = self._row_key(row)
+        self._update_row(row, updates)
+        return self._persist("update", undo=lambda: self._update_row(row, old), key=key, set=updates)
+
+    def _logged_delete(self, row):
+        key = self._row_key(row)
+        position = self._delete_row(row)
+        return self._persist("delete", undo=lambda: self._add_row(row, position), key=key)
+
+    def _update_row(self, row, updates):
+        version = self._version()
+        self._track(row, version)
+        touched = [self.indexes[col] for col in updates if col in self.indexes]
+        for index in touched:
+            index.remove(row)
+        affected = [a for a in self.aggregates.values() if a.depends_on(updates)]
+        self._apply_aggregates(row, version, affected, remove=True)
+        for col in self.unique_keys:
+            if col in updates:
+                self.unique_indexes[col].pop(row.get(col), None)
+        row.update(updates)
+        for col in self.unique_keys:
+            if col in updates:
+                self.unique_indexes[col][row[col]] = row
+        for index in touched:
+            index.add(row)
+        self._apply_aggregates(row, version, affected)
+
+    def _delete_row(self, row):
+        version = self._version()
+        self._track(row, version, deleted=True)
+        position = self.rows.index(row)
+        del self.rows[position]
 
         if self.primary_key:
             self.pk_index.pop(row[self.primary_key], None)
         for col in self.unique_keys:
             self.unique_indexes[col].pop(row.get(col), None)
+        for index in self.indexes.values():
+            index.remove(row)
+        self._apply_aggregates(row, version, remove=True)
+        if self._store is not None:
+            self._store.detach(row)
+        return position
 
-        self._persist()
+    def _delete_rows(self, rows):
+        version = self._version()
+        for row in rows:
+            self._track(row, version, deleted=True)
+        doomed = {id(r) for r in rows}
+        self.rows[:] = [r for r in self.rows if id(r) not in doomed]
+        for row in rows:
+            if self.primary_key:
+                self.pk_index.pop(row[self.primary_key], None)
+            for col in self.unique_keys:
+                self.unique_indexes[col].pop(row.get(col), None)
+            for index in self.indexes.values():
+                index.remove(row)
+            self._apply_aggregates(row, version, remove=True)
+            if self._store is not None:
+                self._store.detach(row)
 
-    def select(self, where=None):
-        if not where:
-            return list(self.rows)
-        return [r for r in self.rows if all(r.get(k) == v for k, v in where.items())]
+    def _apply_aggregates(self, row, version, aggregates=None, remove=False):
+        for agg in self.aggregates.values() if aggregates is None else aggregates:
+            delta = agg.remove(row) if remove else agg.add(row)
+            if delta is not None and version is not None:
+                self._track_delta(agg, delta, version)
 
-    def _persist(self):
-        if self.db:
-            self.db.save()
+    # ---------------- MVCC bookkeeping (caller holds the latch) ----------------
+    # one version per statement: entered after row locks, before the latch,
+    # so it is published while the rows it changed are still locked
+    def _write_scope(self):
+        if self.db is None:
+            return nullcontext()
+        self.db.check_writable()
+        return self.db.versions.write()
 
-    def to_dict(self):
+    def _version(self):
+        if self.db is None or self.db._recovering:
+            return None
+        version = self.db.versions.current()
+        # a published or voided version takes no more changes
+        if version is None or version.ts is not None:
+            return None
+        version.tables.add(self)
+        return version
+
+    def _track(self, row, version, existed=True, deleted=False):
+        """Record `row` as it was before `version` first touches it."""
+        if version is None:
+            return
+        item = self._history.get(id(row))
+        if item is None:
+            item = self._history[id(row)] = (row, [])
+        entries = item[1]
+        if not entries or entries[-1][0] is not version:
+            entry = (version, row.copy() if existed else None)
+            entries.append(entry)
+            version.entries.append((self, "row", row, entry))
+        if deleted:
+            self._graveyard[id(row)] = row
+
+    def _track_delta(self, agg, delta, version):
+        last = agg.deltas[-1] if agg.deltas else None
+        if last is not None and last[0] is version:
+            last[1] += delta[0]
+            last[2] += delta[1]
+        else:
+            entry = [version, delta[0], delta[1]]
+            agg.deltas.append(entry)
+            version.entries.append((self, "aggregate", agg, entry))
+
+    def _forget(self, kind, obj, entry):
+        if kind == "aggregate":
+            _remove_identical(obj.deltas, entry)
+            return
+        item = self._history.get(id(obj))
+        if item is None:
+            return
+        _remove_identical(item[1], entry)
+        if not item[1]:
+            del self._history[id(obj)]
+            self._graveyard.pop(id(obj), None)
+
+    # identifies a row inside WAL records: the primary key when there is one
+    def _row_key(self, row):
+        if self.primary_key:
+            return {self.primary_key: row[self.primary_key]}
+        return row.copy()
+
+    def _locate(self, key):
+        if self.primary_key in key:
+            return self.pk_index[key[self.primary_key]]
+        return next(r for r in self.rows if all(r.get(k) == v for k, v in key.items()))
+
+    def _transaction(self):
+        if self.db is None or self.db._recovering:
+            return None
+        return self.db.current_transaction()
+
+    def _lock_timeout(self):
+        txn = self._transaction()
+        return txn.lock_timeout if txn is not None else None
+
+    # inside a transaction, rows it writes stay locked until COMMIT / ROLLBACK
+    def _hold(self, rows):
+        txn = self._transaction()
+        if txn is not None and self.primary_key:
+            for row in rows:
+                txn.hold(self, row[self.primary_key])
+
+    def _hold_new(self, rows):
+        # called under the latch, so never wait: a fresh key is only ever locked
+        # by someone checking for it first, and they will see it exists
+        txn = self._transaction()
+        if txn is not None and self.primary_key:
+            for row in rows:
+                try:
+                    txn.hold(self, row[self.primary_key], timeout=0)
+                except TimeoutError:
+                    pass
+
+    # DML passes `undo`: inside a transaction the record is buffered for COMMIT instead of logged
+    def _persist(self, op, undo=None, **payload):
+        if not self.db or self.db._recovering:
+            return None
+        record = {"op": op, "table": self.name, **payload}
+        txn = self.db.current_transaction()
+        if txn is not None and undo is not None:
+            txn.record(self, record, undo)
+            return None
+        return self.db.log(record)
+
+    # called after releasing the lock so concurrent writers can share a group commit
+    def _wait_durable(self, lsn):
+        if self.db and lsn is not None:
+            self.db.wait_durable(lsn)
+
+    def schema(self):
+        """Everything to_dict() records except the rows."""
         return {
             "name": self.name,
             "columns": {k: v.__name__ for k, v in self.columns.items()},
             "primary_key": self.primary_key,
             "unique_keys": self.unique_keys,
-            "rows": self.rows,
+            "indexes": [
+                {"name": i.name, "column": i.column, "kind": i.kind} for i in self.indexes.values()
+            ],
+            "aggregates": [a.to_dict() for a in self.aggregates.values()],
+            "storage": self.storage,
+            "partitions": self.partitions.to_dict() if self.partitions is not None else None,
             "_auto_id": self._auto_id,
         }
 
+    def to_dict(self):
+        data = self.schema()
+        data["rows"] = self.rows if self._store is None else [row.copy() for row in self.rows]
+        return data
+
     @classmethod
     def from_dict(cls, data, db):
-        cols = {k: eval(v) for k, v in data["columns"].items()}
+        table = cls._from_schema(data, db)
+        rows = data["rows"]
+        table.rows = rows if table._store is None else table._store.attach_many(rows)
+        table._build_indexes(data)
+        return table
+
+    @classmethod
+    def from_columns(cls, data, columns, count, db):
+        """A table from a binary snapshot segment: its schema and decoded columns (db/snapfile.py)."""
+        table = cls._from_schema(data, db)
+        if table._store is None:
+            names = list(columns)
+            table.rows = [dict(zip(names, values)) for values in zip(*(c.values() for c in columns.values()))]
+        else:
+            store = table._store
+            store.columns = columns
+            store.by_slot = list(map(store.row_type, range(count)))
+            table.rows = list(store.by_slot)
+        table._build_indexes(data)
+        return table
+
+    @classmethod
+    def _from_schema(cls, data, db):
+        cols = {k: COLUMN_TYPES.get(v) or eval(v) for k, v in data["columns"].items()}
         table = cls(
             data["name"],
             cols,
             db=db,
             primary_key=data["primary_key"],
             unique_keys=data["unique_keys"],
+            storage=data.get("storage", "rows"),
         )
-        table.rows = data["rows"]
         table._auto_id = data["_auto_id"]
+        if data.get("partitions"):
+            table.partitions = PartitionSet.from_dict(data["partitions"], table._archive_dir(), table.primary_key)
+        return table
 
-        # rebuild indexes
-        for r in table.rows:
-            if table.primary_key:
-                table.pk_index[r[table.primary_key]] = r
-            for col in table.unique_keys:
-                table.unique_indexes[col][r[col]] = r
+    def _build_indexes(self, data):
+        for r in self.rows:
+            if self.primary_key:
+                pk = r[self.primary_key]
+                self.pk_index[pk] = r
+                if isinstance(pk, int) and pk >= self._auto_id:
+                    self._auto_id = self._next_id(pk)
+            for col in self.unique_keys:
+                self.unique_indexes[col][r[col]] = r
 
-        return table
+        for spec in data.get("indexes", []):
+            index = INDEX_TYPES[spec["kind"]](spec["name"], spec["column"])
+            index.build(self.rows)
+            self.indexes[spec["column"]] = index
+
+        for spec in data.get("aggregates", []):
+            agg = MaterializedAggregate(spec["name"], spec["func"], spec["column"], spec["where"])
+            agg.build(self.rows)
+            for partition in self.partitions.sealed.values() if self.partitions is not None else ():
+                total, count = partition.aggregates.get(agg.name, (0, 0))
+                agg.total += total
+                agg.count += count
+            self.aggregates[spec["name"]] = agg
+
+
+def _remove_identical(items, target):
+    for i, item in enumerate(items):
+        if item is target:
+            del items[i]
+            return
+
+
+def _emit(rows, test, columns):
+    """Rows passing `test`, projected to `columns`; None entries (deleted slots) are skipped."""
+    for r in rows:
+        if r is not None and (test is None or test(r)):
+            yield r if columns is None else {c: r[c] for c in columns}
@@ -0,0 +1,93 @@
+class Transaction:
+    """
+    A unit of work on one thread: BEGIN ... COMMIT / ROLLBACK.
+
+    Writes are applied to the tables immediately (so the transaction reads its
+    own changes) while their WAL records are buffered as a redo log next to an
+    undo log of inverse operations. COMMIT appends the redo log as a single
+    WAL record, so the whole transaction costs one durable write and replays
+    all-or-nothing. ROLLBACK runs the undo log backwards.
+
+    Rows the transaction updates, deletes or inserts stay row-locked until it
+    ends. Waiting on another transaction's row gives up after `lock_timeout`
+    seconds with a TimeoutError, which is how lock-order deadlocks surface.
+    """
+
+    def __init__(self, db, lock_timeout=5.0):
+        self.db = db
+        self.lock_timeout = lock_timeout
+        self.redo = []
+        self.undo = []  # (table, inverse operation)
+        self.on_commit = []  # callbacks run once COMMIT is durable; ROLLBACK drops them
+        self._held = []  # (table name, key, lock entry)
+        self.active = True
+        # every write of the transaction is recorded against one MVCC version,
+        # so snapshot readers see all of it after COMMIT and none of it before
+        self.version = db.versions.begin()
+
+    def record(self, table, record, undo):
+        # copy payloads: the row dicts may change again before COMMIT
+        for field in ("row", "set"):
+            if field in record:
+                record[field] = dict(record[field])
+        if "rows" in record:
+            record["rows"] = [dict(r) for r in record["rows"]]
+        self.redo.append(record)
+        self.undo.append((table, undo))
+
+    def hold(self, table, key, timeout=None):
+        """Keep `table[key]` locked until the transaction ends (re-entrant, so usually free)."""
+        entry = self.db.locks._enter(table.name, key, timeout)
+        self._held.append((table.name, key, entry))
+
+    def commit(self):
+        self._check_active()
+        lsn = None
+        try:
+            if self.redo:
+                lsn = self.db.log({"op": "txn", "records": self.redo})
+        except Exception:
+            self.rollback()
+            raise
+        callbacks = self.on_commit
+        self.db.versions.publish(self.version)
+        self._finish()
+        self.db.wait_durable(lsn)
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        self._check_active()
+        try:
+            for table, undo in reversed(self.undo):
+                with table._lock:
+                    undo()
+        finally:
+            # readers kept seeing the before-images until the undo pass was done
+            self.db.versions.void(self.version)
+            self.db.versions.discard(self.version)
+            self._finish()
+
+    def _check_active(self):
+        if not self.active:
+            raise ValueError("Transaction already finished")
+
+    def _finish(self):
+        self.active = False
+        self.redo, self.undo, self.on_commit = [], [], []
+        for name, key, entry in reversed(self._held):
+            self.db.locks._exit(name, key, entry)
+        self._held = []
+        self.db._end_transaction(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.active:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
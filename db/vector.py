@@ -0,0 +1,427 @@
+import operator
+from bisect import bisect_left
+from functools import reduce
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:  # optional: without it batches run as array / list loops
+    np = None
+
+from .predicate import OPS, Predicate, access_path, column_name, columns_in
+
+BATCH_ROWS = 16384
+# an index is used instead of a batch scan when it narrows the WHERE clause to
+# at most 1/INDEX_SHARE of the table: row-at-a-time reads of a columnar Row
+# cost about that many times a batched comparison
+INDEX_SHARE = 32
+_DTYPES = {"q": "int64", "d": "float64", "H": "uint16"}
+
+
+def vectorizable(table, predicate=None):
+    """Batch execution needs columnar storage and only real columns in the WHERE clause."""
+    if table._store is None:
+        return False
+    if predicate is None:
+        return True
+    return all(column_name(c) in table._store.columns for c in columns_in(predicate.node))
+
+
+def prefers_batches(table, predicate=None):
+    """Batch-scan the whole table unless an index narrows the WHERE clause to a small share of it."""
+    if not vectorizable(table, predicate):
+        return False
+    if predicate is None:
+        return True
+    path = access_path(table, predicate.node)
+    limit = len(table.rows) // INDEX_SHARE
+    if path[0] == "rows":
+        return len(path[1]) > limit
+    if path[0] == "range":
+        return path[1].range_size(*path[2], limit=limit) > limit
+    return True
+
+
+class _Column:
+    """One column copied out of a ColumnStore: raw values plus how to decode them."""
+
+    def __init__(self, column, size, numpy):
+        self.encoding = column.encoding
+        self.dictionary = None
+        self.null_slots = []
+        if column.encoding == "dict":
+            data = column.codes[:size]
+            self.dictionary = list(column.dictionary)
+        elif column.encoding == "object":
+            data = column.data[:size]
+        else:
+            data = column.data[:size]
+            self.null_slots = sorted(slot for slot in column.nulls if slot < size)
+
+        self.numpy = numpy and column.encoding != "object"
+        self.null_mask = None
+        if self.numpy:
+            dtype = _DTYPES[data.typecode]
+            data = np.frombuffer(data, dtype=dtype) if len(data) else np.empty(0, dtype=dtype)
+            if self.null_slots:
+                self.null_mask = np.zeros(size, dtype=bool)
+                self.null_mask[self.null_slots] = True
+        self.data = data
+
+    def nulls(self, start, end):
+        """Positions (relative to `start`) holding NULL in a typed column."""
+        slots = self.null_slots
+        i, j = bisect_left(slots, start), bisect_left(slots, end)
+        return [slot - start for slot in slots[i:j]]
+
+    def decoded(self, start, end):
+        """The batch as a plain list of Python values, None for NULL."""
+        raw = self.data[start:end]
+        if self.dictionary is not None:
+            return list(map(self.dictionary.__getitem__, raw.tolist() if self.numpy else raw))
+        values = raw.tolist() if self.numpy or self.encoding != "object" else raw
+        for pos in self.nulls(start, end):
+            values[pos] = None
+        return values
+
+
+class Batch:
+    """Up to BATCH_ROWS consecutive slots and the selection vector the WHERE clause produced."""
+
+    def __init__(self, scan, start, end, mask):
+        self.scan = scan
+        self.start = start
+        self.end = end
+        self.mask = mask  # numpy bool array, or a list of bools
+
+    def count(self):
+        if self.scan.numpy:
+            return int(np.count_nonzero(self.mask))
+        return sum(self.mask)
+
+    def positions(self):
+        if self.scan.numpy:
+            return np.flatnonzero(self.mask).tolist()
+        return list(compress(range(self.end - self.start), self.mask))
+
+    def values(self, name):
+        """Selected values of one column (None for NULL), as a list."""
+        return list(compress(self.scan.columns[name].decoded(self.start, self.end), self.mask))
+
+    def records(self, names):
+        """Selected rows as dicts holding only `names`."""
+        columns = [self.values(name) for name in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def reduce(self, func, name):
+        """(non-NULL count, SUM / MIN / MAX) of the selected values of one column."""
+        column = self.scan.columns[name]
+        if column.numpy and column.dictionary is None:
+            mask = self.mask if column.null_mask is None else self.mask & ~column.null_mask[self.start:self.end]
+            values = column.data[self.start:self.end][mask]
+            if not len(values):
+                return 0, 0
+            if func in ("MIN", "MAX"):
+                return len(values), (values.min() if func == "MIN" else values.max()).item()
+            return len(values), values.sum().item() if func != "COUNT" else 0
+
+        values = [v for v in self.values(name) if v is not None]
+        if not values or func == "COUNT":
+            return len(values), 0
+        if func == "MIN":
+            return len(values), min(values)
+        if func == "MAX":
+            return len(values), max(values)
+        return len(values), sum(values)
+
+    def group_reduce(self, key, specs):
+        """
+        {key value: [(count, value) per spec]} for GROUP BY on one INT or
+        dictionary-encoded column, computed with NumPy; None when the batch
+        needs the row-at-a-time path (no NumPy, NULL INT keys, other columns).
+        """
+        scan = self.scan
+        column = scan.columns[key]
+        if not scan.numpy or not column.numpy or column.null_mask is not None:
+            return None
+        if column.encoding == "float64" or any(
+            name is not None and scan.columns[name].dictionary is not None for _, name in specs
+        ):
+            return None
+
+        keys = column.data[self.start:self.end][self.mask]
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        size = len(uniq)
+        results = []
+        for func, name in specs:
+            if name is None:
+                results.append((np.bincount(inverse, minlength=size), None))
+                continue
+            source = scan.columns[name]
+            values = source.data[self.start:self.end][self.mask]
+            where = inverse
+            if source.null_mask is not None:
+                present = ~source.null_mask[self.start:self.end][self.mask]
+                values, where = values[present], inverse[present]
+            counts = np.bincount(where, minlength=size)
+            if func == "COUNT":
+                results.append((counts, None))
+            elif func in ("SUM", "AVG"):
+                totals = np.zeros(size, dtype=values.dtype)
+                np.add.at(totals, where, values)
+                results.append((counts, totals))
+            else:
+                ufunc = np.minimum if func == "MIN" else np.maximum
+                extremes = np.zeros(size, dtype=values.dtype)
+                if len(values):
+                    # seed each group with one of its own values, then fold the rest in
+                    extremes[where] = values
+                    ufunc.at(extremes, where, values)
+                results.append((counts, extremes))
+
+        key_values = uniq.tolist()
+        if column.dictionary is not None:
+            key_values = [column.dictionary[code] for code in key_values]
+        out = {}
+        for i, value in enumerate(key_values):
+            out[value] = [
+                (int(counts[i]), 0 if extra is None else extra[i].item()) for counts, extra in results
+            ]
+        return out
+
+
+class BatchScan:
+    """
+    One pass over a columnar table in fixed-size batches. The columns a query
+    needs are copied out under the table latch (a memcpy per typed column), so
+    writers wait only for the copy. The WHERE clause is then evaluated a batch
+    at a time into a selection vector, with NumPy when it is installed and
+    with array / list loops otherwise; callers aggregate or project only the
+    selected positions.
+
+    With a snapshot, rows changed since older snapshots are left out of the
+    batches and their snapshot images, already filtered, are in `images`.
+    """
+
+    def __init__(self, table, predicate=None, names=(), snapshot=None):
+        self.table = table
+        self.numpy = np is not None
+        store = table._store
+
+        needed = list(dict.fromkeys(
+            [column_name(c) for c in columns_in(predicate.node)] if predicate is not None else []
+        ))
+        needed += [n for n in names if n not in needed]
+
+        with table._lock:
+            self.size = len(store.by_slot)
+            self.columns = {name: _Column(store.columns[name], self.size, self.numpy) for name in needed}
+            skip = set(store.deleted)
+            self.images = []
+            if snapshot is not None:
+                # rows with no history look the same in every open snapshot
+                for row, _ in list(table._history.values()):
+                    skip.add(row._slot)
+                    image = snapshot.view(table, row)
+                    if image is not None and (predicate is None or predicate.test(image)):
+                        self.images.append(image)
+        self.skip = sorted(slot for slot in skip if slot < self.size)
+        self._test = self._compile(predicate.node)[1] if predicate is not None else None
+
+    def __iter__(self):
+        for start in range(0, self.size, BATCH_ROWS):
+            end = min(start + BATCH_ROWS, self.size)
+            if self._test is not None:
+                mask = self._test(start, end, None)
+            elif self.numpy:
+                mask = np.ones(end - start, dtype=bool)
+            else:
+                mask = [True] * (end - start)
+            i, j = bisect_left(self.skip, start), bisect_left(self.skip, end)
+            if i < j:
+                if self.numpy:
+                    mask = mask.copy()
+                    mask[[slot - start for slot in self.skip[i:j]]] = False
+                else:
+                    mask = list(mask)
+                    for slot in self.skip[i:j]:
+                        mask[slot - start] = False
+            yield Batch(self, start, end, mask)
+
+    def slots(self):
+        """Selected slot numbers, in slot (= insertion) order."""
+        for batch in self:
+            yield from (batch.start + pos for pos in batch.positions())
+
+    def records(self, names):
+        """Selected rows (then the snapshot images) as dicts of `names`."""
+        for batch in self:
+            yield from batch.records(names)
+        for image in self.images:
+            yield {name: image[name] for name in names}
+
+    # ---------------- WHERE -> selection vector ----------------
+    # A compiled term is (cost, fn) with fn(start, end, within) returning the
+    # positions of the batch that are in `within` (a mask; None for the whole
+    # batch) and match the term. AND runs its cheapest terms first, and terms
+    # evaluated on Python values only look at the positions still selected.
+    ARRAY, LIST, ROW = 0, 1, 2
+
+    def _compile(self, node):
+        kind = node[0]
+        if kind == "and":
+            parts = sorted((self._compile(n) for n in node[1]), key=lambda part: part[0])
+
+            def conjunction(start, end, within):
+                for _, part in parts:
+                    within = part(start, end, within)
+                return within
+            return parts[-1][0], conjunction
+        if kind == "or":
+            parts = [self._compile(n) for n in node[1]]
+            union = np.logical_or if self.numpy else (lambda a, b: list(map(operator.or_, a, b)))
+            return max(cost for cost, _ in parts), (
+                lambda start, end, within: reduce(union, (part(start, end, within) for _, part in parts))
+            )
+        names = list(dict.fromkeys(column_name(c) for c in columns_in(node)))
+        test = Predicate(node, self.table.columns).test
+        if not names:
+            constant = test({})
+            return self.ARRAY, lambda start, end, within: self._within(
+                np.full(end - start, constant, dtype=bool) if self.numpy else [constant] * (end - start), within
+            )
+        if len(names) == 1:
+            return self._leaf(node, names[0], test)
+
+        # several columns (e.g. `a < b`): row at a time over decoded values
+        def rows(start, end, selector):
+            columns = [_pick(self.columns[name].decoded(start, end), selector) for name in names]
+            return [test(dict(zip(names, values))) for values in zip(*columns)]
+        return self.ROW, self._sparse(rows)
+
+    def _within(self, mask, within):
+        if within is None:
+            return mask
+        if self.numpy:
+            return mask & within
+        return list(map(operator.and_, mask, within))
+
+    def _sparse(self, evaluate):
+        """Wrap evaluate(start, end, selector) -> [bool per selected position] as a term."""
+        def term(start, end, within):
+            if within is None:
+                mask = evaluate(start, end, None)
+                return np.array(mask, dtype=bool) if self.numpy else mask
+            if self.numpy:
+                mask = np.zeros(end - start, dtype=bool)
+                mask[within] = evaluate(start, end, within.tolist())
+                return mask
+            matched = iter(evaluate(start, end, within))
+            return [w and next(matched) for w in within]
+        return term
+
+    def _leaf(self, node, name, test):
+        column = self.columns[name]
+
+        if column.dictionary is not None:
+            # a dictionary-encoded column is tested once per distinct value
+            def dictionary(start, end, within):
+                lut = [test({name: v}) for v in column.dictionary]
+                codes = column.data[start:end]
+                if column.numpy:
+                    return self._within(np.array(lut, dtype=bool)[codes], within)
+                return self._within(list(map(lut.__getitem__, codes)), within)
+            return self.ARRAY, dictionary
+
+        if column.encoding != "object":
+            fast = self._typed(node, column)
+            if fast is not None:
+                return fast
+
+        evaluate = _list_test(node)
+        if column.encoding == "object" and evaluate is not None:
+            return self.LIST, self._sparse(
+                lambda start, end, selector: evaluate(_pick(column.data[start:end], selector))
+            )
+
+        def generic(start, end, selector):
+            return [test({name: v}) for v in _pick(column.decoded(start, end), selector)]
+        return self.ROW, self._sparse(generic)
+
+    def _typed(self, node, column):
+        """Array-at-a-time tests on an INT / FLOAT column; None for anything else."""
+        kind = node[0]
+        if kind == "isnull" and node[1][0] == "col":
+            negated = node[2]
+            if column.numpy:
+                def isnull(start, end, within):
+                    if column.null_mask is None:
+                        return self._within(np.full(end - start, negated, dtype=bool), within)
+                    return self._within(column.null_mask[start:end] != negated, within)
+                return self.ARRAY, isnull
+
+            def isnull(start, end, within):
+                mask = [negated] * (end - start)
+                for pos in column.nulls(start, end):
+                    mask[pos] = not negated
+                return self._within(mask, within)
+            return self.LIST, isnull
+
+        if not column.numpy:
+            evaluate = _list_test(node)
+            if evaluate is None:
+                return None
+
+            # NULLs are stored as 0 in the array: they never match
+            def typed(start, end, selector):
+                mask = evaluate(_pick(column.data[start:end], selector))
+                nulls = column.nulls(start, end)
+                if nulls:
+                    present = [True] * (end - start)
+                    for pos in nulls:
+                        present[pos] = False
+                    mask = list(map(operator.and_, mask, _pick(present, selector)))
+                return mask
+            return self.LIST, self._sparse(typed)
+
+        if kind == "cmp" and node[2][0] == "col" and node[3][0] == "lit" and node[3][1] is not None:
+            fn, value = OPS[node[1]], node[3][1]
+            evaluate = lambda values: fn(values, value)
+        elif kind == "between" and node[1][0] == "col" and all(n[0] == "lit" and n[1] is not None for n in node[2:4]):
+            low, high, negated = node[2][1], node[3][1], node[4]
+            evaluate = lambda values: ((values >= low) & (values <= high)) != negated
+        elif kind == "in" and node[1][0] == "col" and all(n[0] == "lit" for n in node[2]):
+            wanted, negated = [n[1] for n in node[2] if n[1] is not None], node[3]
+            if negated and len(wanted) < len(node[2]):
+                return None  # NOT IN with a NULL member: never true, left to the row test
+            evaluate = lambda values: np.isin(values, wanted) != negated
+        else:
+            return None
+
+        def vectorized(start, end, within):
+            mask = evaluate(column.data[start:end])
+            if column.null_mask is not None:
+                mask &= ~column.null_mask[start:end]
+            return self._within(mask, within)
+        return self.ARRAY, vectorized
+
+
+def _pick(values, selector):
+    return values if selector is None else list(compress(values, selector))
+
+
+def _list_test(node):
+    """A column-vs-literal comparison as a test over a list of values (None never matches)."""
+    kind = node[0]
+    if kind == "cmp" and node[2][0] == "col" and node[3][0] == "lit" and node[3][1] is not None:
+        fn, value = OPS[node[1]], node[3][1]
+        return lambda values: [v is not None and fn(v, value) for v in values]
+    if kind == "between" and node[1][0] == "col" and all(n[0] == "lit" and n[1] is not None for n in node[2:4]):
+        low, high, negated = node[2][1], node[3][1], node[4]
+        return lambda values: [v is not None and (low <= v <= high) != negated for v in values]
+    if kind == "in" and node[1][0] == "col" and all(n[0] == "lit" for n in node[2]):
+        members, negated = frozenset(n[1] for n in node[2] if n[1] is not None), node[3]
+        if negated and len(members) < len(node[2]):
+            return lambda values: [False] * len(values)  # NOT IN with a NULL member is never true
+        return lambda values: [v is not None and (v in members) != negated for v in values]
+    return None
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+FSYNC_MODES = ("commit", "group", "batch", "none")
+
+
+class CommitStats:
+    """Size and latency of the last `history` group-commit batches."""
+
+    def __init__(self, history=256):
+        self.batches = 0
+        self.records = 0
+        self.recent = deque(maxlen=history)
+
+    def record(self, size, latency):
+        self.batches += 1
+        self.records += size
+        self.recent.append((size, latency))
+
+    def summary(self):
+        sizes = [s for s, _ in self.recent]
+        latencies = [l for _, l in self.recent]
+        return {
+            "batches": self.batches,
+            "records": self.records,
+            "avg_batch_size": sum(sizes) / len(sizes) if sizes else 0,
+            "avg_latency_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0,
+            "max_latency_ms": 1000 * max(latencies) if latencies else 0,
+            "last_batches": [
+                {"size": s, "latency_ms": round(1000 * l, 3)} for s, l in list(self.recent)[-10:]
+            ],
+        }
+
+
+class WriteAheadLog:
+    """
+    Append-only log of table mutations, one compact JSON record per line.
+
+    fsync modes:
+      commit - fsync after every appended record (safest, slowest)
+      group  - writers queue records and a flusher thread writes + fsyncs them
+               together every `batch_window` seconds or `max_batch` records;
+               wait(lsn) returns once the record's batch is durable
+      batch  - a background thread fsyncs every `fsync_interval` seconds
+      none   - leave it to the OS page cache
+    """
+
+    def __init__(self, path, fsync="commit", fsync_interval=0.05, batch_window=0.005, max_batch=256):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"Unknown fsync mode '{fsync}'. Expected one of: {', '.join(FSYNC_MODES)}")
+
+        self.path = Path(path)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.lsn = 0
+        self.synced_lsn = 0
+        self.stats = CommitStats()
+
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._flush_wanted = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        self._pending = []
+        self._pending_since = None
+        self._file = None
+        self._valid_size = None
+        self._stop = threading.Event()
+        self._worker = None
+        # called with (lsn, line) for every appended record, in LSN order (db/replica.py)
+        self.listeners = []
+
+    def recover(self):
+        """Yield every intact record; a torn trailing line is dropped."""
+        self._valid_size = 0
+        if not self.path.exists():
+            return
+
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._valid_size += len(line)
+                self.lsn = max(self.lsn, record.get("lsn", 0))
+                yield record
+
+    def open(self, lsn=0):
+        self.lsn = self.synced_lsn = max(self.lsn, lsn)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Cut off a torn tail left by a crash so new records start on a clean line
+        if self._valid_size is not None and self.path.exists() and self.path.stat().st_size > self._valid_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(self._valid_size)
+
+        self._file = open(self.path, "a", encoding="utf-8")
+
+        loop = {"group": self._group_loop, "batch": self._sync_loop}.get(self.fsync)
+        if loop:
+            self._stop.clear()
+            self._worker = threading.Thread(target=loop, name=f"wal-{self.fsync}", daemon=True)
+            self._worker.start()
+
+    def append(self, record):
+        with self._lock:
+            self.lsn += 1
+            record["lsn"] = self.lsn
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            for listener in self.listeners:
+                listener(self.lsn, line)
+
+            if self.fsync == "group":
+                if not self._pending:
+                    self._pending_since = time.perf_counter()
+                self._pending.append(line)
+                # wake the flusher to open a window, or to cut the batch once full
+                if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                    self._flush_wanted.notify()
+                return self.lsn
+
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync == "commit":
+                os.fsync(self._file.fileno())
+                self.synced_lsn = self.lsn
+            return self.lsn
+
+    def wait(self, lsn):
+        """Block until `lsn` is durable. Only group mode ever has to wait."""
+        if self.fsync != "group" or lsn is None:
+            return
+        with self._lock:
+            while self.synced_lsn < lsn and self._worker is not None:
+                self._durable.wait()
+
+    def sync(self):
+        with self._io_lock, self._lock:
+            if self._file and self.synced_lsn < self.lsn and not self._pending:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.synced_lsn = self.lsn
+
+    def size(self):
+        with self._lock:
+            return self._file.tell() if self._file else 0
+
+    def truncate(self):
+        """Drop every record; called once a checkpoint covers them."""
+        with self._io_lock, self._lock:
+            self._pending = []
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+            self.synced_lsn = self.lsn
+            self._durable.notify_all()
+
+    def close(self):
+        self._stop.set()
+        if self._worker:
+            with self._lock:
+                self._flush_wanted.notify()
+            self._worker.join()
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+        with self._lock:
+            self._worker = None
+            self._durable.notify_all()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+
+    def _group_loop(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stop.is_set():
+                    self._flush_wanted.wait()
+                # give concurrent writers the rest of the window to join the batch
+                deadline = self._pending_since + self.batch_window if self._pending else 0
+                while len(self._pending) < self.max_batch and not self._stop.is_set():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._flush_wanted.wait(remaining)
+                if self._stop.is_set() and not self._pending:
+                    return
+
+            self._flush_batch()
+
+    def _flush_batch(self):
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                upto, since = self.lsn, self._pending_since
+            if not batch:
+                return
+
+            self._file.write("".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+        with self._lock:
+            self.synced_lsn = max(self.synced_lsn, upto)
+            self.stats.record(len(batch), time.perf_counter() - since)
+            self._durable.notify_all()
+
+
+class Checkpointer(threading.Thread):
+    """Folds the WAL into a fresh snapshot once it grows past `max_bytes`."""
+
+    def __init__(self, db, interval=5.0, max_bytes=4 * 1024 * 1024):
+        super().__init__(name="wal-checkpoint", daemon=True)
+        self.db = db
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            # skipped while transactions are open rather than stalling new ones
+            if self.db.wal.size() >= self.max_bytes and not self.db._open_txns:
+                self.db.save()
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,155 @@
+"""
+Duplicate-payment detection.
+
+A debit is a likely duplicate when the same wallet is charged the same
+amount again within `window` seconds (a double-tapped pump terminal, a
+resubmitted form), or when it reuses an idempotency key. Recent debits are
+kept in buckets of `bucket` seconds, next to a running count per
+(wallet_id, amount) over all live buckets, so screening a payment is one
+dict lookup; whole buckets are dropped once they age out of the window,
+and the oldest ones early if more than `max_events` debits are held.
+
+Mode "flag" lets suspected duplicates through and lists them in
+summary(); "reject" refuses them; "off" disables the wallet/amount check.
+A reused idempotency key is always refused: the client said it is the same
+payment.
+
+    DUPLICATE_PAYMENTS=reject DUPLICATE_WINDOW=120 uvicorn lipafast.main:app
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+MODES = ("flag", "reject", "off")
+
+
+class DuplicateDetector:
+    def __init__(self, window=120.0, bucket=10.0, mode="flag", max_events=100_000, max_flagged=1000):
+        if mode not in MODES:
+            raise ValueError(f"Unknown duplicate mode '{mode}'. Expected one of: {', '.join(MODES)}")
+        self.window = window
+        self.bucket = bucket
+        self.mode = mode
+        self.max_events = max_events
+        self._buckets = deque()  # [start, {(wallet_id, amount): n}, [idempotency keys]], oldest first
+        self._recent = {}  # (wallet_id, amount) -> debits in the live buckets
+        self._keys = set()
+        self._events = 0
+        self._mutex = threading.Lock()
+        self.flagged = deque(maxlen=max_flagged)
+        self.stats = {"checked": 0, "flagged": 0, "rejected": 0, "evicted_early": 0}
+
+    @staticmethod
+    def _event(wallet_id, amount):
+        return wallet_id, round(float(amount), 2)
+
+    def _evict(self, now):
+        oldest = (now - self.window) // self.bucket * self.bucket
+        while self._buckets and (self._buckets[0][0] < oldest or self._events > self.max_events):
+            start, counts, keys = self._buckets.popleft()
+            if start >= oldest:
+                self.stats["evicted_early"] += 1
+            for event, n in counts.items():
+                left = self._recent[event] - n
+                if left:
+                    self._recent[event] = left
+                else:
+                    del self._recent[event]
+                self._events -= n
+            self._keys.difference_update(keys)
+
+    def screen(self, wallet_id, amount, key=None, now=None):
+        """
+        Why a debit looks like a duplicate, or None. Raises ValueError when it
+        has to be refused. Nothing is recorded: call record() once it committed.
+        """
+        now = time.time() if now is None else now
+        with self._mutex:
+            self._evict(now)
+            self.stats["checked"] += 1
+            if key is not None and key in self._keys:
+                self.stats["rejected"] += 1
+                raise ValueError(f"Duplicate payment: idempotency key '{key}' was already used")
+            if self.mode == "off" or self._event(wallet_id, amount) not in self._recent:
+                return None
+            reason = f"Wallet {wallet_id} was charged {amount} in the last {self.window:g} seconds"
+            if self.mode == "reject":
+                self.stats["rejected"] += 1
+                raise ValueError(f"Duplicate payment: {reason}")
+            return reason
+
+    def screen_within(self, wallet_id, amount, seen, scope):
+        """
+        screen(), also catching a repeat of a debit already in `seen` (the same
+        SQL statement or batch, not yet recorded). Adds this debit to `seen`.
+        """
+        event = self._event(wallet_id, amount)
+        reason = self.screen(wallet_id, amount)
+        if reason is None and event in seen and self.mode != "off":
+            reason = f"Wallet {wallet_id} is charged {event[1]} twice in one {scope}"
+            if self.mode == "reject":
+                with self._mutex:
+                    self.stats["rejected"] += 1
+                raise ValueError(f"Duplicate payment: {reason}")
+        seen.add(event)
+        return reason
+
+    def record(self, wallet_id, amount, key=None, reason=None, now=None):
+        """Remember a committed debit; `reason` is what screen() returned for it."""
+        now = time.time() if now is None else now
+        event = self._event(wallet_id, amount)
+        with self._mutex:
+            start = now // self.bucket * self.bucket
+            if not self._buckets or self._buckets[-1][0] < start:
+                self._buckets.append([start, {}, []])
+            _, counts, keys = self._buckets[-1]
+            counts[event] = counts.get(event, 0) + 1
+            self._recent[event] = self._recent.get(event, 0) + 1
+            self._events += 1
+            if key is not None:
+                keys.append(key)
+                self._keys.add(key)
+            if reason is not None:
+                self.stats["flagged"] += 1
+                self.flagged.append({
+                    "wallet_id": wallet_id,
+                    "amount": amount,
+                    "reason": reason,
+                    "timestamp": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+                })
+            self._evict(now)
+
+    # ledger rows from a SQL INSERT: only debits are screened
+    def screen_rows(self, rows):
+        reasons, seen = [], set()
+        for row in rows:
+            reason = None
+            if row.get("direction") == "debit":
+                reason = self.screen_within(row["wallet_id"], row["amount"], seen, "statement")
+            reasons.append(reason)
+        return reasons
+
+    def record_rows(self, rows, reasons):
+        for row, reason in zip(rows, reasons):
+            if row.get("direction") == "debit":
+                self.record(row["wallet_id"], row["amount"], reason=reason)
+
+    def summary(self):
+        with self._mutex:
+            return {
+                "mode": self.mode,
+                "window_seconds": self.window,
+                "tracked_events": self._events,
+                "buckets": len(self._buckets),
+                **self.stats,
+                "recent": list(self.flagged),
+            }
+
+
+# one per process: in sharded mode each owner screens the wallets it owns
+detector = DuplicateDetector(
+    window=float(os.environ.get("DUPLICATE_WINDOW", 120)),
+    mode=os.environ.get("DUPLICATE_PAYMENTS", "flag"),
+)
@@ -1,18 +1,199 @@
+import time
 from datetime import datetime
 
-def debit_wallet(db, wallet, amount):
-    if wallet["status"] != "active":
-        raise ValueError("Wallet inactive")
+from ..db.query import select
+from .duplicates import detector
 
-    if wallet["balance"] < amount:
-        raise ValueError("Insufficient funds")
+# Wallet operations take the Database owning the wallet as their first
+# argument: the local one, or a shard's when run through db/shard.py.
 
-    wallet["balance"] -= amount
 
-    db.t("ledger").insert({
-        "wallet_id": wallet["wallet_id"],
-        "owner": wallet["owner"],
-        "amount": amount,
-        "direction": "debit",
+def debit_wallet(db, wallet, amount, idempotency_key=None):
+    wallets = db.t("wallets")
+
+    # hold the wallet's row lock from the balance check through the debit
+    with wallets.lock_row(wallet["wallet_id"]):
+        wallet = wallets.find("wallet_id", wallet["wallet_id"])
+        if not wallet or wallet["status"] != "active":
+            raise ValueError("Wallet inactive")
+
+        if wallet["balance"] < amount:
+            raise ValueError("Insufficient funds")
+
+        # under the row lock, so a double tap is screened after the first debit recorded
+        duplicate = detector.screen(wallet["wallet_id"], amount, idempotency_key)
+
+        with db.transaction():
+            wallets.update("wallet_id", wallet["wallet_id"], {"balance": wallet["balance"] - amount})
+
+            db.t("ledger").insert({
+                "wallet_id": wallet["wallet_id"],
+                "owner": wallet["owner"],
+                "amount": amount,
+                "direction": "debit",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+        detector.record(wallet["wallet_id"], amount, idempotency_key, duplicate)
+
+
+def pay(db, wallet_id, amount, idempotency_key=None):
+    # the form posts whole shillings; ledger amounts are FLOAT
+    debit_wallet(db, {"wallet_id": wallet_id}, float(amount), idempotency_key)
+
+
+DIRECTIONS = ("debit", "credit")
+
+
+def batch(db, entries, atomic=True):
+    """
+    Apply many (wallet_id, amount, direction) entries at once: every entry is
+    checked in one pass under the wallets' row locks, then all balances and
+    ledger rows commit as one transaction (one WAL write, one ledger append).
+
+    A rejected entry (unknown or inactive wallet, bad amount or direction,
+    insufficient funds after the earlier entries of the batch, a duplicate
+    debit, including a repeat within the batch, when duplicates are
+    rejected) is reported; with `atomic` it also cancels the rest of the batch.
+    """
+    started = time.perf_counter()
+    wallets = db.t("wallets")
+    entries = [(wallet_id, amount, direction) for wallet_id, amount, direction in entries]
+
+    with wallets.lock_rows([wallet_id for wallet_id, _, _ in entries]):
+        balances, rows, results, duplicates, seen = {}, [], [], [], set()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for wallet_id, amount, direction in entries:
+            wallet = wallets.find("wallet_id", wallet_id)
+            balance = balances.get(wallet_id, wallet["balance"] if wallet else 0)
+            if direction not in DIRECTIONS:
+                error = f"Unknown direction '{direction}'"
+            elif not isinstance(amount, (int, float)) or amount <= 0:
+                error = "Amount must be positive"
+            elif not wallet:
+                error = "Wallet not found"
+            elif wallet["status"] != "active":
+                error = "Wallet inactive"
+            elif direction == "debit" and balance < amount:
+                error = "Insufficient funds"
+            else:
+                error = None
+                if direction == "debit":
+                    try:
+                        duplicate = detector.screen_within(wallet_id, amount, seen, "batch")
+                    except ValueError as e:
+                        error = str(e)
+            if not error:
+                balance = balances[wallet_id] = balance - amount if direction == "debit" else balance + amount
+                rows.append({
+                    "wallet_id": wallet_id,
+                    "owner": wallet["owner"],
+                    "amount": float(amount),
+                    "direction": direction,
+                    "timestamp": now
+                })
+                if direction == "debit":
+                    duplicates.append((wallet_id, amount, duplicate))
+            results.append({"wallet_id": wallet_id, "status": "rejected", "error": error} if error else
+                           {"wallet_id": wallet_id, "status": "ok", "balance": balance})
+
+        rejected = len(entries) - len(rows)
+        apply = bool(rows) and not (atomic and rejected)
+        if apply:
+            with db.transaction():
+                for wallet_id, balance in balances.items():
+                    wallets.update("wallet_id", wallet_id, {"balance": balance})
+                db.t("ledger").insert_many(rows)
+            for wallet_id, amount, duplicate in duplicates:
+                detector.record(wallet_id, amount, reason=duplicate)
+
+    for result in results:
+        if result["status"] == "ok":
+            result["status"] = "applied" if apply else "skipped"
+    seconds = time.perf_counter() - started
+    return {
+        "results": results,
+        "applied": len(rows) if apply else 0,
+        "rejected": rejected,
+        "seconds": round(seconds, 6),
+        "entries_per_second": round(len(entries) / seconds) if seconds else None,
+    }
+
+
+def _credit_row(wallet_id, owner, amount):
+    return {
+        "wallet_id": wallet_id,
+        "owner": owner,
+        "amount": float(amount),
+        "direction": "credit",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+    }
+
+
+# every balance change has a ledger row, so balances can be reconciled (fintech/reconcile.py)
+def open_wallet(db, wallet_id, owner, balance):
+    wallets = db.t("wallets")
+
+    if wallets.find("wallet_id", wallet_id):
+        raise ValueError("Wallet exists")
+
+    with db.transaction():
+        wallets.insert({
+            "wallet_id": wallet_id,
+            "owner": owner,
+            "balance": balance,
+            "status": "active"
+        })
+        if balance:
+            db.t("ledger").insert(_credit_row(wallet_id, owner, balance))
+
+
+def edit_wallet(db, wallet_id, owner=None, topup=0):
+    wallets = db.t("wallets")
+
+    with wallets.lock_row(wallet_id):
+        wallet = wallets.find("wallet_id", wallet_id)
+        if not wallet:
+            raise LookupError("Wallet not found")
+
+        updates = {}
+        if owner:
+            updates["owner"] = owner
+
+        if topup > 0:
+            updates["balance"] = wallet["balance"] + topup
+
+        if updates:
+            with db.transaction():
+                wallets.update("wallet_id", wallet_id, updates)
+                if topup > 0:
+                    db.t("ledger").insert(_credit_row(wallet_id, owner or wallet["owner"], topup))
+
+
+def deactivate_wallet(db, wallet_id):
+    wallets = db.t("wallets")
+
+    with wallets.lock_row(wallet_id):
+        if not wallets.find("wallet_id", wallet_id):
+            raise LookupError("Wallet not found")
+
+        wallets.update("wallet_id", wallet_id, {"status": "inactive"})
+
+
+def dashboard(db):
+    wallets_table = db.t("wallets")
+    ledger_table = db.t("ledger")
+    return db.results.cached(db, ("dashboard",), [wallets_table, ledger_table], lambda: _dashboard(db, wallets_table, ledger_table))
+
+
+def _dashboard(db, wallets_table, ledger_table):
+    # one snapshot for the whole page: totals always match the rows shown
+    with db.snapshot() as snapshot:
+        wallets = list(wallets_table.scan(snapshot=snapshot))
+        return {
+            "drivers": wallets,
+            "recent_transactions": list(select(ledger_table, order_by=[("timestamp", True)], limit=10, snapshot=snapshot)),
+            "total_drivers": len(wallets),
+            "active_drivers": snapshot.aggregate(wallets_table, "active_wallets"),
+            "total_balance": snapshot.aggregate(wallets_table, "total_balance") or 0,
+            "total_spent": snapshot.aggregate(ledger_table, "total_spent") or 0,
+        }
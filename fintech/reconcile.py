@@ -0,0 +1,128 @@
+"""
+Incremental balance reconciliation.
+
+A wallet's balance should equal the net of its ledger rows (credits minus
+debits). Instead of replaying the whole ledger, each run keeps a checkpoint
+per wallet in `ledger_checkpoints` (its ledger total and the last
+transaction_id counted) and a row in `reconciliations` with the highest
+transaction_id it covered. The next run only reads ledger rows above that
+id, through the sorted transaction_id index, so its cost follows new
+activity rather than total history; sealed partitions are skipped by their
+key range. A run stops below the lowest ledger id that has not committed
+yet; newer rows, and the wallets they touch, wait for the next run.
+
+Balances are compared against checkpoint + new rows for every wallet
+(`all_wallets`, one pass over wallets) or only for wallets with new ledger
+rows. A wallet drifts when its balance was changed without a ledger row
+(a raw SQL UPDATE), or a ledger row was changed after it was counted; the
+ledger is treated as append-only.
+
+    python -m lipafast.fintech.reconcile          # nightly
+"""
+import json
+import threading
+import time
+from datetime import datetime
+
+from ..db.predicate import Predicate
+
+TOLERANCE = 0.005  # balances are FLOAT shillings
+
+_running = threading.Lock()
+
+
+def _last_run(db):
+    # runs are only appended, one at a time (_running), with increasing ids:
+    # the newest is the last key of the primary-key index
+    runs = db.t("reconciliations")
+    last = next(reversed(runs.pk_index), None)
+    return runs.find("run_id", last) if last is not None else None
+
+
+def reconcile(db, all_wallets=True):
+    """One incremental run: returns the drifted wallets and what the run covered."""
+    started = time.perf_counter()
+    ledger, wallets, checkpoints = db.t("ledger"), db.t("wallets"), db.t("ledger_checkpoints")
+
+    with _running:
+        with db.snapshot() as snapshot:
+            last = _last_run(db)
+            since = last["through_id"] if last else 0
+            newer = Predicate(("cmp", ">", ("col", "transaction_id"), ("lit", since)), ledger.columns)
+            # ids are handed out before commit, and autocommit inserts and
+            # transactions publish in any order: stop below the lowest id this
+            # snapshot cannot see yet, so the next run still counts that row
+            pending = min((r["transaction_id"] for r in ledger.hidden_from(snapshot, newer)), default=None)
+
+            totals, through, processed, deferred = {}, since, 0, set()
+            for row in ledger.scan(newer, snapshot=snapshot):
+                if pending is not None and row["transaction_id"] > pending:
+                    deferred.add(row["wallet_id"])  # its balance already includes the row: check it next run
+                    continue
+                net = totals.setdefault(row["wallet_id"], [0.0, 0, 0])
+                net[0] += row["amount"] if row["direction"] == "credit" else -row["amount"]
+                net[1] += 1
+                net[2] = max(net[2], row["transaction_id"])
+                through = max(through, row["transaction_id"])
+                processed += 1
+
+            expected = {}
+            for wallet_id, (net, entries, last_id) in totals.items():
+                checkpoint = checkpoints.find("wallet_id", wallet_id)
+                base = (checkpoint["total"], checkpoint["entries"]) if checkpoint else (0.0, 0)
+                expected[wallet_id] = (base[0] + net, base[1] + entries, last_id)
+
+            touched = None
+            if not all_wallets:
+                ids = [("lit", wallet_id) for wallet_id in totals]
+                touched = Predicate(("in", ("col", "wallet_id"), ids, False), wallets.columns) if ids else None
+            balances = {
+                w["wallet_id"]: w["balance"]
+                for w in (wallets.scan(touched, snapshot=snapshot) if all_wallets or touched else ())
+                if w["wallet_id"] not in deferred
+            }
+
+        drifted = []
+        for wallet_id, balance in sorted(balances.items()):
+            if wallet_id in expected:
+                total = expected[wallet_id][0]
+            else:
+                checkpoint = checkpoints.find("wallet_id", wallet_id)
+                total = checkpoint["total"] if checkpoint else 0.0
+            if abs(balance - total) > TOLERANCE:
+                drifted.append({
+                    "wallet_id": wallet_id,
+                    "balance": balance,
+                    "ledger_total": round(total, 2),
+                    "drift": round(balance - total, 2)
+                })
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with db.transaction():
+            for wallet_id, (total, entries, last_id) in expected.items():
+                values = {"total": total, "entries": entries, "transaction_id": last_id}
+                if checkpoints.find("wallet_id", wallet_id):
+                    checkpoints.update("wallet_id", wallet_id, values)
+                else:
+                    checkpoints.insert({"wallet_id": wallet_id, **values})
+            run = {
+                "through_id": through,
+                "timestamp": timestamp,
+                "rows_processed": processed,
+                "wallets_checked": len(balances),
+                "drifted": len(drifted)
+            }
+            db.t("reconciliations").insert(run)
+
+    return {
+        **run,
+        "since_id": since,
+        "drifted_wallets": drifted,
+        "seconds": round(time.perf_counter() - started, 6),
+    }
+
+
+if __name__ == "__main__":
+    from ..db.store import db, router
+
+    print(json.dumps(router.reconcile() if router is not None else reconcile(db), indent=2))
@@ -1,10 +1,12 @@
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 import os
 from .web.routes import router
 from .parser.sql_parser import SQLParser
-from .repl import execute
+from .repl import execute, execute_page, execute_stream
+from .web.streaming import stream_rows
 from .db.store import db
 
 db = db
@@ -14,16 +16,48 @@ app.include_router(router)
 
 class SQLQuery(BaseModel):
     query: str
+    # values for ? (list) or :name (dict) placeholders
+    params: Optional[Union[List[Any], Dict[str, Any]]] = None
+    # keyset pagination: pass page_size, then the returned next_cursor for each further page
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
+    # stream rows as they are produced: "ndjson" (or true) for one row per line, "json" for a chunked array
+    stream: Optional[Union[bool, str]] = None
+    # read-your-writes on a replica: wait until the "lsn" a write on the primary returned has been applied
+    min_lsn: Optional[int] = None
 
 @app.post("/sql")
 def run_sql(q: SQLQuery):
     try:
+        if q.min_lsn is not None and db is not None and not db.wait_for(q.min_lsn, timeout=5.0):
+            raise ValueError(f"Replica has not caught up to LSN {q.min_lsn}")
         parsed = SQLParser.parse(q.query)
-        result = execute(parsed)
-        return {"result": result}
+        if parsed["type"] == "COPY":
+            raise ValueError("COPY reads files on the server and is only available from the REPL")
+        if parsed["type"] in ("BEGIN", "COMMIT", "ROLLBACK"):
+            # transactions belong to one thread; HTTP requests may land on any worker
+            raise ValueError("Transactions are only available from the REPL; /sql runs each statement on its own")
+        if q.stream:
+            return stream_rows(execute_stream(parsed, q.params), q.stream)
+        if q.page_size is not None or q.cursor is not None:
+            return execute_page(parsed, q.params, q.page_size or 100, q.cursor)
+        result = execute(parsed, q.params)
+        if db is None:
+            return {"result": result}
+        return {"result": result, "lsn": db.visible_lsn}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/cache")
+def cache_stats():
+    return {} if db is None else db.results.stats()
+
+@app.get("/replication")
+def replication():
+    if db is None or db.replication is None:
+        return {"role": "standalone"}
+    return db.replication.status()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
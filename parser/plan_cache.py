@@ -0,0 +1,69 @@
+import re
+import threading
+from collections import OrderedDict
+
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def normalize(sql: str) -> str:
+    """
+    Canonical form of a statement used as the cache key: trailing `;` dropped,
+    whitespace outside string literals collapsed, and `?` placeholders numbered
+    :0, :1, ... in the order they appear.
+    """
+    parts = _QUOTED.split(sql.strip().rstrip(';').strip())
+    position = 0
+    out = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            out.append(part)
+            continue
+        part = re.sub(r'\s+', ' ', part)
+        pieces = part.split('?')
+        for j, piece in enumerate(pieces[:-1]):
+            pieces[j] = f"{piece}:{position}"
+            position += 1
+        out.append(''.join(pieces))
+    return ''.join(out).strip()
+
+
+class PlanCache:
+    """Thread-safe LRU of parsed statements keyed by normalized SQL."""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key, plan):
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.capacity:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                "size": len(self._plans),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
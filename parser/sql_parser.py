@@ -1,18 +1,46 @@
 import re
-from typing import Dict
+from typing import Dict, List, Optional
+from .where import parse_where, parse_assignments, parse_values, parse_value_rows
+from .plan_cache import PlanCache, normalize
+
+AGGREGATE_CALL_RE = r'\b(SUM|COUNT|AVG|MIN|MAX)\s*\(\s*(\*|[\w.]+)\s*\)'
+AGGREGATE_RE = AGGREGATE_CALL_RE + '$'
 
 
 class SQLParser:
-    
+
+    # parsed statements keyed by normalized SQL; plans are shared, treat them as read-only
+    cache = PlanCache()
+
     @staticmethod
     def parse(sql: str) -> Dict:
-        sql = sql.strip().rstrip(';')
+        key = normalize(sql)
+        plan = SQLParser.cache.get(key)
+        if plan is None:
+            plan = SQLParser._parse(key)
+            SQLParser.cache.put(key, plan)
+        return plan
+
+    @staticmethod
+    def _parse(sql: str) -> Dict:
         sql_upper = sql.upper()
-        
-        if sql_upper.startswith('CREATE TABLE'):
+
+        if sql_upper.startswith('PREPARE'):
+            return SQLParser._parse_prepare(sql)
+        elif sql_upper.startswith('EXECUTE'):
+            return SQLParser._parse_execute(sql)
+        elif sql_upper.startswith('DEALLOCATE'):
+            return SQLParser._parse_deallocate(sql)
+        elif re.match(r'(BEGIN|START\s+TRANSACTION|COMMIT|END|ROLLBACK)\b', sql_upper):
+            return SQLParser._parse_transaction(sql)
+        elif sql_upper.startswith('CREATE TABLE'):
             return SQLParser._parse_create_table(sql)
+        elif re.match(r'CREATE\s+(?:\w+\s+)?INDEX\b', sql_upper):
+            return SQLParser._parse_create_index(sql)
         elif sql_upper.startswith('INSERT INTO'):
             return SQLParser._parse_insert(sql)
+        elif sql_upper.startswith('COPY'):
+            return SQLParser._parse_copy(sql)
         elif sql_upper.startswith('SHOW TABLES'):
             return SQLParser._parse_show_tables(sql)
         elif sql_upper.startswith('SELECT'):
@@ -25,6 +53,69 @@ class SQLParser:
             raise ValueError(f"Unsupported SQL command: {sql}")
         
         
+    @staticmethod
+    def _parse_prepare(sql: str) -> Dict:
+        match = re.match(r'PREPARE\s+(\w+)\s+(?:AS|FROM)\s+(.+)$', sql, re.IGNORECASE | re.DOTALL)
+
+        if not match:
+            raise ValueError("Invalid PREPARE syntax. Expected: PREPARE name AS statement")
+
+        statement = SQLParser._parse(match.group(2))
+        if statement['type'] in ('PREPARE', 'EXECUTE', 'DEALLOCATE', 'COPY', 'BEGIN', 'COMMIT', 'ROLLBACK'):
+            raise ValueError(f"Cannot prepare a {statement['type']} statement")
+
+        return {
+            'type': 'PREPARE',
+            'name': match.group(1),
+            'statement': statement
+        }
+
+    @staticmethod
+    def _parse_execute(sql: str) -> Dict:
+        match = re.match(r'EXECUTE\s+(\w+)(?:\s*\((.*)\)|\s+USING\s+(.+))?$', sql, re.IGNORECASE | re.DOTALL)
+
+        if not match:
+            raise ValueError("Invalid EXECUTE syntax. Expected: EXECUTE name (val1, val2) or EXECUTE name USING val1, val2")
+
+        args = match.group(2) if match.group(2) is not None else match.group(3)
+        params = parse_values(args) if args and args.strip() else []
+        if any(node[0] != 'lit' for node in params):
+            raise ValueError("EXECUTE expects literal parameter values")
+
+        return {
+            'type': 'EXECUTE',
+            'name': match.group(1),
+            'params': [node[1] for node in params]
+        }
+
+    @staticmethod
+    def _parse_deallocate(sql: str) -> Dict:
+        match = re.match(r'DEALLOCATE\s+(?:PREPARE\s+)?(\w+)$', sql, re.IGNORECASE)
+
+        if not match:
+            raise ValueError("Invalid DEALLOCATE syntax. Expected: DEALLOCATE name")
+
+        return {
+            'type': 'DEALLOCATE',
+            'name': match.group(1)
+        }
+
+    @staticmethod
+    def _parse_transaction(sql: str) -> Dict:
+        match = re.match(
+            r'(?:(BEGIN|START)(?:\s+(?:TRANSACTION|WORK))?|(COMMIT|END|ROLLBACK)(?:\s+(?:TRANSACTION|WORK))?)$',
+            sql,
+            re.IGNORECASE,
+        )
+
+        if not match:
+            raise ValueError("Invalid transaction statement. Expected: BEGIN, COMMIT or ROLLBACK")
+
+        keyword = (match.group(1) or match.group(2)).upper()
+        return {
+            'type': {'BEGIN': 'BEGIN', 'START': 'BEGIN', 'COMMIT': 'COMMIT', 'END': 'COMMIT'}.get(keyword, 'ROLLBACK')
+        }
+
     @staticmethod
     def _parse_show_tables(sql: str) -> Dict:
         pattern = r'SHOW TABLES'
@@ -39,14 +130,15 @@ class SQLParser:
     
     @staticmethod
     def _parse_create_table(sql: str) -> Dict:
-        pattern = r'CREATE TABLE (\w+)\s*\((.*)\)'
+        pattern = r'CREATE TABLE (\w+)\s*\((.*)\)(?:\s*USING\s+(\w+))?'
         match = re.match(pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if not match:
-            raise ValueError("Invalid CREATE TABLE syntax. Expected: CREATE TABLE name (col1 TYPE, col2 TYPE)")
+            raise ValueError("Invalid CREATE TABLE syntax. Expected: CREATE TABLE name (col1 TYPE, col2 TYPE) [USING ROWS|COLUMNAR]")
         
         table_name = match.group(1)
         columns_str = match.group(2)
+        storage = (match.group(3) or 'rows').lower()
         
         # Parse columns
         columns = []
@@ -78,12 +170,33 @@ class SQLParser:
         return {
             'type': 'CREATE_TABLE',
             'table_name': table_name,
-            'columns': columns
+            'columns': columns,
+            'storage': storage
         }
     
+    @staticmethod
+    def _parse_create_index(sql: str) -> Dict:
+        pattern = r'CREATE\s+(?:(HASH|SORTED|BTREE)\s+)?INDEX\s+(?:(\w+)\s+)?ON\s+(\w+)\s*\(\s*(\w+)\s*\)(?:\s+USING\s+(\w+))?$'
+        match = re.match(pattern, sql, re.IGNORECASE)
+
+        if not match:
+            raise ValueError("Invalid CREATE INDEX syntax. Expected: CREATE INDEX [name] ON table (col) [USING HASH|BTREE]")
+
+        kind = (match.group(5) or match.group(1) or 'HASH').lower()
+        if kind not in ('hash', 'sorted', 'btree'):
+            raise ValueError(f"Unsupported index type: {kind}")
+
+        return {
+            'type': 'CREATE_INDEX',
+            'index_name': match.group(2),
+            'table_name': match.group(3),
+            'column': match.group(4),
+            'kind': 'sorted' if kind == 'btree' else kind
+        }
+
     @staticmethod
     def _parse_insert(sql: str) -> Dict:
-        pattern1 = r'INSERT INTO (\w+)\s*\((.*?)\)\s*VALUES\s*\((.*)\)'
+        pattern1 = r'INSERT INTO (\w+)\s*\(([^)]*?)\)\s*VALUES\s*(\(.*\))$'
         match = re.match(pattern1, sql, re.IGNORECASE | re.DOTALL)
         
         if match:
@@ -94,10 +207,11 @@ class SQLParser:
                 'type': 'INSERT',
                 'table_name': table_name,
                 'columns': columns,
-                'values_str': values_str
+                'values_str': values_str,
+                'rows': parse_value_rows(values_str)
             }
         
-        pattern2 = r'INSERT INTO (\w+)\s*VALUES\s*\((.*)\)'
+        pattern2 = r'INSERT INTO (\w+)\s*VALUES\s*(\(.*\))$'
         match = re.match(pattern2, sql, re.IGNORECASE | re.DOTALL)
         
         if match:
@@ -107,10 +221,26 @@ class SQLParser:
                 'type': 'INSERT',
                 'table_name': table_name,
                 'columns': None,
-                'values_str': values_str
+                'values_str': values_str,
+                'rows': parse_value_rows(values_str)
             }
         
-        raise ValueError("Invalid INSERT syntax. Expected: INSERT INTO table (col1, col2) VALUES (val1, val2)")
+        raise ValueError("Invalid INSERT syntax. Expected: INSERT INTO table (col1, col2) VALUES (val1, val2), (val3, val4)")
+
+    @staticmethod
+    def _parse_copy(sql: str) -> Dict:
+        pattern = r"COPY\s+(\w+)\s+FROM\s+'((?:[^']|'')+)'(?:\s+(?:WITH\s+)?\(?\s*FORMAT\s+(\w+)\s*\)?)?$"
+        match = re.match(pattern, sql, re.IGNORECASE)
+
+        if not match:
+            raise ValueError("Invalid COPY syntax. Expected: COPY table FROM 'file.csv' [FORMAT CSV|NDJSON]")
+
+        return {
+            'type': 'COPY',
+            'table_name': match.group(1),
+            'path': match.group(2).replace("''", "'"),
+            'format': match.group(3).lower() if match.group(3) else None
+        }
     
     @staticmethod
     def _parse_select(sql: str) -> Dict:
@@ -119,7 +249,11 @@ class SQLParser:
             return SQLParser._parse_join(sql)
 
         
-        pattern = r'SELECT (.*?) FROM (\w+)(?: WHERE (.*))?'
+        pattern = (
+            r'SELECT\s+(.*?)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.*?))?'
+            r'(?:\s+GROUP\s+BY\s+(.*?))?(?:\s+HAVING\s+(.*?))?'
+            r'(?:\s+ORDER\s+BY\s+(.*?))?(?:\s+LIMIT\s+(\d+))?(?:\s+OFFSET\s+(\d+))?$'
+        )
         match = re.match(pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if not match:
@@ -128,19 +262,141 @@ class SQLParser:
         columns_str = match.group(1).strip()
         table_name = match.group(2).strip()
         where_clause = match.group(3).strip() if match.group(3) else None
+        group_by = [SQLParser._group_expr(g) for g in match.group(4).split(',')] if match.group(4) else None
+        having_clause = match.group(5).strip() if match.group(5) else None
         
         columns = [c.strip() for c in columns_str.split(',')] if columns_str != '*' else None
+        aggregates = SQLParser._parse_aggregates(columns, group_by) if columns else None
+        if (group_by or having_clause) and aggregates is None:
+            raise ValueError("GROUP BY / HAVING need an explicit select list")
+
+        having, having_aggregates = None, []
+        if having_clause:
+            having, having_aggregates = SQLParser._parse_having(having_clause)
+        
+        order_by = SQLParser._parse_order_by(match.group(6), aggregates) if match.group(6) else None
         
         return {
             'type': 'SELECT',
             'columns': columns,
+            'aggregates': aggregates,
+            'group_by': group_by,
+            'having': having,
+            'having_aggregates': having_aggregates,
+            'order_by': order_by,
+            'limit': int(match.group(7)) if match.group(7) else None,
+            'offset': int(match.group(8)) if match.group(8) else 0,
             'table_name': table_name,
-            'where_clause': where_clause
+            'where_clause': where_clause,
+            'where': parse_where(where_clause) if where_clause else None
         }
+
+    @staticmethod
+    def _parse_order_by(text: str, aggregates: Optional[List[Dict]] = None) -> List[tuple]:
+        """`timestamp DESC, wallet_id` -> [('timestamp', True), ('wallet_id', False)]"""
+        order_by = []
+        for item in text.split(','):
+            match = re.match(r'(.+?)(?:\s+(ASC|DESC))?$', item.strip(), re.IGNORECASE | re.DOTALL)
+            if not match:
+                raise ValueError(f"Invalid ORDER BY item: {item.strip()!r}")
+            expr = re.sub(r'\s+', '', match.group(1))
+            desc = (match.group(2) or '').upper() == 'DESC'
+
+            if aggregates is not None:
+                # grouped results are ordered by their output names
+                names = {i['alias']: i['alias'] for i in aggregates}
+                for i in aggregates:
+                    names[f"{i['func']}({i['column'] or '*'})" if i['func'] else i['column']] = i['alias']
+                aggregate = SQLParser._parse_aggregate(expr)
+                if aggregate is not None:
+                    key = f"{aggregate['func']}({aggregate['column'] or '*'})"
+                elif expr in names:
+                    key = expr
+                else:
+                    key = SQLParser._group_expr(expr)
+                if key not in names:
+                    raise ValueError(f"ORDER BY {expr} must be a selected column or aggregate")
+                order_by.append((names[key], desc))
+            else:
+                if not re.match(r'[\w.]+$', expr):
+                    raise ValueError(f"Unsupported ORDER BY expression: {expr}")
+                order_by.append((expr.rsplit('.', 1)[-1], desc))
+        return order_by
+
+    @staticmethod
+    def _group_expr(text: str) -> str:
+        """`ledger.wallet_id` -> `wallet_id`, `date( timestamp )` -> `DATE(timestamp)`"""
+        text = text.strip()
+        match = re.match(r'DATE\s*\(\s*([\w.]+)\s*\)$', text, re.IGNORECASE)
+        if match:
+            return f"DATE({match.group(1).rsplit('.', 1)[-1]})"
+        if not re.match(r'[\w.]+$', text):
+            raise ValueError(f"Unsupported GROUP BY expression: {text}")
+        return text.rsplit('.', 1)[-1]
+
+    @staticmethod
+    def _parse_aggregate(text: str) -> Optional[Dict]:
+        match = re.match(AGGREGATE_RE, text, re.IGNORECASE)
+        if not match:
+            return None
+        func, column = match.group(1).upper(), match.group(2)
+        if column == '*' and func != 'COUNT':
+            raise ValueError(f"{func}(*) is not supported")
+        return {'func': func, 'column': None if column == '*' else column.rsplit('.', 1)[-1]}
+
+    @staticmethod
+    def _parse_aggregates(columns: List[str], group_by: Optional[List[str]] = None) -> Optional[List[Dict]]:
+        """
+        `wallet_id, SUM(amount) AS spent, COUNT(*)` -> one {'func', 'column', 'alias'}
+        per item (func None for a GROUP BY expression), None for a plain select list
+        """
+        items = []
+        for item in columns:
+            match = re.match(r'(.+?)(?:\s+AS\s+(\w+))?$', item, re.IGNORECASE | re.DOTALL)
+            expr, alias = match.group(1).strip(), match.group(2)
+            aggregate = SQLParser._parse_aggregate(expr)
+            if aggregate is None:
+                items.append({'func': None, 'column': expr, 'alias': alias})
+            else:
+                aggregate['alias'] = alias or re.sub(r'\s+', '', expr)
+                items.append(aggregate)
+
+        if group_by is None:
+            if all(i['func'] is None for i in items):
+                return None
+            if any(i['func'] is None for i in items):
+                raise ValueError("Cannot mix aggregates and plain columns in SELECT without GROUP BY")
+            return items
+
+        for item in items:
+            if item['func'] is None:
+                expr = SQLParser._group_expr(item['column'])
+                if expr not in group_by:
+                    raise ValueError(f"Column '{item['column']}' must appear in GROUP BY or be aggregated")
+                item['alias'] = item['alias'] or item['column']
+                item['column'] = expr
+        return items
+
+    @staticmethod
+    def _parse_having(text: str):
+        """Swap aggregate calls in HAVING for hidden output columns computed alongside the select list."""
+        extra = []
+
+        def replace(match):
+            aggregate = SQLParser._parse_aggregate(match.group(0))
+            aggregate['alias'] = f"_having_{len(extra)}"
+            extra.append(aggregate)
+            return aggregate['alias']
+
+        # aggregate calls outside quoted strings only
+        parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", text)
+        text = ''.join(p if i % 2 else re.sub(AGGREGATE_CALL_RE, replace, p, flags=re.IGNORECASE)
+                       for i, p in enumerate(parts))
+        return parse_where(text), extra
     
     @staticmethod
     def _parse_join(sql: str) -> Dict:
-        pattern = r'SELECT (.*?) FROM (\w+)\s+JOIN (\w+)\s+ON\s+(.*?)(?: WHERE (.*))?'
+        pattern = r'SELECT\s+(.*?)\s+FROM\s+(\w+)\s+(?:INNER\s+)?JOIN\s+(\w+)\s+ON\s+(.*?)(?:\s+WHERE\s+(.*))?$'
         match = re.match(pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if not match:
@@ -153,19 +409,30 @@ class SQLParser:
         where_clause = match.group(5).strip() if match.group(5) else None
         
         columns = [c.strip() for c in columns_str.split(',')] if columns_str != '*' else None
-        
+
+        # ON a.x = b.y -> join columns for table1 / table2, whichever order they're written in
+        on = re.match(r'^([\w.]+)\s*=\s*([\w.]+)$', join_condition)
+        if not on:
+            raise ValueError("Invalid JOIN condition. Expected format: table1.col1 = table2.col2")
+        first, second = on.group(1), on.group(2)
+        if first.split('.')[0] == table2 and '.' in first:
+            first, second = second, first
+
         return {
             'type': 'JOIN',
             'columns': columns,
             'table1': table1,
             'table2': table2,
             'join_condition': join_condition,
-            'where_clause': where_clause
+            'left_column': first.rsplit('.', 1)[-1],
+            'right_column': second.rsplit('.', 1)[-1],
+            'where_clause': where_clause,
+            'where': parse_where(where_clause) if where_clause else None
         }
     
     @staticmethod
     def _parse_update(sql: str) -> Dict:
-        pattern = r'UPDATE (\w+)\s+SET\s+([\s\S]*?)(?: WHERE (.*))?$'
+        pattern = r'UPDATE\s+(\w+)\s+SET\s+([\s\S]*?)(?:\s+WHERE\s+(.*))?$'
         match = re.match(pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if not match:
@@ -175,27 +442,17 @@ class SQLParser:
         set_clause = match.group(2).strip()
         where_clause = match.group(3).strip() if match.group(3) else None
         
-        set_pairs = []
-        for pair in set_clause.split(','):
-            pair = pair.strip()
-            if '=' not in pair:
-                raise ValueError(f"Invalid SET pair: {pair}")
-            col, val = pair.split('=', 1)
-            set_pairs.append({
-                'column': col.strip(),
-                'value': val.strip()
-            })
-        
         return {
             'type': 'UPDATE',
             'table_name': table_name,
-            'set_pairs': set_pairs,
-            'where_clause': where_clause
+            'set_pairs': parse_assignments(set_clause),
+            'where_clause': where_clause,
+            'where': parse_where(where_clause) if where_clause else None
         }
     
     @staticmethod
     def _parse_delete(sql: str) -> Dict:
-        pattern = r'DELETE FROM (\w+)(?: WHERE (.*))?'
+        pattern = r'DELETE FROM\s+(\w+)(?:\s+WHERE\s+(.*))?$'
         match = re.match(pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if not match:
@@ -207,5 +464,6 @@ class SQLParser:
         return {
             'type': 'DELETE',
             'table_name': table_name,
-            'where_clause': where_clause
+            'where_clause': where_clause,
+            'where': parse_where(where_clause) if where_clause else None
         }
\ No newline at end of file
@@ -0,0 +1,205 @@
+import re
+from typing import List, Tuple
+
+# Expression nodes are plain tuples:
+#   ('col', name)            ('lit', value)         ('param', index_or_name)
+#   ('cmp', op, left, right)
+#   ('in', operand, [operands], negated)
+#   ('between', operand, low, high, negated)
+#   ('like', operand, pattern, negated)
+#   ('isnull', operand, negated)
+#   ('and', [nodes])  ('or', [nodes])  ('not', node)
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>-?(?:\d+\.\d*|\.\d+|\d+)(?![\w.]))
+      | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+      | (?P<param>:\w+)
+      | (?P<op><>|!=|<=|>=|=|<|>|\(|\)|,)
+      | (?P<ident>[A-Za-z_][\w.]*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {'AND', 'OR', 'NOT', 'IN', 'BETWEEN', 'LIKE', 'IS', 'NULL', 'TRUE', 'FALSE'}
+COMPARISONS = {'=', '!=', '<>', '<', '<=', '>', '>='}
+
+
+def tokenize(text: str) -> List[Tuple[str, object]]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Unexpected character in expression: {text[pos:pos + 10]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string':
+            quote = value[0]
+            value = value[1:-1].replace(quote * 2, quote)
+        elif kind == 'param':
+            # `?` placeholders arrive pre-numbered as :0, :1, ... (see SQLParser)
+            value = int(value[1:]) if value[1:].isdigit() else value[1:]
+        elif kind == 'ident' and value.upper() in KEYWORDS:
+            kind, value = 'kw', value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of expression")
+        self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+        tok_kind, tok_value = self.peek()
+        if tok_kind == kind and (value is None or tok_value == value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind, value=None):
+        if not self.accept(kind, value):
+            found = self.peek()[1]
+            raise ValueError(f"Expected {value or kind} in expression, found {found!r}")
+
+    def done(self):
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected token in expression: {self.peek()[1]!r}")
+
+    # expr := and_expr (OR and_expr)*
+    def expression(self):
+        nodes = [self.conjunction()]
+        while self.accept('kw', 'OR'):
+            nodes.append(self.conjunction())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def conjunction(self):
+        nodes = [self.negation()]
+        while self.accept('kw', 'AND'):
+            nodes.append(self.negation())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def negation(self):
+        if self.accept('kw', 'NOT'):
+            return ('not', self.negation())
+        if self.accept('op', '('):
+            node = self.expression()
+            self.expect('op', ')')
+            return node
+        return self.predicate()
+
+    def predicate(self):
+        left = self.operand()
+        negated = self.accept('kw', 'NOT')
+        kind, value = self.peek()
+
+        if kind == 'op' and value in COMPARISONS and not negated:
+            self.next()
+            return ('cmp', '!=' if value == '<>' else value, left, self.operand())
+        if self.accept('kw', 'IN'):
+            self.expect('op', '(')
+            items = [self.operand()]
+            while self.accept('op', ','):
+                items.append(self.operand())
+            self.expect('op', ')')
+            return ('in', left, items, negated)
+        if self.accept('kw', 'BETWEEN'):
+            low = self.operand()
+            self.expect('kw', 'AND')
+            return ('between', left, low, self.operand(), negated)
+        if self.accept('kw', 'LIKE'):
+            pattern = self.operand()
+            if pattern[0] == 'col' or (pattern[0] == 'lit' and not isinstance(pattern[1], str)):
+                raise ValueError("LIKE expects a string pattern")
+            return ('like', left, pattern, negated)
+        if self.accept('kw', 'IS') and not negated:
+            is_not = self.accept('kw', 'NOT')
+            self.expect('kw', 'NULL')
+            return ('isnull', left, is_not)
+
+        raise ValueError(f"Expected a comparison after {left[1]!r}")
+
+    def operand(self):
+        kind, value = self.next()
+        if kind == 'ident':
+            return ('col', value)
+        if kind in ('number', 'string'):
+            return ('lit', value)
+        if kind == 'param':
+            return ('param', value)
+        if kind == 'kw' and value in ('NULL', 'TRUE', 'FALSE'):
+            return ('lit', {'NULL': None, 'TRUE': True, 'FALSE': False}[value])
+        raise ValueError(f"Expected a column or value, found {value!r}")
+
+
+def parse_where(text: str):
+    parser = _Parser(text)
+    node = parser.expression()
+    parser.done()
+    return node
+
+
+def _value_list(parser):
+    values = [parser.operand()]
+    while parser.accept('op', ','):
+        values.append(parser.operand())
+    for node in values:
+        if node[0] == 'col':
+            raise ValueError(f"Expected a value, found column {node[1]!r}")
+    return values
+
+
+def parse_values(text: str) -> list:
+    """`1, 'Kim', :amount` -> [('lit', 1), ('lit', 'Kim'), ('param', 'amount')]"""
+    parser = _Parser(text)
+    values = _value_list(parser)
+    parser.done()
+    return values
+
+
+def parse_value_rows(text: str) -> list:
+    """`(1, 'a'), (2, ?)` -> one value list per parenthesised tuple"""
+    parser = _Parser(text)
+    rows = []
+    while True:
+        parser.expect('op', '(')
+        rows.append(_value_list(parser))
+        parser.expect('op', ')')
+        if not parser.accept('op', ','):
+            break
+    parser.done()
+    return rows
+
+
+def parse_assignments(text: str) -> List[dict]:
+    """`col = value, col2 = :p` -> [{'column': ..., 'value': ('lit', ...) | ('param', ...)}]"""
+    parser = _Parser(text)
+    pairs = []
+    while True:
+        kind, column = parser.next()
+        if kind != 'ident':
+            raise ValueError(f"Invalid SET pair near {column!r}")
+        parser.expect('op', '=')
+        value = parser.operand()
+        if value[0] == 'col':
+            raise ValueError(f"SET {column} expects a literal value")
+        pairs.append({'column': column, 'value': value})
+        if not parser.accept('op', ','):
+            break
+    parser.done()
+    return pairs
@@ -1,8 +1,15 @@
 # repl.py
-from lipafast.db.store import db
+from itertools import islice
+from lipafast.db.store import db, router
 from lipafast.parser.sql_parser import SQLParser
+from lipafast.parser.plan_cache import PlanCache
 # from .db.database import Database
 from .db.sql_logger import log_sql
+from .db.predicate import Predicate, column_name, check_type, param_value
+from .db.query import join, keyset_page, select, sort_rows
+from .db.bulk import copy_from
+from .db.aggregate import equality_filter, group_rows
+from .fintech.duplicates import detector
 
 TYPE_MAP = {
     "INT": int,
@@ -10,6 +17,29 @@ TYPE_MAP = {
     "FLOAT": float,
 }
 
+# PREPARE name AS ... -> parsed statement, shared by the REPL and HTTP
+PREPARED = {}
+
+# compiled WHERE/HAVING of parameterless statements, kept beside the shared
+# (read-only) plans: (id(node), id(table)) -> (node, table, predicate). An
+# entry holds its node and table, so their ids cannot be reused while it lives.
+PREDICATES = PlanCache(capacity=1024)
+
+
+class PreparedStatement:
+    """Parse once, execute many times with `?` / `:name` parameters bound."""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.parsed = SQLParser.parse(sql)
+
+    def execute(self, params=None):
+        return execute(self.parsed, params)
+
+
+def prepare(sql):
+    return PreparedStatement(sql)
+
 def read_sql():
     """
     Read multi-line SQL until a semicolon is found.
@@ -53,9 +83,193 @@ def print_rows(rows):
         print(" | ".join(str(r[h]) for h in headers))
 
 
-def execute(parsed):
+def cast_value(table, col_name, val):
+    col_type = table.columns[col_name]
+    if val is None or isinstance(val, col_type):
+        return val
+    try:
+        return col_type(val)
+    except Exception:
+        raise TypeError(
+            f"Column '{col_name}' expects type {col_type.__name__}, got {type(val).__name__}"
+        )
+
+
+def bind_value(table, col_name, node, params):
+    if node[0] == "param":
+        return check_type(col_name, table.columns[col_name], param_value(params, node[1]))
+    return cast_value(table, col_name, node[1])
+
+
+def compile_where(parsed, table, params=None):
+    if parsed["where"] is None:
+        return None
+    if params is not None:
+        return Predicate(parsed["where"], table.columns, params)
+
+    return _compiled(parsed["where"], table)
+
+
+def _compiled(node, table=None):
+    """Predicate for a parameterless statement's `node`, compiled once per table."""
+    key = (id(node), id(table))
+    entry = PREDICATES.get(key)
+    if entry is None:
+        entry = (node, table, Predicate(node, table.columns if table is not None else None))
+        PREDICATES.put(key, entry)
+    return entry[2]
+
+
+def run_aggregates(parsed, table, predicate, params=None, snapshot=None):
+    """Aggregate SELECT: a materialized SUM/COUNT when one matches, else one streaming pass."""
+    items = parsed["aggregates"]
+
+    if not parsed["group_by"] and parsed["having"] is None and parsed["limit"] is None and not parsed["offset"]:
+        where = equality_filter(predicate.node if predicate else None)
+        found = [table.find_aggregate(i["func"], i["column"], where) if where is not None else None
+                 for i in items]
+        if all(found):
+            if snapshot is not None:
+                return [{i["alias"]: snapshot.aggregate(table, agg.name) for i, agg in zip(items, found)}]
+            return [{i["alias"]: agg.value for i, agg in zip(items, found)}]
+
+    having = None
+    if parsed["having"] is not None:
+        if params is not None:
+            having = Predicate(parsed["having"], params=params)
+        else:
+            having = _compiled(parsed["having"])
+
+    rows = group_rows(table, items, parsed["group_by"], predicate, having, parsed["having_aggregates"], snapshot)
+    offset, limit = parsed["offset"], parsed["limit"]
+    if parsed["order_by"]:
+        return sort_rows(rows, parsed["order_by"], limit, offset)
+    return list(islice(rows, offset, None if limit is None else offset + limit))
+
+
+def execute_page(parsed, params=None, page_size=100, cursor=None):
+    """Keyset-paginated SELECT for HTTP clients: {"result": rows, "next_cursor": ...}."""
+    if parsed["type"] != "SELECT" or parsed.get("aggregates"):
+        raise ValueError("Pagination is only supported for plain single-table SELECT")
+    if parsed["offset"] or parsed["limit"] is not None:
+        raise ValueError("Use page_size and cursor instead of LIMIT/OFFSET when paginating")
+    if router is not None:
+        return router.execute_page(parsed, params, page_size, cursor)
+
+    table = db.t(parsed["table_name"])
+    with db.snapshot() as snapshot:
+        rows, next_cursor = keyset_page(
+            table,
+            compile_where(parsed, table, params),
+            parsed["columns"],
+            parsed["order_by"],
+            page_size,
+            cursor,
+            snapshot,
+        )
+    return {"result": rows, "next_cursor": next_cursor}
+
+
+def _snapshot_rows(parsed, params, snapshot):
+    if parsed["type"] == "JOIN":
+        return join(
+            db.t(parsed["table1"]),
+            db.t(parsed["table2"]),
+            parsed["left_column"],
+            parsed["right_column"],
+            where=parsed["where"],
+            columns=parsed["columns"],
+            params=params,
+            snapshot=snapshot,
+        )
+
+    table = db.t(parsed["table_name"])
+    predicate = compile_where(parsed, table, params)
+    if parsed.get("aggregates"):
+        return iter(run_aggregates(parsed, table, predicate, params, snapshot))
+    return select(
+        table,
+        predicate,
+        parsed["columns"],
+        order_by=parsed["order_by"],
+        limit=parsed["limit"],
+        offset=parsed["offset"],
+        snapshot=snapshot,
+    )
+
+
+def _closing(rows, snapshot):
+    try:
+        yield from rows
+    finally:
+        snapshot.close()
+
+
+def select_rows(parsed, params=None):
+    """
+    Rows of a SELECT or JOIN as an iterator, read from one snapshot: a long
+    or streamed query never blocks writers and never sees a half-applied
+    payment. The snapshot is released once the iterator is exhausted or closed.
+    """
+    if router is not None:
+        return iter(router.execute(parsed, params))
+    snapshot = db.snapshot()
+    try:
+        rows = _snapshot_rows(parsed, params, snapshot)
+    except BaseException:
+        snapshot.close()
+        raise
+    return _closing(rows, snapshot)
+
+
+def execute_stream(parsed, params=None):
+    """Like execute(), but SELECT/JOIN rows are produced lazily for streaming responses."""
+    if parsed["type"] == "EXECUTE":
+        if parsed["name"] not in PREPARED:
+            raise ValueError(f"Unknown prepared statement '{parsed['name']}'")
+        return execute_stream(PREPARED[parsed["name"]], parsed["params"] if params is None else params)
+    if parsed["type"] in ("SELECT", "JOIN"):
+        return select_rows(parsed, params)
+
+    result = execute(parsed, params)
+    return iter(result if isinstance(result, list) else [result])
+
+
+def execute(parsed, params=None):
     qtype = parsed["type"]
+
+    # ---------------- PREPARED STATEMENTS ----------------
+    if qtype == "PREPARE":
+        PREPARED[parsed["name"]] = parsed["statement"]
+        return {"message": f"Statement '{parsed['name']}' prepared"}
+
+    elif qtype == "EXECUTE":
+        if parsed["name"] not in PREPARED:
+            raise ValueError(f"Unknown prepared statement '{parsed['name']}'")
+        return execute(PREPARED[parsed["name"]], parsed["params"] if params is None else params)
+
+    elif qtype == "DEALLOCATE":
+        if PREPARED.pop(parsed["name"], None) is None:
+            raise ValueError(f"Unknown prepared statement '{parsed['name']}'")
+        return {"message": f"Statement '{parsed['name']}' deallocated"}
+
+    # ---------------- SHARDED ----------------
+    elif router is not None:
+        return router.execute(parsed, params)
     
+    # ---------------- TRANSACTIONS ----------------
+    elif qtype == "BEGIN":
+        db.begin()
+        return {"message": "Transaction started"}
+
+    elif qtype == "COMMIT":
+        db.commit()
+        return {"message": "Transaction committed"}
+
+    elif qtype == "ROLLBACK":
+        db.rollback()
+        return {"message": "Transaction rolled back"}
+
     # ---------------- CREATE TABLE ----------------
     if qtype == "CREATE_TABLE":
         columns = {}
@@ -75,58 +289,61 @@ def execute(parsed):
             columns,
             primary_key=primary_key,
             unique_keys=unique_keys,
+            storage=parsed.get("storage", "rows"),
         )
 
         return {"message": f"Table '{parsed['table_name']}' created"}
 
+    # ---------------- CREATE INDEX ----------------
+    elif qtype == "CREATE_INDEX":
+        table = db.t(parsed["table_name"])
+        index = table.create_index(parsed["column"], kind=parsed["kind"], name=parsed["index_name"])
+        return {"message": f"Index '{index.name}' on {table.name}({index.column}) ready"}
+
     # ---------------- INSERT ----------------
     elif qtype == "INSERT":
         table = db.t(parsed["table_name"])
-        values_raw = eval(f"[{parsed['values_str']}]")
         cols = parsed["columns"] or list(table.columns.keys())
-        row = {}
-
-        for col_name, val in zip(cols, values_raw):
-            col_type = table.columns[col_name]
-            if not isinstance(val, col_type):
-                try:
-                    val = col_type(val)
-                except Exception:
-                    raise TypeError(
-                        f"Column '{col_name}' expects type {col_type.__name__}, got {type(val).__name__}"
-                    )
-            row[col_name] = val
-
-        table.insert(row)
-        return {"rows_affected": 1}
-
-    # ---------------- SELECT ----------------
-    elif qtype == "SELECT":
-        table = db.t(parsed["table_name"])
-        return table.rows
-
-    # ---------------- JOIN ----------------
-    elif qtype == "JOIN":
-        t1 = db.t(parsed["table1"])
-        t2 = db.t(parsed["table2"])
-
-        # left, right = [x.strip() for x in parsed["join_condition"].split("=")]
-        condition = parsed["join_condition"]
-        if "=" not in condition:
-            raise ValueError("Invalid JOIN condition. Expected format: table1.col1 = table2.col2")
-        
-        left, right = map(str.strip, condition.split("=", 1))
-        
-        lcol = left.split(".", 1)[1] if "." in left else left
-        rcol = right.split(".", 1)[1] if "." in right else right
-
-        results = []
-        for r1 in t1.rows:
-            for r2 in t2.rows:
-                if r1[lcol] == r2[rcol]:
-                    results.append({**r1, **r2})
-
-        return results
+        for col_name in cols:
+            if col_name not in table.columns:
+                raise ValueError(f"Unknown column '{col_name}' for table '{table.name}'")
+
+        rows = []
+        for values in parsed["rows"]:
+            if len(values) != len(cols):
+                raise ValueError(f"INSERT expects {len(cols)} values per row, got {len(values)}")
+            rows.append({
+                col_name: bind_value(table, col_name, node, params)
+                for col_name, node in zip(cols, values)
+            })
+
+        # hand-written payments go through the same duplicate screening as /wallet/pay
+        duplicates = detector.screen_rows(rows) if table.name == "ledger" else None
+        if len(rows) == 1:
+            table.insert(rows[0])
+            count = 1
+        else:
+            count = table.insert_many(rows)
+        if duplicates is not None:
+            # inside BEGIN the debits only count once COMMIT makes them real
+            db.after_commit(lambda: detector.record_rows(rows, duplicates))
+            flagged = [reason for reason in duplicates if reason]
+            if flagged:
+                return {"rows_affected": count, "duplicates": flagged}
+        return {"rows_affected": count}
+
+    # ---------------- COPY ----------------
+    elif qtype == "COPY":
+        if db.current_transaction() is not None:
+            raise ValueError("COPY cannot run inside a transaction")
+        return copy_from(db.t(parsed["table_name"]), parsed["path"], parsed["format"])
+
+    # ---------------- SELECT / JOIN ----------------
+    elif qtype in ("SELECT", "JOIN"):
+        # repeat reads of unchanged tables come from the result cache (db/cache.py)
+        names = (parsed["table1"], parsed["table2"]) if qtype == "JOIN" else (parsed["table_name"],)
+        key = (repr({k: v for k, v in parsed.items() if not k.startswith("_")}), repr(params))
+        return db.results.cached(db, key, [db.t(name) for name in names], lambda: list(select_rows(parsed, params)))
 
     # ---------------- UPDATE ----------------
     elif qtype == "UPDATE":
@@ -135,15 +352,14 @@ def execute(parsed):
         if not parsed["where_clause"]:
             raise ValueError("UPDATE requires WHERE clause")
 
-        wcol, wval = [x.strip() for x in parsed["where_clause"].split("=")]
-        wval = table.columns[wcol](eval(wval))
-
         updates = {}
         for pair in parsed["set_pairs"]:
-            updates[pair["column"]] = table.columns[pair["column"]](eval(pair["value"]))
+            col = column_name(pair["column"])
+            if col not in table.columns:
+                raise ValueError(f"Unknown column '{col}' for table '{table.name}'")
+            updates[col] = bind_value(table, col, pair["value"], params)
 
-        table.update(wcol, wval, updates)
-        return {"rows_affected": 1}
+        return {"rows_affected": table.update_where(compile_where(parsed, table, params), updates)}
 
     # ---------------- DELETE ----------------
     elif qtype == "DELETE":
@@ -152,9 +368,7 @@ def execute(parsed):
         if not parsed["where_clause"]:
             raise ValueError("DELETE requires WHERE clause")
 
-        col, val = [x.strip() for x in parsed["where_clause"].split("=")]
-        table.delete(col, table.columns[col](eval(val)))
-        return {"rows_affected": 1}
+        return {"rows_affected": table.delete_where(compile_where(parsed, table, params))}
     
     elif qtype == "SHOW_TABLES":
         return list(db.tables.keys())    
@@ -182,11 +396,26 @@ def start_repl():
                 print("""
 Supported SQL commands:
   CREATE TABLE wallets (wallet_id INT PRIMARY KEY, owner STR, balance FLOAT, status STR);
+  CREATE TABLE trips (trip_id INT PRIMARY KEY, km FLOAT, region STR) USING COLUMNAR;
+  CREATE INDEX ON ledger (wallet_id);
+  CREATE INDEX ledger_ts ON ledger (timestamp) USING BTREE;
   INSERT INTO wallets VALUES (6, 'Kim', 500.0, 'active');
+  INSERT INTO wallets VALUES (7, 'Ann', 20.0, 'active'), (8, 'Joe', 75.5, 'active');
+  COPY ledger FROM 'history.csv';      (CSV with header, or FORMAT NDJSON)
   SELECT * FROM wallets;
+  SELECT owner, balance FROM wallets WHERE status = 'active' AND balance BETWEEN 100 AND 5000;
+  SELECT * FROM ledger WHERE wallet_id IN (1, 2) AND owner LIKE 'K%';
+  SELECT SUM(amount) AS spent, COUNT(*) FROM ledger WHERE direction = 'debit';
+  SELECT wallet_id, SUM(amount), AVG(amount), MAX(amount) FROM ledger GROUP BY wallet_id HAVING COUNT(*) > 5;
+  SELECT DATE(timestamp) AS day, SUM(amount) FROM ledger WHERE direction = 'debit' GROUP BY DATE(timestamp);
+  SELECT * FROM ledger WHERE wallet_id = 3 ORDER BY timestamp DESC LIMIT 10;
   SELECT * FROM wallets JOIN ledger ON wallets.wallet_id = ledger.wallet_id;
   UPDATE wallets SET balance = 200.0 WHERE wallet_id = 3;
   DELETE FROM wallets WHERE wallet_id = 3;
+  BEGIN;  UPDATE wallets SET balance = 150.0 WHERE wallet_id = 3;  INSERT INTO ledger ...;  COMMIT;   (or ROLLBACK)
+  PREPARE pay AS INSERT INTO ledger (wallet_id, owner, amount, direction, timestamp) VALUES (?, ?, ?, 'debit', ?);
+  EXECUTE pay (3, 'Kim', 250.0, '2026-01-01 08:00:00');
+  DEALLOCATE pay;
   HELP
   EXIT
 """)
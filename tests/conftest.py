@@ -0,0 +1,74 @@
+import atexit
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+# the repository is the `lipafast` package (see the README); register it
+# without installing so the modules' relative imports resolve
+ROOT = Path(__file__).resolve().parent.parent
+if "lipafast" not in sys.modules:
+    package = types.ModuleType("lipafast")
+    package.__path__ = [str(ROOT)]
+    sys.modules["lipafast"] = package
+# importing lipafast.db.store opens the shared database at DB_PATH: keep it out of the tree
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="lipafast-"), "db.json")
+
+from lipafast.db.database import Database  # noqa: E402
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "db.json"
+
+
+@pytest.fixture
+def db(path):
+    database = Database(path)
+    yield database
+    database.close()
+
+
+def crash(database):
+    """Drop `database` the way a killed process would: no checkpoint, only what reached the WAL."""
+    atexit.unregister(database.close)
+    database._checkpointer.stop()
+    database.wal.close()
+    database._close_snapfile()
+
+
+@pytest.fixture
+def reopen(path):
+    """Crash the given database and open its files again, as on restart."""
+    opened = []
+
+    def _reopen(database):
+        crash(database)
+        recovered = Database(path)
+        opened.append(recovered)
+        return recovered
+
+    yield _reopen
+    for database in opened:
+        database.close()
+
+
+@pytest.fixture(scope="session")
+def repl():
+    """lipafast.repl; tests point it at their own database."""
+    from lipafast import repl as module
+    return module
+
+
+@pytest.fixture
+def sql(db, repl, monkeypatch):
+    """Run SQL through repl.execute against `db`, with the application schema."""
+    from lipafast.db.store import create_schema
+    from lipafast.parser.sql_parser import SQLParser
+
+    create_schema(db)
+    monkeypatch.setattr(repl, "db", db)
+    return lambda text, params=None: repl.execute(SQLParser.parse(text), params)
@@ -0,0 +1,62 @@
+import pytest
+
+from lipafast.db.aggregate import MaterializedAggregate
+
+
+@pytest.fixture
+def ledger(db):
+    db.create_table("ledger", {"transaction_id": int, "amount": float, "direction": str}, "transaction_id")
+    table = db.t("ledger")
+    table.create_aggregate("total_spent", "SUM", "amount", where={"direction": "debit"})
+    table.create_aggregate("entries", "COUNT")
+    return table
+
+
+def recomputed(table):
+    rows = list(table.scan())
+    return sum(r["amount"] for r in rows if r["direction"] == "debit" and r["amount"] is not None), len(rows)
+
+
+def test_aggregates_follow_every_write(ledger):
+    ledger.insert_many([
+        {"transaction_id": 1, "amount": 10.0, "direction": "debit"},
+        {"transaction_id": 2, "amount": 5.0, "direction": "credit"},
+        {"transaction_id": 3, "amount": None, "direction": "debit"},
+    ])
+    ledger.insert({"transaction_id": 4, "amount": 2.5, "direction": "debit"})
+    ledger.update("transaction_id", 2, {"direction": "debit"})
+    ledger.update("transaction_id", 1, {"amount": 1.0})
+    ledger.delete("transaction_id", 4)
+
+    assert (ledger.aggregates["total_spent"].value, ledger.aggregates["entries"].value) == recomputed(ledger) == (6.0, 3)
+
+
+def test_sum_over_no_rows_is_null_and_count_is_zero(ledger):
+    assert ledger.aggregates["total_spent"].value is None
+    assert ledger.aggregates["entries"].value == 0
+
+
+def test_only_sum_and_count_can_be_materialized():
+    with pytest.raises(ValueError, match="can be materialized"):
+        MaterializedAggregate("x", "AVG", "amount")
+    with pytest.raises(ValueError, match="SUM needs a column"):
+        MaterializedAggregate("x", "SUM")
+
+
+def test_matching_sql_is_answered_without_a_scan(sql, repl, monkeypatch):
+    sql("INSERT INTO ledger (wallet_id, owner, amount, direction, timestamp) VALUES "
+        "(1, 'Alex', 10.0, 'debit', '2026-01-01 08:00:00'), (1, 'Alex', 4.0, 'credit', '2026-01-01 09:00:00')")
+    monkeypatch.setattr(repl, "group_rows", lambda *args: pytest.fail("scanned the ledger"))
+
+    assert sql("SELECT SUM(amount) AS spent FROM ledger WHERE direction = 'debit'") == [{"spent": 10.0}]
+    assert sql("SELECT COUNT(*) AS n FROM wallets WHERE status = 'active'") == [{"n": 0}]
+
+
+def test_aggregates_are_rebuilt_on_recovery(db, ledger, reopen):
+    ledger.insert({"transaction_id": 1, "amount": 10.0, "direction": "debit"})
+    db.save()
+    ledger.insert({"transaction_id": 2, "amount": 3.0, "direction": "debit"})
+    db = reopen(db)
+
+    assert db.t("ledger").aggregates["total_spent"].value == 13.0
+    assert db.t("ledger").aggregates["entries"].value == 2
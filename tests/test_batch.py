@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from lipafast.db.store import create_schema
+from lipafast.fintech import ledger
+from lipafast.fintech.duplicates import DuplicateDetector
+
+
+@pytest.fixture
+def wallets(db, monkeypatch):
+    create_schema(db)
+    monkeypatch.setattr(ledger, "detector", DuplicateDetector(mode="reject"))
+    ledger.open_wallet(db, 1, "alice", 100.0)
+    ledger.open_wallet(db, 2, "bob", 20.0)
+    ledger.open_wallet(db, 3, "carol", 50.0)
+    ledger.deactivate_wallet(db, 3)
+    return db.t("wallets")
+
+
+def balances(wallets):
+    return {w["wallet_id"]: w["balance"] for w in wallets.scan()}
+
+
+def debits(db):
+    return sorted((r["wallet_id"], r["amount"]) for r in db.t("ledger").scan() if r["direction"] == "debit")
+
+
+def test_a_batch_commits_as_one_transaction(db, wallets, path):
+    log = path.with_suffix(".wal")
+    before = len(log.read_text().splitlines())
+
+    result = ledger.batch(db, [(1, 30, "debit"), (2, 5, "credit"), (1, 10, "debit"), (2, 25, "debit")])
+
+    assert result["applied"] == 4 and result["rejected"] == 0
+    assert [r["status"] for r in result["results"]] == ["applied"] * 4
+    assert [r["balance"] for r in result["results"]] == [70.0, 25.0, 60.0, 0.0]
+    assert balances(wallets) == {1: 60.0, 2: 0.0, 3: 50.0}
+    assert debits(db) == [(1, 10.0), (1, 30.0), (2, 25.0)]
+    lines = log.read_text().splitlines()[before:]
+    assert [json.loads(line)["op"] for line in lines] == ["txn"]
+
+
+@pytest.mark.parametrize("entry, error", [
+    ((2, 30, "debit"), "Insufficient funds"),
+    ((9, 1, "debit"), "Wallet not found"),
+    ((3, 1, "debit"), "Wallet inactive"),
+    ((1, -5, "debit"), "Amount must be positive"),
+    ((1, 5, "refund"), "Unknown direction 'refund'"),
+])
+def test_one_rejected_entry_cancels_an_atomic_batch(db, wallets, entry, error):
+    result = ledger.batch(db, [(1, 10, "debit"), entry])
+
+    assert result["results"][1] == {"wallet_id": entry[0], "status": "rejected", "error": error}
+    assert result["results"][0]["status"] == "skipped"
+    assert result["applied"] == 0 and result["rejected"] == 1
+    assert balances(wallets) == {1: 100.0, 2: 20.0, 3: 50.0}
+    assert debits(db) == []
+
+
+def test_a_non_atomic_batch_applies_the_valid_entries(db, wallets):
+    result = ledger.batch(db, [(2, 15, "debit"), (2, 15, "debit"), (1, 10, "debit")], atomic=False)
+
+    assert [r["status"] for r in result["results"]] == ["applied", "rejected", "applied"]
+    assert result["results"][1]["error"] == "Insufficient funds"
+    assert balances(wallets) == {1: 90.0, 2: 5.0, 3: 50.0}
+
+
+def test_a_repeated_debit_within_a_batch_is_a_duplicate(db, wallets):
+    result = ledger.batch(db, [(1, 10, "debit"), (1, 10, "debit")], atomic=False)
+    assert result["results"][1]["error"].startswith("Duplicate payment: Wallet 1 is charged 10.0 twice in one batch")
+
+    # and the debit that was applied is remembered for later payments
+    with pytest.raises(ValueError, match="Duplicate payment"):
+        ledger.pay(db, 1, 10)
+    assert balances(wallets)[1] == 90.0
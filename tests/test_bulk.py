@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from lipafast.db.bulk import copy_from
+
+
+def wal_ops(path):
+    return [json.loads(line)["op"] for line in path.with_suffix(".wal").read_text().splitlines()]
+
+
+@pytest.mark.parametrize("storage", ["rows", "columnar"])
+def test_copy_survives_a_crash_before_the_checkpoint(db, reopen, tmp_path, storage):
+    db.create_table("ledger", {"transaction_id": int, "wallet_id": int, "amount": float}, "transaction_id", storage=storage)
+    source = tmp_path / "history.csv"
+    source.write_text("transaction_id,wallet_id,amount\n" + "".join(f"{i},{i % 7},{i}.5\n" for i in range(1, 501)))
+
+    assert copy_from(db.t("ledger"), source)["rows_affected"] == 500
+    db = reopen(db)
+
+    ledger = db.t("ledger")
+    assert len(list(ledger.scan())) == 500
+    assert dict(ledger.find("transaction_id", 500)) == {"transaction_id": 500, "wallet_id": 3, "amount": 500.5}
+    # rows loaded by COPY can be changed after recovery, as replicas replaying the WAL do
+    ledger.update("transaction_id", 7, {"amount": 1.0})
+    assert ledger.find("transaction_id", 7)["amount"] == 1.0
+
+
+def test_copy_is_one_wal_record(db, path, tmp_path):
+    db.create_table("ledger", {"transaction_id": int, "amount": float}, "transaction_id")
+    source = tmp_path / "history.ndjson"
+    source.write_text("".join(json.dumps({"transaction_id": i, "amount": i}) + "\n" for i in range(1, 101)))
+    copy_from(db.t("ledger"), source)
+
+    assert wal_ops(path) == ["create_table", "insert_many"]
+    assert db.t("ledger").find("transaction_id", 100)["amount"] == 100.0
+
+
+def test_copy_loads_nothing_when_a_row_is_bad(db, tmp_path):
+    db.create_table("ledger", {"transaction_id": int, "amount": float}, "transaction_id")
+    source = tmp_path / "history.csv"
+    source.write_text("transaction_id,amount\n1,1.0\n2,lots\n")
+    with pytest.raises(TypeError, match="history.csv:3"):
+        copy_from(db.t("ledger"), source)
+
+    source.write_text("transaction_id,amount\n1,1.0\n1,2.0\n")
+    with pytest.raises(ValueError, match="Primary key"):
+        copy_from(db.t("ledger"), source)
+    assert list(db.t("ledger").scan()) == []
+
+
+def test_multi_row_insert_is_one_record_and_all_or_nothing(sql, db, path):
+    sql("INSERT INTO wallets VALUES (1, 'Alex', 10.0, 'active'), (2, 'Mary', 20.0, 'active')")
+    assert wal_ops(path)[-1] == "insert_many"
+
+    with pytest.raises(ValueError, match="Primary key"):
+        sql("INSERT INTO wallets VALUES (3, 'Ann', 1.0, 'active'), (1, 'Dup', 1.0, 'active')")
+    assert sorted(w["wallet_id"] for w in sql("SELECT * FROM wallets")) == [1, 2]
+
+
+def test_copy_sql_refuses_to_run_inside_a_transaction(sql, tmp_path):
+    source = tmp_path / "wallets.csv"
+    source.write_text("wallet_id,owner,balance,status\n1,Alex,10.0,active\n")
+    sql("BEGIN")
+    with pytest.raises(ValueError, match="COPY cannot run inside a transaction"):
+        sql(f"COPY wallets FROM '{source}'")
+    sql("ROLLBACK")
+    assert sql(f"COPY wallets FROM '{source}'")["rows_affected"] == 1
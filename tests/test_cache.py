@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from lipafast.db.cache import ResultCache, _size
+
+
+@pytest.fixture
+def wallets(sql):
+    sql("INSERT INTO wallets VALUES (1, 'alice', 100.0, 'active'), (2, 'bob', 50.0, 'active')")
+    return sql
+
+
+def stats(db):
+    s = db.results.stats()
+    return s["hits"], s["misses"]
+
+
+def test_a_repeated_select_is_a_hit(db, wallets):
+    query = "SELECT * FROM wallets WHERE balance > 60"
+    first = wallets(query)
+    assert wallets(query) is first
+    assert stats(db) == (1, 1)
+
+    # other parameters are another entry
+    assert wallets("SELECT * FROM wallets WHERE balance > :b", {"b": 10}) != \
+        wallets("SELECT * FROM wallets WHERE balance > :b", {"b": 60})
+    assert stats(db) == (1, 3)
+
+
+def test_a_commit_to_a_read_table_is_a_miss(db, wallets):
+    query = "SELECT owner, balance FROM wallets ORDER BY wallet_id"
+    wallets(query)
+    wallets("INSERT INTO ledger (wallet_id, owner, amount, direction, timestamp) "
+            "VALUES (1, 'alice', 1.0, 'credit', '2026-10-01 08:00:00')")
+    wallets(query)
+    assert stats(db) == (1, 1)  # the ledger is not read by the query
+
+    wallets("UPDATE wallets SET balance = 10 WHERE wallet_id = 2")
+    assert wallets(query) == [{"owner": "alice", "balance": 100.0}, {"owner": "bob", "balance": 10.0}]
+    assert stats(db) == (1, 2)
+
+
+def test_reads_inside_a_transaction_bypass_the_cache(db, wallets):
+    query = "SELECT balance FROM wallets WHERE wallet_id = 1"
+    wallets(query)
+    wallets("BEGIN")
+    wallets("UPDATE wallets SET balance = 0 WHERE wallet_id = 1")
+    assert wallets(query) == [{"balance": 0.0}]
+    wallets("ROLLBACK")
+
+    assert wallets(query) == [{"balance": 100.0}]
+    assert stats(db) == (1, 1)
+
+
+def test_an_uncommitted_write_on_another_thread_is_not_cached(db, wallets):
+    query = "SELECT balance FROM wallets WHERE wallet_id = 1"
+    updated, finish = threading.Event(), threading.Event()
+
+    def pay():
+        with db.transaction():
+            db.t("wallets").update("wallet_id", 1, {"balance": 70.0})
+            updated.set()
+            finish.wait(5)
+
+    writer = threading.Thread(target=pay)
+    writer.start()
+    try:
+        assert updated.wait(5)
+        assert wallets(query) == [{"balance": 100.0}]
+    finally:
+        finish.set()
+        writer.join()
+    assert wallets(query) == [{"balance": 70.0}]
+
+
+def test_least_recently_used_entries_are_evicted(db):
+    db.create_table("t", {"id": int}, "id")
+    table = db.t("t")
+    row = lambda: ["x" * 500]
+    cache = ResultCache(max_bytes=_size(row()) * 5 // 2)  # room for two results
+
+    cache.cached(db, "a", [table], row)
+    cache.cached(db, "b", [table], row)
+    cache.cached(db, "a", [table], lambda: pytest.fail("'a' should still be cached"))
+    cache.cached(db, "c", [table], row)
+
+    assert list(cache._entries) == ["a", "c"] and cache.evictions == 1
+    # a result larger than the whole cache is returned but not kept
+    assert cache.cached(db, "huge", [table], lambda: ["x" * 5000])
+    assert "huge" not in cache._entries
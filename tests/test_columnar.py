@@ -0,0 +1,68 @@
+import pytest
+
+COLUMNS = {"transaction_id": int, "wallet_id": int, "amount": float, "direction": str, "note": str}
+
+
+@pytest.fixture
+def ledger(db):
+    db.create_table("ledger", COLUMNS, "transaction_id", storage="columnar")
+    return db.t("ledger")
+
+
+def rows(table):
+    return sorted((dict(r) for r in table.scan()), key=lambda r: r["transaction_id"])
+
+
+def test_columns_are_typed_and_dictionary_encoded(ledger):
+    ledger.insert_many([{"wallet_id": i % 3, "amount": i * 1.5, "direction": ("debit", "credit")[i % 2],
+                         "note": None} for i in range(1, 11)])
+
+    assert ledger._store.stats()["columns"] == {
+        "transaction_id": "int64", "wallet_id": "int64", "amount": "float64", "direction": "dict(2)", "note": "dict(0)"}
+    assert rows(ledger)[0] == {"transaction_id": 1, "wallet_id": 1, "amount": 1.5, "direction": "credit", "note": None}
+
+
+def test_columnar_table_behaves_like_a_row_table(db, ledger):
+    db.create_table("plain", COLUMNS, "transaction_id")
+    plain = db.t("plain")
+    for table in (ledger, plain):
+        table.insert_many([{"wallet_id": i, "amount": float(i), "direction": "debit", "note": f"n{i}"} for i in range(5)])
+        table.update("transaction_id", 2, {"amount": 9.0, "note": None})
+        table.delete("transaction_id", 4)
+        table.insert({"wallet_id": 7, "amount": 1.0, "direction": "credit", "note": "x"})
+
+    assert rows(ledger) == rows(plain)
+    assert dict(ledger.find("transaction_id", 2)) == plain.find("transaction_id", 2)
+
+
+def test_values_a_column_cannot_encode_fall_back_to_a_plain_list(ledger):
+    ledger.insert({"wallet_id": 1, "amount": 1.0, "direction": "debit", "note": "a"})
+    ledger.update("transaction_id", 1, {"wallet_id": True})
+
+    assert ledger._store.stats()["columns"]["wallet_id"] == "object"
+    assert ledger.find("transaction_id", 1)["wallet_id"] is True
+
+
+def test_rows_survive_a_crash_and_a_checkpoint(db, ledger, reopen):
+    ledger.insert_many([{"wallet_id": 1, "amount": 2.0, "direction": "debit", "note": None} for _ in range(3)])
+    db.save()
+    ledger.delete("transaction_id", 2)
+    expected = rows(ledger)
+
+    recovered = reopen(db)
+    assert rows(recovered.t("ledger")) == expected
+    assert recovered.t("ledger")._store is not None
+
+
+@pytest.mark.parametrize("storage", ["rows", "columnar"])
+def test_int_written_to_a_float_column_stays_typed(db, storage):
+    db.create_table("wallets", {"wallet_id": int, "balance": float}, "wallet_id", storage=storage)
+    wallets = db.t("wallets")
+    wallets.insert({"wallet_id": 3, "balance": 5})
+    wallets.insert({"wallet_id": 1, "balance": 1.0})
+    wallets.update("wallet_id", 1, {"balance": 7})
+
+    assert type(wallets.find("wallet_id", 1)["balance"]) is float
+    assert type(wallets.find("wallet_id", 3)["balance"]) is float
+    if storage == "columnar":
+        assert wallets._store.stats()["columns"]["balance"] == "float64"
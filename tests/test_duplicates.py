@@ -0,0 +1,106 @@
+import pytest
+
+from lipafast.fintech import ledger
+from lipafast.fintech.duplicates import DuplicateDetector
+
+
+def test_flag_mode_lets_a_repeat_through_and_lists_it():
+    detector = DuplicateDetector(window=60, mode="flag")
+    assert detector.screen(1, 10.0, now=1000) is None
+    detector.record(1, 10.0, now=1000)
+
+    reason = detector.screen(1, 10, now=1030)
+    assert reason == "Wallet 1 was charged 10 in the last 60 seconds"
+    detector.record(1, 10, reason=reason, now=1030)
+    assert detector.screen(2, 10.0, now=1030) is None
+    assert detector.screen(1, 10.01, now=1030) is None
+
+    summary = detector.summary()
+    assert summary["flagged"] == 1 and summary["tracked_events"] == 2
+    assert summary["recent"][0]["reason"] == reason
+
+
+def test_reject_mode_refuses_a_repeat_and_off_mode_ignores_it():
+    rejecting = DuplicateDetector(mode="reject")
+    rejecting.record(1, 10.0, now=1000)
+    with pytest.raises(ValueError, match="Duplicate payment: Wallet 1"):
+        rejecting.screen(1, 10.0, now=1001)
+
+    off = DuplicateDetector(mode="off")
+    off.record(1, 10.0, now=1000)
+    assert off.screen(1, 10.0, now=1001) is None
+
+
+def test_a_reused_idempotency_key_is_always_refused():
+    detector = DuplicateDetector(mode="off")
+    detector.record(1, 10.0, key="k1", now=1000)
+    with pytest.raises(ValueError, match="idempotency key 'k1'"):
+        detector.screen(2, 99.0, key="k1", now=1001)
+
+
+def test_debits_age_out_of_the_window():
+    detector = DuplicateDetector(window=60, bucket=10, mode="reject")
+    detector.record(1, 10.0, key="k1", now=1000)
+    assert detector.screen(1, 10.0, key="k1", now=1075) is None
+    assert detector.summary()["tracked_events"] == 0
+
+
+def test_the_oldest_buckets_go_first_past_max_events():
+    detector = DuplicateDetector(window=600, bucket=10, mode="reject", max_events=2)
+    for i, now in enumerate((1000, 1010, 1020)):
+        detector.record(1, float(i), now=now)
+    assert detector.summary()["evicted_early"] == 1
+    assert detector.screen(1, 0.0, now=1021) is None
+    with pytest.raises(ValueError):
+        detector.screen(1, 2.0, now=1021)
+
+
+def test_a_repeat_within_one_statement_is_caught():
+    detector = DuplicateDetector(mode="flag")
+    rows = [{"wallet_id": 1, "amount": 5.0, "direction": "debit"},
+            {"wallet_id": 1, "amount": 5.0, "direction": "credit"},
+            {"wallet_id": 1, "amount": 5.0, "direction": "debit"}]
+    assert detector.screen_rows(rows) == [None, None, "Wallet 1 is charged 5.0 twice in one statement"]
+
+
+@pytest.fixture
+def detector(repl, monkeypatch):
+    detector = DuplicateDetector(mode="flag")
+    monkeypatch.setattr(repl, "detector", detector)
+    monkeypatch.setattr(ledger, "detector", detector)
+    return detector
+
+
+INSERT = "INSERT INTO ledger (wallet_id, owner, amount, direction, timestamp) " \
+         "VALUES (1, 'alice', 10.0, 'debit', '2026-10-01 08:00:00')"
+
+
+def test_sql_inserts_are_screened(sql, detector):
+    assert sql(INSERT) == {"rows_affected": 1}
+    assert sql(INSERT)["duplicates"] == ["Wallet 1 was charged 10.0 in the last 120 seconds"]
+
+
+def test_a_rolled_back_insert_is_not_remembered(sql, detector):
+    sql("BEGIN")
+    sql(INSERT)
+    assert detector.summary()["tracked_events"] == 0  # not before COMMIT
+    sql("ROLLBACK")
+
+    assert sql(INSERT) == {"rows_affected": 1}
+
+
+def test_a_committed_insert_is_remembered(sql, detector):
+    sql("BEGIN")
+    sql(INSERT)
+    sql("COMMIT")
+
+    assert detector.summary()["tracked_events"] == 1
+    assert "duplicates" in sql(INSERT)
+
+
+def test_a_payment_key_cannot_be_used_twice(db, sql, detector):
+    ledger.open_wallet(db, 1, "alice", 100.0)
+    ledger.pay(db, 1, 10, idempotency_key="order-7")
+    with pytest.raises(ValueError, match="idempotency key 'order-7'"):
+        ledger.pay(db, 1, 20, idempotency_key="order-7")
+    assert db.t("wallets").find("wallet_id", 1)["balance"] == 90.0
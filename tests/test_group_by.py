@@ -0,0 +1,63 @@
+import pytest
+
+ROWS = [
+    (1, "Alex", 10.0, "debit", "2026-01-01 08:00:00"),
+    (1, "Alex", 30.0, "debit", "2026-01-02 09:00:00"),
+    (1, "Alex", 5.0, "credit", "2026-01-02 10:00:00"),
+    (2, "Mary", 7.5, "debit", "2026-01-01 11:00:00"),
+    (3, "Ann", 100.0, "credit", "2026-01-03 12:00:00"),
+]
+
+
+@pytest.fixture
+def ledger(sql):
+    values = ", ".join(f"({w}, '{o}', {a}, '{d}', '{t}')" for w, o, a, d, t in ROWS)
+    sql(f"INSERT INTO ledger (wallet_id, owner, amount, direction, timestamp) VALUES {values}")
+    return sql
+
+
+def by(rows, key):
+    return {r[key]: r for r in rows}
+
+
+def test_all_functions_per_group(ledger):
+    rows = ledger(
+        "SELECT wallet_id, SUM(amount) AS total, COUNT(*) AS n, AVG(amount) AS mean, MIN(amount) AS low, "
+        "MAX(amount) AS high FROM ledger GROUP BY wallet_id"
+    )
+    assert by(rows, "wallet_id") == {
+        1: {"wallet_id": 1, "total": 45.0, "n": 3, "mean": 15.0, "low": 5.0, "high": 30.0},
+        2: {"wallet_id": 2, "total": 7.5, "n": 1, "mean": 7.5, "low": 7.5, "high": 7.5},
+        3: {"wallet_id": 3, "total": 100.0, "n": 1, "mean": 100.0, "low": 100.0, "high": 100.0},
+    }
+
+
+def test_indexed_and_scanned_grouping_agree(ledger):
+    # ledger has an index on wallet_id but not on owner
+    indexed = ledger("SELECT wallet_id, SUM(amount) AS total FROM ledger WHERE direction = 'debit' GROUP BY wallet_id")
+    scanned = ledger("SELECT owner, SUM(amount) AS total FROM ledger WHERE direction = 'debit' GROUP BY owner")
+
+    assert sorted(r["total"] for r in indexed) == sorted(r["total"] for r in scanned) == [7.5, 40.0]
+
+
+def test_having_order_by_and_limit(ledger):
+    rows = ledger(
+        "SELECT wallet_id, COUNT(*) AS n FROM ledger GROUP BY wallet_id HAVING SUM(amount) > 10 ORDER BY n DESC LIMIT 1"
+    )
+    assert rows == [{"wallet_id": 1, "n": 3}]
+
+
+def test_group_by_day(ledger):
+    rows = ledger("SELECT DATE(timestamp) AS day, SUM(amount) AS total FROM ledger GROUP BY DATE(timestamp)")
+    assert by(rows, "day") == {
+        "2026-01-01": {"day": "2026-01-01", "total": 17.5},
+        "2026-01-02": {"day": "2026-01-02", "total": 35.0},
+        "2026-01-03": {"day": "2026-01-03", "total": 100.0},
+    }
+
+
+def test_aggregates_over_no_rows(ledger):
+    assert ledger("SELECT SUM(amount) AS total, COUNT(*) AS n, MAX(amount) AS high FROM ledger WHERE wallet_id = 99") == [
+        {"total": None, "n": 0, "high": None}
+    ]
+    assert ledger("SELECT wallet_id, COUNT(*) AS n FROM ledger WHERE wallet_id = 99 GROUP BY wallet_id") == []
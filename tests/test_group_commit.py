@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from lipafast.db.database import Database
+
+
+@pytest.fixture
+def grouped(path):
+    database = Database(path, fsync="group", batch_window=0.02)
+    database.create_table("ledger", {"transaction_id": int, "amount": float}, "transaction_id")
+    yield database
+    database.close()
+
+
+def insert_concurrently(database, writers=8, each=10):
+    def write(start):
+        for i in range(start, start + each):
+            database.t("ledger").insert({"transaction_id": i, "amount": float(i)})
+
+    threads = [threading.Thread(target=write, args=(w * each + 1,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return writers * each
+
+
+def test_concurrent_writers_share_fsyncs(grouped):
+    count = insert_concurrently(grouped)
+    stats = grouped.commit_stats()
+
+    assert stats["records"] == count + 1  # and the CREATE TABLE
+    assert stats["batches"] < stats["records"]
+    assert stats["avg_batch_size"] > 1
+
+
+def test_a_write_returns_only_once_its_batch_is_durable(grouped, path):
+    grouped.t("ledger").insert({"transaction_id": 1, "amount": 1.0})
+
+    assert grouped.wal.synced_lsn >= grouped.wal.lsn
+    assert '"transaction_id":1' in path.with_suffix(".wal").read_text()
+
+
+def test_grouped_records_replay_after_a_crash(grouped, path, reopen):
+    count = insert_concurrently(grouped, writers=4, each=5)
+    recovered = reopen(grouped)
+
+    assert len(list(recovered.t("ledger").scan())) == count
+
+
+def test_a_full_batch_is_flushed_without_waiting_out_the_window(grouped):
+    grouped.batch_window = 5.0
+    grouped.max_batch = 1
+    started = time.perf_counter()
+    for i in range(1, 4):
+        grouped.t("ledger").insert({"transaction_id": i, "amount": 1.0})
+
+    assert time.perf_counter() - started < 2.0
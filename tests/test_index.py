@@ -0,0 +1,66 @@
+import pytest
+
+from lipafast.db.predicate import Predicate, access_path
+from lipafast.parser.where import parse_where
+
+
+@pytest.fixture
+def ledger(db):
+    db.create_table("ledger", {"transaction_id": int, "wallet_id": int, "amount": float}, "transaction_id")
+    table = db.t("ledger")
+    table.insert_many({"transaction_id": i, "wallet_id": i % 5, "amount": float(i)} for i in range(1, 101))
+    return table
+
+
+def path_of(table, where):
+    return access_path(table, Predicate(parse_where(where), table.columns).node)
+
+
+def ids(rows):
+    return sorted(r["transaction_id"] for r in rows)
+
+
+def test_equality_uses_a_hash_index(ledger):
+    ledger.create_index("wallet_id")
+    kind, rows = path_of(ledger, "wallet_id = 3 AND amount > 50")
+
+    assert kind == "rows" and len(rows) == 20
+    assert ids(ledger.scan(Predicate(parse_where("wallet_id = 3 AND amount > 50"), ledger.columns))) == [
+        i for i in range(53, 101, 5)
+    ]
+
+
+def test_range_uses_a_sorted_index(ledger):
+    ledger.create_index("amount", kind="sorted")
+    kind, index, span = path_of(ledger, "amount >= 10 AND amount < 13")
+
+    assert kind == "range" and index.kind == "sorted" and span == (10.0, 13.0, True, False)
+    assert ids(index.range(*span)) == [10, 11, 12]
+
+
+def test_without_an_index_it_scans(ledger):
+    assert path_of(ledger, "amount > 10")[0] == "scan"
+
+
+def test_indexes_follow_inserts_updates_and_deletes(ledger):
+    hashed = ledger.create_index("wallet_id")
+    ordered = ledger.create_index("amount", kind="sorted")
+    ledger.update("transaction_id", 1, {"wallet_id": 4, "amount": 500.0})
+    ledger.delete("transaction_id", 2)
+    ledger.insert({"transaction_id": 101, "wallet_id": 4, "amount": 0.5})
+
+    assert 1 in ids(hashed.lookup(4)) and 101 in ids(hashed.lookup(4))
+    assert 1 not in ids(hashed.lookup(1))
+    assert ids(ordered.range(None, 1.0)) == [101]
+    assert ids(ordered.range(400.0, None)) == [1]
+    assert 2.0 not in ordered.keys
+
+
+def test_create_index_sql_and_replay(sql, db, reopen):
+    assert sql("CREATE SORTED INDEX ON ledger (amount)") == {"message": "Index 'ledger_amount_idx' on ledger(amount) ready"}
+    assert db.t("ledger").indexes["amount"].kind == "sorted"
+    with pytest.raises(ValueError, match="Unknown index type"):
+        db.t("ledger").create_index("owner", kind="bitmap")
+
+    recovered = reopen(db)
+    assert recovered.t("ledger").indexes["amount"].kind == "sorted"
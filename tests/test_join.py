@@ -0,0 +1,76 @@
+import pytest
+
+from lipafast.db.query import join, plan_join
+from lipafast.parser.where import parse_where
+
+
+@pytest.fixture
+def tables(db):
+    db.create_table("wallets", {"wallet_id": int, "owner": str, "status": str}, "wallet_id")
+    db.create_table("ledger", {"transaction_id": int, "wallet_id": int, "amount": float}, "transaction_id")
+    wallets, ledger = db.t("wallets"), db.t("ledger")
+    wallets.insert_many({"wallet_id": i, "owner": f"owner{i}", "status": "active" if i % 2 else "frozen"} for i in range(1, 11))
+    ledger.insert_many({"transaction_id": i, "wallet_id": i % 12, "amount": float(i)} for i in range(1, 61))
+    return wallets, ledger
+
+
+def nested_loop(wallets, ledger, keep=lambda w, l: True):
+    return sorted(
+        (w["wallet_id"], l["transaction_id"])
+        for w in wallets.scan() for l in ledger.scan()
+        if w["wallet_id"] == l["wallet_id"] and keep(w, l)
+    )
+
+
+def pairs(rows):
+    return sorted((r["wallet_id"], r["transaction_id"]) for r in rows)
+
+
+def test_hash_join_matches_a_nested_loop(tables):
+    wallets, ledger = tables
+    strategy, _, _ = plan_join(wallets, ledger, "wallet_id", "wallet_id")
+
+    assert strategy == "hash"
+    assert pairs(join(wallets, ledger, "wallet_id", "wallet_id")) == nested_loop(wallets, ledger)
+
+
+def test_an_index_on_the_join_column_is_probed(tables):
+    wallets, ledger = tables
+    ledger.create_index("wallet_id")
+    strategy, _, _ = plan_join(wallets, ledger, "wallet_id", "wallet_id")
+
+    assert strategy == "index_nested_loop"
+    assert pairs(join(wallets, ledger, "wallet_id", "wallet_id")) == nested_loop(wallets, ledger)
+
+
+def test_where_terms_are_pushed_to_each_side_and_the_rest_applied_after(tables):
+    wallets, ledger = tables
+    where = parse_where("wallets.status = 'active' AND ledger.amount > 20 AND wallets.wallet_id < ledger.amount")
+    rows = join(wallets, ledger, "wallet_id", "wallet_id", where)
+
+    assert pairs(rows) == nested_loop(
+        wallets, ledger, lambda w, l: w["status"] == "active" and l["amount"] > 20 and w["wallet_id"] < l["amount"]
+    )
+
+
+def test_projection_and_sql(tables, repl, monkeypatch, db):
+    wallets, ledger = tables
+    rows = list(join(wallets, ledger, "wallet_id", "wallet_id", columns=["wallets.owner", "ledger.amount"]))
+    assert sorted(rows, key=lambda r: r["ledger.amount"])[0] == {"wallets.owner": "owner1", "ledger.amount": 1.0}
+
+    from lipafast.parser.sql_parser import SQLParser
+    monkeypatch.setattr(repl, "db", db)
+    result = repl.execute(SQLParser.parse(
+        "SELECT * FROM wallets JOIN ledger ON wallets.wallet_id = ledger.wallet_id WHERE ledger.amount < 3"
+    ))
+    assert pairs(result) == [(1, 1), (2, 2)]
+
+
+def test_snapshot_join_ignores_later_writes(tables, db):
+    wallets, ledger = tables
+    ledger.create_index("wallet_id")
+    with db.snapshot() as snapshot:
+        ledger.insert({"transaction_id": 100, "wallet_id": 1, "amount": 1.0})
+        wallets.delete("wallet_id", 2)
+        rows = pairs(join(wallets, ledger, "wallet_id", "wallet_id", snapshot=snapshot))
+    assert (1, 100) not in rows and (2, 2) in rows
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+from lipafast.db.locks import LockManager
+from lipafast.db.store import create_schema
+from lipafast.fintech import ledger
+from lipafast.fintech.duplicates import DuplicateDetector
+
+
+def in_thread(target):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = target()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    return result
+
+
+def test_row_lock_excludes_other_threads_only_for_that_key():
+    locks = LockManager()
+    with locks.row("wallets", 1):
+        with locks.row("wallets", 1):  # re-entrant for the holder
+            pass
+        assert "value" in in_thread(lambda: locks.row("wallets", 2).__enter__())
+        blocked = in_thread(lambda: locks.row("wallets", 1, timeout=0.05).__enter__())
+        assert isinstance(blocked["error"], TimeoutError)
+
+    assert locks._rows == {}  # nothing left behind by the timed-out waiter
+
+
+def test_rows_in_opposite_orders_do_not_deadlock():
+    locks = LockManager()
+
+    def worker(keys):
+        for _ in range(200):
+            with locks.rows("wallets", keys, timeout=2):
+                pass
+
+    threads = [threading.Thread(target=worker, args=(keys,)) for keys in ([1, 2, 3], [3, 2, 1])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+@pytest.fixture
+def wallets(db, monkeypatch):
+    create_schema(db)
+    monkeypatch.setattr(ledger, "detector", DuplicateDetector(mode="off"))
+    ledger.open_wallet(db, 1, "alice", 100.0)
+    ledger.open_wallet(db, 2, "bob", 100.0)
+    return db.t("wallets")
+
+
+def test_payments_on_different_wallets_proceed_together(db, wallets):
+    barrier = threading.Barrier(20)
+
+    def pay(wallet_id):
+        barrier.wait()
+        ledger.pay(db, wallet_id, 10)
+
+    threads = [threading.Thread(target=pay, args=(1 + i % 2,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert [wallets.find("wallet_id", w)["balance"] for w in (1, 2)] == [0, 0]
+    assert wallets.aggregates["total_balance"].value == 0
+
+
+def test_payments_beyond_the_balance_are_refused(db, wallets):
+    barrier = threading.Barrier(15)
+    refused = []
+
+    def pay():
+        barrier.wait()
+        try:
+            ledger.pay(db, 1, 10)
+        except ValueError as e:
+            refused.append(str(e))
+
+    threads = [threading.Thread(target=pay) for _ in range(15)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert refused == ["Insufficient funds"] * 5
+    assert wallets.find("wallet_id", 1)["balance"] == 0
+    debits = [r for r in db.t("ledger").scan() if r["direction"] == "debit"]
+    assert len(debits) == 10
+    assert wallets.find("wallet_id", 2)["balance"] == 100.0
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def wallets(db, request):
+    db.create_table("wallets", {"wallet_id": int, "balance": float, "status": str}, "wallet_id", storage=request.param)
+    table = db.t("wallets")
+    table.create_aggregate("total_balance", "SUM", "balance")
+    table.insert_many([
+        {"wallet_id": 1, "balance": 100.0, "status": "active"},
+        {"wallet_id": 2, "balance": 50.0, "status": "active"},
+    ])
+    return table
+
+
+def balances(table, snapshot):
+    return sorted((w["wallet_id"], w["balance"]) for w in table.scan(snapshot=snapshot))
+
+
+def test_snapshot_does_not_see_an_update_in_progress(db, wallets):
+    before = db.snapshot()
+    updated, finish = threading.Event(), threading.Event()
+
+    def pay():
+        with db.transaction():
+            wallets.update("wallet_id", 1, {"balance": 70.0})
+            updated.set()
+            finish.wait(5)
+
+    writer = threading.Thread(target=pay)
+    writer.start()
+    assert updated.wait(5)
+    try:
+        with db.snapshot() as during:
+            assert balances(wallets, during) == [(1, 100.0), (2, 50.0)]
+            assert during.aggregate(wallets, "total_balance") == 150.0
+    finally:
+        finish.set()
+        writer.join()
+
+    # an older snapshot keeps its view after the commit; a new one sees the update
+    assert balances(wallets, before) == [(1, 100.0), (2, 50.0)]
+    assert before.aggregate(wallets, "total_balance") == 150.0
+    before.close()
+    with db.snapshot() as after:
+        assert balances(wallets, after) == [(1, 70.0), (2, 50.0)]
+        assert after.aggregate(wallets, "total_balance") == 120.0
+
+
+def test_snapshot_ignores_later_inserts_and_deletes(db, wallets):
+    with db.snapshot() as before:
+        wallets.delete("wallet_id", 2)
+        wallets.insert({"wallet_id": 3, "balance": 5.0, "status": "active"})
+
+        assert balances(wallets, before) == [(1, 100.0), (2, 50.0)]
+        assert before.aggregate(wallets, "total_balance") == 150.0
+    with db.snapshot() as after:
+        assert balances(wallets, after) == [(1, 100.0), (3, 5.0)]
+
+
+def test_snapshot_rows_are_private_copies(db, wallets):
+    with db.snapshot() as snapshot:
+        row = next(r for r in wallets.scan(snapshot=snapshot) if r["wallet_id"] == 1)
+        row["balance"] = 0.0
+    assert wallets.find("wallet_id", 1)["balance"] == 100.0
+
+
+def test_before_images_are_dropped_once_no_snapshot_needs_them(db, wallets):
+    snapshot = db.snapshot()
+    for balance in (90.0, 80.0, 70.0):
+        wallets.update("wallet_id", 1, {"balance": balance})
+    assert db.versions.stats()["retained_versions"] == 3
+
+    snapshot.close()
+    assert db.versions.stats()["open_snapshots"] == 0
+    assert db.versions.stats()["retained_versions"] == 0
+    with db.snapshot() as latest:
+        assert balances(wallets, latest) == [(1, 70.0), (2, 50.0)]
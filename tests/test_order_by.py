@@ -0,0 +1,60 @@
+import pytest
+
+from lipafast.parser.sql_parser import SQLParser
+
+
+@pytest.fixture
+def wallets(sql):
+    values = ", ".join(f"({i}, 'owner{i % 4}', {float(i % 5 * 10)}, 'active')" for i in range(1, 21))
+    sql(f"INSERT INTO wallets VALUES {values}")
+    sql("INSERT INTO wallets VALUES (21, 'nobody', NULL, 'active')")
+    return sql
+
+
+def test_order_by_limit_offset(wallets):
+    rows = wallets("SELECT wallet_id, balance FROM wallets ORDER BY balance DESC, wallet_id LIMIT 3 OFFSET 1")
+    assert rows == [{"wallet_id": 9, "balance": 40.0}, {"wallet_id": 14, "balance": 40.0}, {"wallet_id": 19, "balance": 40.0}]
+
+
+def test_nulls_sort_first_ascending_and_last_descending(wallets):
+    assert wallets("SELECT wallet_id FROM wallets ORDER BY balance LIMIT 1") == [{"wallet_id": 21}]
+    assert wallets("SELECT wallet_id FROM wallets ORDER BY balance DESC, wallet_id DESC")[-1] == {"wallet_id": 21}
+
+
+def test_a_sorted_index_gives_the_same_order(wallets, db):
+    query = "SELECT wallet_id FROM wallets ORDER BY balance DESC, wallet_id LIMIT 7"
+    scanned = wallets(query)
+    db.t("wallets").create_index("balance", kind="sorted")
+
+    assert wallets(query) == scanned
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_keyset_pages_cover_every_row_once(wallets, repl, db, indexed):
+    if indexed:
+        db.t("wallets").create_index("balance", kind="sorted")
+    parsed = SQLParser.parse("SELECT wallet_id FROM wallets ORDER BY balance")
+
+    seen, cursor = [], None
+    while True:
+        page = repl.execute_page(parsed, page_size=4, cursor=cursor)
+        seen += [r["wallet_id"] for r in page["result"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        # rows added behind the cursor never shift later pages
+        db.t("wallets").insert({"owner": "late", "balance": -1.0, "status": "active"})
+
+    assert sorted(seen) == list(range(1, 22))
+    assert seen == [r["wallet_id"] for r in wallets("SELECT wallet_id FROM wallets WHERE balance >= 0 OR balance IS NULL "
+                                                     "ORDER BY balance, wallet_id")]
+
+
+def test_pagination_errors(wallets, repl):
+    parsed = SQLParser.parse("SELECT * FROM wallets ORDER BY balance")
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        repl.execute_page(parsed, cursor="not a cursor")
+    with pytest.raises(ValueError, match="page_size"):
+        repl.execute_page(parsed, page_size=0)
+    with pytest.raises(ValueError, match="LIMIT/OFFSET"):
+        repl.execute_page(SQLParser.parse("SELECT * FROM wallets LIMIT 5"))
@@ -0,0 +1,90 @@
+import pytest
+
+from lipafast.db.aggregate import group_rows
+from lipafast.db.predicate import Predicate
+from lipafast.parser.where import parse_where
+
+COLUMNS = {"transaction_id": int, "wallet_id": int, "amount": float, "timestamp": str}
+MONTHS = ["2026-01", "2026-02", "2026-03", "2026-04"]
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def ledger(db, request):
+    db.create_table("ledger", COLUMNS, "transaction_id", storage=request.param)
+    table = db.t("ledger")
+    table.create_index("wallet_id")
+    table.create_aggregate("total", "SUM", "amount")
+    table.partition_by("timestamp", "month", keep=2)
+    table.insert_many([{"wallet_id": i % 3, "amount": float(i), "timestamp": f"{MONTHS[i % 4]}-1{i % 9} 10:00:00"}
+                       for i in range(40)])
+    return table
+
+
+def ids(rows):
+    return sorted(r["transaction_id"] for r in rows)
+
+
+def where(text):
+    return Predicate(parse_where(text), COLUMNS)
+
+
+def test_seal_moves_old_months_out_of_memory(ledger):
+    before = ids(ledger.scan())
+
+    assert ledger.seal_cold() == ["2026-01", "2026-02"]
+    assert sorted(ledger.partitions.sealed) == ["2026-01", "2026-02"]
+    assert len(ledger.rows) == 20
+    assert ids(ledger.scan()) == before
+    assert ids(ledger.scan(where("wallet_id = 1"))) == [i + 1 for i in range(40) if i % 3 == 1]
+    assert ledger.aggregates["total"].value == sum(range(40))
+    assert ledger.seal_cold() == []
+
+
+def test_scan_prunes_sealed_partitions_by_range(ledger):
+    ledger.seal_cold()
+    loaded = []
+    original = ledger.partitions.load
+    ledger.partitions.load = lambda key: loaded.append(key) or original(key)
+
+    rows = list(ledger.scan(where("timestamp >= '2026-02-01'")))
+    assert loaded == ["2026-02"]
+    assert ids(rows) == [i + 1 for i in range(40) if i % 4]
+
+
+def test_sealed_partitions_are_read_only(ledger):
+    ledger.seal_cold()
+    with pytest.raises(ValueError, match="sealed and read-only"):
+        ledger.insert({"wallet_id": 1, "amount": 1.0, "timestamp": "2026-01-05 09:00:00"})
+    ledger.insert({"wallet_id": 1, "amount": 1.0, "timestamp": "2026-04-05 09:00:00"})
+
+
+@pytest.mark.parametrize("text", [None, "amount >= 0", "wallet_id = 2"])
+def test_a_seal_during_a_scan_neither_skips_nor_repeats_rows(ledger, text):
+    predicate = where(text) if text else None
+    expected = ids(ledger.scan(predicate))
+
+    scan = ledger.scan(predicate)
+    first = next(scan)
+    ledger.seal_cold()
+    assert ids([first, *scan]) == expected
+
+
+def test_a_seal_during_grouping_counts_each_row_once(ledger):
+    items = [{"func": None, "column": "wallet_id", "alias": "wallet_id"},
+             {"func": "COUNT", "column": None, "alias": "n"}]
+    groups = group_rows(ledger, items, ["wallet_id"])
+    first = next(groups)
+    ledger.seal_cold()
+    assert sum(g["n"] for g in [first, *groups]) == 40
+    assert sum(g["n"] for g in group_rows(ledger, items, ["wallet_id"])) == 40
+
+
+def test_seals_replay_after_a_crash(db, ledger, reopen):
+    ledger.seal_cold()
+    expected = ids(ledger.scan())
+
+    recovered = reopen(db).t("ledger")
+    assert sorted(recovered.partitions.sealed) == ["2026-01", "2026-02"]
+    assert len(recovered.rows) == 20
+    assert ids(recovered.scan()) == expected
+    assert recovered.aggregates["total"].value == sum(range(40))
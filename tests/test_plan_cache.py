@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from lipafast.parser.plan_cache import PlanCache, normalize
+from lipafast.parser.sql_parser import SQLParser
+
+
+def test_normalize_collapses_whitespace_outside_strings_and_numbers_placeholders():
+    assert normalize("SELECT *\n  FROM wallets   WHERE owner = 'a  b' AND wallet_id = ? ;") == (
+        "SELECT * FROM wallets WHERE owner = 'a  b' AND wallet_id = :0"
+    )
+    assert normalize("UPDATE t SET a = ? WHERE b = ? AND c = '?'") == "UPDATE t SET a = :0 WHERE b = :1 AND c = '?'"
+
+
+def test_equivalent_statements_share_one_plan():
+    first = SQLParser.parse("SELECT * FROM wallets WHERE wallet_id = 7")
+    assert SQLParser.parse("SELECT  *\n FROM wallets  WHERE wallet_id = 7;") is first
+
+
+def test_plan_cache_evicts_least_recently_used():
+    cache = PlanCache(capacity=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.info() == {"size": 2, "capacity": 2, "hits": 3, "misses": 1}
+
+
+def test_prepared_statements_bind_parameters(sql, repl):
+    sql("INSERT INTO wallets VALUES (1, 'Alex', 100.0, 'active'), (2, 'O''Brien', 50.0, 'active')")
+    lookup = repl.prepare("SELECT owner FROM wallets WHERE wallet_id = ?")
+
+    assert lookup.execute([1]) == [{"owner": "Alex"}]
+    assert lookup.execute([2]) == [{"owner": "O'Brien"}]
+    # a bound value is data, never SQL
+    assert sql("SELECT * FROM wallets WHERE owner = ?", ["x' OR '1' = '1"]) == []
+    with pytest.raises(ValueError, match="Missing value"):
+        lookup.execute([])
+    with pytest.raises(TypeError):
+        lookup.execute(["1"])
+
+
+def test_prepare_execute_deallocate(sql):
+    sql("INSERT INTO wallets VALUES (1, 'Alex', 100.0, 'active')")
+    sql("PREPARE debit AS UPDATE wallets SET balance = ? WHERE wallet_id = ?")
+
+    assert sql("EXECUTE debit (80.0, 1)") == {"rows_affected": 1}
+    assert sql("SELECT balance FROM wallets WHERE wallet_id = 1") == [{"balance": 80.0}]
+    sql("DEALLOCATE debit")
+    with pytest.raises(ValueError, match="Unknown prepared statement"):
+        sql("EXECUTE debit (70.0, 1)")
+    with pytest.raises(ValueError, match="Cannot prepare"):
+        sql("PREPARE b AS BEGIN")
+
+
+def test_compiled_predicates_stay_off_the_shared_plan(sql, repl):
+    sql("INSERT INTO wallets VALUES (1, 'Alex', 100.0, 'active'), (2, 'Mary', 50.0, 'active')")
+    plan = SQLParser.parse("SELECT COUNT(*) AS n FROM wallets WHERE balance > 60 GROUP BY status HAVING COUNT(*) > 0")
+    snapshot = dict(plan)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(repl.execute(plan))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [[{"n": 1}]] * 8
+    assert plan == snapshot  # nothing written into the cached plan
+    assert repl.compile_where(plan, repl.db.t("wallets")) is repl.compile_where(plan, repl.db.t("wallets"))
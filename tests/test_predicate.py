@@ -0,0 +1,97 @@
+import pytest
+
+from lipafast.db.predicate import Predicate
+from lipafast.parser.where import parse_where
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def ledger(db, request):
+    db.create_table("ledger", {"transaction_id": int, "wallet_id": int, "direction": str}, "transaction_id", storage=request.param)
+    table = db.t("ledger")
+    table.insert_many([
+        {"transaction_id": 1, "wallet_id": 1, "direction": "debit"},
+        {"transaction_id": 2, "wallet_id": 2, "direction": "credit"},
+        {"transaction_id": 3, "wallet_id": None, "direction": None},
+        {"transaction_id": 4, "wallet_id": 3, "direction": "debit"},
+    ])
+    return table
+
+
+def matching(table, where):
+    return sorted(r["transaction_id"] for r in table.scan(Predicate(parse_where(where), table.columns)))
+
+
+@pytest.mark.parametrize("where, expected", [
+    ("NOT (wallet_id = 1)", [2, 4]),
+    ("NOT (wallet_id > 1)", [1]),
+    ("NOT (wallet_id = 1 OR direction = 'credit')", [4]),
+    ("NOT (wallet_id = 1 AND direction = 'debit')", [2, 4]),
+    ("NOT NOT (wallet_id = 1)", [1]),
+    ("NOT (wallet_id IS NULL)", [1, 2, 4]),
+    ("NOT (wallet_id BETWEEN 1 AND 2)", [4]),
+    ("NOT (direction LIKE 'de%')", [2]),
+])
+def test_not_skips_rows_where_the_operand_is_null(ledger, where, expected):
+    assert matching(ledger, where) == expected
+
+
+@pytest.mark.parametrize("where, expected", [
+    ("wallet_id NOT IN (1, 2)", [4]),
+    ("wallet_id NOT IN (1, NULL)", []),
+    ("NOT (wallet_id IN (1, NULL))", []),
+    ("wallet_id IN (1, NULL)", [1]),
+    ("direction NOT IN ('credit', NULL)", []),
+])
+def test_not_in_is_never_true_for_null(ledger, where, expected):
+    assert matching(ledger, where) == expected
+
+
+@pytest.mark.parametrize("where, expected", [
+    ("wallet_id = 1.9", []),
+    ("wallet_id = 1.0", [1]),
+    ("wallet_id >= 1.5", [2, 4]),
+    ("wallet_id < 2.5", [1, 2]),
+    ("wallet_id IN (1.5, 3)", [4]),
+    ("wallet_id BETWEEN 1.1 AND 2.9", [2]),
+])
+def test_numbers_are_compared_as_written_never_truncated(ledger, where, expected):
+    assert matching(ledger, where) == expected
+
+
+def test_ints_widen_to_float_columns(db):
+    db.create_table("wallets", {"wallet_id": int, "balance": float}, "wallet_id")
+    wallets = db.t("wallets")
+    wallets.insert_many([{"wallet_id": 1, "balance": 100.0}, {"wallet_id": 2, "balance": 99.5}])
+
+    predicate = Predicate(parse_where("balance = 100"), wallets.columns)
+    assert predicate.node[3] == ("lit", 100.0) and type(predicate.node[3][1]) is float
+    assert [w["wallet_id"] for w in wallets.scan(predicate)] == [1]
+
+
+@pytest.mark.parametrize("where", ["wallet_id = 'one'", "direction = 3"])
+def test_literals_of_another_kind_are_rejected(ledger, where):
+    with pytest.raises(TypeError, match="expects type"):
+        Predicate(parse_where(where), ledger.columns)
+
+
+@pytest.mark.parametrize("where", ["nope = 1", "wallet_id = 1 AND nope IS NULL", "NOT (ledger.nope IN (1, 2))"])
+def test_unknown_columns_are_rejected(ledger, where):
+    with pytest.raises(ValueError, match="Unknown column"):
+        Predicate(parse_where(where), ledger.columns)
+
+
+def test_parameters_must_match_the_column_type(ledger):
+    predicate = Predicate(parse_where("wallet_id = :w AND direction = :d"), ledger.columns, {"w": 1, "d": "debit"})
+    assert sorted(r["transaction_id"] for r in ledger.scan(predicate)) == [1]
+    with pytest.raises(TypeError):
+        Predicate(parse_where("wallet_id = :w"), ledger.columns, {"w": "1"})
+
+
+def test_update_and_delete_never_match_a_truncated_key(sql):
+    sql("INSERT INTO wallets VALUES (1, 'Alex', 100.0, 'active'), (2, 'Mary', 50.0, 'active')")
+
+    assert sql("DELETE FROM wallets WHERE wallet_id = 1.9")["rows_affected"] == 0
+    assert sql("UPDATE wallets SET status = 'frozen' WHERE wallet_id >= 1.5")["rows_affected"] == 1
+    assert [w["wallet_id"] for w in sql("SELECT * FROM wallets WHERE status = 'active'")] == [1]
+    with pytest.raises(ValueError, match="Unknown column 'nope'"):
+        sql("DELETE FROM wallets WHERE nope = 1")
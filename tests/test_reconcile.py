@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from lipafast.db.store import create_schema
+from lipafast.fintech import ledger
+from lipafast.fintech.duplicates import DuplicateDetector
+from lipafast.fintech.reconcile import reconcile
+
+
+@pytest.fixture
+def wallets(db, monkeypatch):
+    create_schema(db)
+    monkeypatch.setattr(ledger, "detector", DuplicateDetector(mode="off"))
+    for wallet_id in (1, 2, 3):
+        ledger.open_wallet(db, wallet_id, f"owner{wallet_id}", 100.0)
+    return db.t("wallets")
+
+
+def test_a_consistent_ledger_has_no_drift(db, wallets):
+    ledger.pay(db, 1, 30)
+    ledger.edit_wallet(db, 2, topup=5)
+
+    run = reconcile(db)
+    assert run["drifted_wallets"] == []
+    assert (run["since_id"], run["through_id"], run["rows_processed"], run["wallets_checked"]) == (0, 5, 5, 3)
+    assert db.t("ledger_checkpoints").find("wallet_id", 1)["total"] == 70.0
+
+
+def test_each_run_reads_only_newer_rows(db, wallets):
+    reconcile(db)
+    ledger.pay(db, 3, 10)
+
+    run = reconcile(db)
+    assert (run["since_id"], run["through_id"], run["rows_processed"]) == (3, 4, 1)
+    assert run["drifted_wallets"] == []
+    assert reconcile(db)["rows_processed"] == 0
+
+
+def test_a_balance_changed_without_a_ledger_row_drifts(db, wallets, sql):
+    reconcile(db)
+    sql("UPDATE wallets SET balance = 150 WHERE wallet_id = 2")
+    ledger.pay(db, 1, 10)
+
+    # only wallets with new ledger rows are checked...
+    assert reconcile(db, all_wallets=False)["drifted_wallets"] == []
+    # ...or all of them
+    assert reconcile(db)["drifted_wallets"] == [
+        {"wallet_id": 2, "balance": 150.0, "ledger_total": 100.0, "drift": 50.0}]
+
+
+def test_a_run_stops_below_an_uncommitted_ledger_row(db, wallets):
+    inserted, finish = threading.Event(), threading.Event()
+
+    def slow_topup():
+        with db.transaction():
+            wallets.update("wallet_id", 1, {"balance": 120.0})
+            db.t("ledger").insert(ledger._credit_row(1, "owner1", 20.0))
+            inserted.set()
+            finish.wait(5)
+
+    writer = threading.Thread(target=slow_topup)
+    writer.start()
+    try:
+        assert inserted.wait(5)
+        ledger.pay(db, 2, 10)  # committed, with a higher transaction_id
+
+        run = reconcile(db)
+        assert run["through_id"] == 3 and run["drifted_wallets"] == []
+    finally:
+        finish.set()
+        writer.join()
+
+    run = reconcile(db)
+    assert (run["since_id"], run["through_id"], run["rows_processed"]) == (3, 5, 2)
+    assert run["drifted_wallets"] == []
+    assert db.t("ledger_checkpoints").find("wallet_id", 1)["total"] == 120.0
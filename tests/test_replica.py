@@ -0,0 +1,94 @@
+import socket
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+from lipafast.db.bulk import copy_from
+from lipafast.db.replica import Replica, serve_replicas
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def contents(database):
+    return sorted((dict(r) for r in database.t("wallets").scan()), key=lambda r: r["wallet_id"])
+
+
+@pytest.fixture
+def primary(db, monkeypatch):
+    monkeypatch.setenv("DB_REPLICATION_KEY", "test-key")
+    db.create_table("wallets", {"wallet_id": int, "balance": float, "status": str}, "wallet_id")
+    db.t("wallets").create_aggregate("total_balance", "SUM", "balance")
+    db.t("wallets").insert_many([{"balance": 100.0, "status": "active"}, {"balance": 50.0, "status": "active"}])
+    server = serve_replicas(db, free_port())
+    yield db
+    server.stop()
+
+
+@pytest.fixture
+def replica(primary, tmp_path):
+    follower = Replica(primary.replication.address, tmp_path / "replica" / "db.json", reconnect=0.05)
+    assert follower.wait_ready(timeout=10)
+    yield follower
+    follower.close()
+
+
+def test_a_new_follower_starts_from_an_export(primary, replica):
+    assert contents(replica) == contents(primary)
+    assert replica.t("wallets").aggregates["total_balance"].value == 150.0
+
+
+def test_writes_are_shipped_in_order(primary, replica, tmp_path):
+    wallets = primary.t("wallets")
+    wallets.update("wallet_id", 1, {"balance": 90.0})
+    wallets.delete("wallet_id", 2)
+    with primary.transaction():
+        wallets.insert({"balance": 5.0, "status": "active"})
+        wallets.update("wallet_id", 3, {"status": "frozen"})
+    source = tmp_path / "wallets.ndjson"
+    source.write_text('{"balance": 1.0, "status": "active"}\n{"balance": 2.0, "status": "active"}\n')
+    copy_from(wallets, source)
+
+    assert replica.wait_for(primary.wal.lsn, timeout=10)
+    assert contents(replica) == contents(primary)
+    assert replica.t("wallets").aggregates["total_balance"].value == 98.0
+    assert replica.lag()["records_behind"] == 0
+
+
+def test_followers_reject_writes(replica):
+    with pytest.raises(ValueError, match="read-only replica"):
+        replica.t("wallets").insert({"balance": 1.0, "status": "active"})
+    with pytest.raises(ValueError, match="read-only replica"):
+        replica.create_table("other", {"id": int}, "id")
+
+
+def test_wait_for_times_out_on_an_lsn_not_yet_written(primary, replica):
+    assert not replica.wait_for(primary.wal.lsn + 1, timeout=0.1)
+
+
+def test_the_primary_lists_its_followers(primary, replica):
+    primary.t("wallets").update("wallet_id", 1, {"balance": 1.0})
+    assert replica.wait_for(primary.wal.lsn, timeout=10)
+    status = primary.replication.status()
+    assert status["role"] == "primary" and len(status["followers"]) == 1
+
+
+def test_connections_need_the_key(primary, monkeypatch, tmp_path):
+    with pytest.raises(AuthenticationError):
+        Client(primary.replication.address, authkey=b"lipafast")
+    # a refused client does not stop the primary from accepting followers
+    follower = Replica(primary.replication.address, tmp_path / "replica" / "db.json", reconnect=0.05)
+    try:
+        assert follower.wait_ready(timeout=10)
+    finally:
+        follower.close()
+
+    monkeypatch.delenv("DB_REPLICATION_KEY")
+    with pytest.raises(RuntimeError, match="DB_REPLICATION_KEY"):
+        Replica(primary.replication.address, tmp_path / "replica" / "db.json")
+    with pytest.raises(RuntimeError, match="DB_REPLICATION_KEY"):
+        serve_replicas(primary, free_port())
@@ -0,0 +1,195 @@
+import pytest
+
+from lipafast.db import shard
+from lipafast.db.database import Database
+from lipafast.db.shard import ShardCluster, ShardRouter, _pinned, _plain, shard_for
+from lipafast.db.store import create_schema
+from lipafast.parser.sql_parser import SQLParser
+from lipafast.parser.where import parse_where
+
+SHARDS = 3
+
+
+class Owner:
+    """One shard served in this process: its own Database, run through repl like serve() does."""
+
+    def __init__(self, db, repl, monkeypatch):
+        self.db = db
+        self.operations = {
+            "execute": repl.execute,
+            "page": repl.execute_page,
+            "schema": lambda name: db.t(name).schema(),
+        }
+        self.repl = repl
+        self.monkeypatch = monkeypatch
+        self.requests = []
+
+    def run(self, op, args):
+        self.requests.append(op)
+        self.monkeypatch.setattr(self.repl, "db", self.db)
+        try:
+            return ("ok", _plain(self.operations[op](*args)))
+        except Exception as e:
+            return ("error", type(e).__name__, str(e))
+
+
+class Connection:
+    """Stands in for a multiprocessing Connection: replies are computed when read, in send order."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.sent = []
+        self.closed = False
+        self.fail_recv = False
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def recv(self):
+        if self.fail_recv:
+            raise EOFError
+        return self.owner.run(*self.sent.pop(0))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def owners(tmp_path, repl, monkeypatch):
+    monkeypatch.setattr(repl, "router", None)
+    databases = [Database(tmp_path / str(i) / "db.json", shard=(i, SHARDS)) for i in range(SHARDS)]
+    for db in databases:
+        create_schema(db)
+    yield [Owner(db, repl, monkeypatch) for db in databases]
+    for db in databases:
+        db.close()
+
+
+@pytest.fixture
+def router(owners, monkeypatch):
+    router = ShardRouter(SHARDS)
+    refused = set()
+
+    def connect(index):
+        conns = getattr(router._local, "conns", None)
+        if conns is None:
+            conns = router._local.conns = {}
+        if index in refused:
+            raise ConnectionRefusedError(f"shard {index} is down")
+        return conns.setdefault(index, Connection(owners[index]))
+
+    monkeypatch.setattr(router, "_conn", connect)
+    router.refused = refused
+    router.run = lambda text, params=None: router.execute(SQLParser.parse(text), params)
+    return router
+
+
+@pytest.fixture
+def wallets(router):
+    values = ", ".join(f"({i}, 'owner{i}', {float(i % 7)}, '{'active' if i % 4 else 'inactive'}')" for i in range(1, 31))
+    router.run(f"INSERT INTO wallets VALUES {values}")
+    return router
+
+
+def test_shard_for():
+    assert [shard_for(v, 4) for v in (0, 5, 11)] == [0, 1, 3]
+    assert shard_for("abc", 4) == shard_for("abc", 4)
+
+
+def test_pinned_values():
+    assert _pinned(parse_where("wallet_id = 3 AND balance > 1"), None) == [3]
+    assert _pinned(parse_where("wallet_id IN (1, :w)"), {"w": 5}) == [1, 5]
+    assert _pinned(parse_where("wallet_id = 3 OR balance > 1"), None) is None
+    assert _pinned(parse_where("wallet_id NOT IN (1)"), None) is None
+
+
+def test_rows_live_on_the_shard_owning_their_wallet(wallets, owners):
+    for index, owner in enumerate(owners):
+        ids = [w["wallet_id"] for w in owner.db.t("wallets").scan()]
+        assert ids and all(shard_for(i, SHARDS) == index for i in ids)
+
+
+def test_scattered_queries_are_merged(wallets, owners):
+    assert wallets.run("SELECT wallet_id FROM wallets ORDER BY balance DESC, wallet_id LIMIT 4 OFFSET 2") == [
+        {"wallet_id": 20}, {"wallet_id": 27}, {"wallet_id": 5}, {"wallet_id": 12}]
+    assert wallets.run("SELECT status, COUNT(*) AS n, AVG(balance) AS avg FROM wallets GROUP BY status ORDER BY status") == [
+        {"status": "active", "n": 23, "avg": pytest.approx(sum(i % 7 for i in range(1, 31) if i % 4) / 23)},
+        {"status": "inactive", "n": 7, "avg": pytest.approx(sum(i % 7 for i in range(4, 31, 4)) / 7)}]
+    assert wallets.run("UPDATE wallets SET status = 'inactive' WHERE balance = 0") == {"rows_affected": 4}
+
+
+def test_keyset_pages_merge_across_shards(wallets):
+    parsed = SQLParser.parse("SELECT wallet_id FROM wallets ORDER BY balance")
+    seen, cursor = [], None
+    while True:
+        page = wallets.execute_page(parsed, page_size=7, cursor=cursor)
+        seen += [r["wallet_id"] for r in page["result"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(range(1, 31), key=lambda i: (i % 7, i))
+
+
+@pytest.mark.parametrize("value", [4, "4", 4.0])
+def test_pinned_statements_reach_only_the_owner(wallets, owners, value):
+    for owner in owners:
+        owner.requests.clear()
+    if type(value) is int:
+        assert wallets.run("SELECT owner FROM wallets WHERE wallet_id = :w", {"w": value}) == [{"owner": "owner4"}]
+    else:
+        # routed as the INT 4 would be; the owner rejects the parameter's type
+        with pytest.raises(TypeError, match="expects type int"):
+            wallets.run("SELECT owner FROM wallets WHERE wallet_id = :w", {"w": value})
+    assert [len(owner.requests) for owner in owners] == [1 if i == shard_for(4, SHARDS) else 0 for i in range(SHARDS)]
+
+
+def test_a_refused_shard_leaves_the_others_in_step(wallets):
+    wallets.refused.add(2)
+    with pytest.raises(ConnectionRefusedError):
+        wallets.run("SELECT * FROM wallets")
+    conns = wallets._local.conns
+    assert all(not conn.sent for conn in conns.values())  # replies of shards 0 and 1 were read
+
+    wallets.refused.clear()
+    assert len(wallets.run("SELECT * FROM wallets")) == 30
+
+
+def test_a_lost_connection_is_dropped_and_the_others_read(wallets):
+    broken = wallets._local.conns[1]
+    broken.fail_recv = True
+    with pytest.raises(ConnectionError):
+        wallets.run("SELECT * FROM wallets")
+    assert broken.closed and 1 not in wallets._local.conns
+    assert all(not conn.sent for conn in wallets._local.conns.values())
+    assert len(wallets.run("SELECT * FROM wallets")) == 30
+
+
+def test_shard_errors_are_raised_here(wallets):
+    with pytest.raises(ValueError, match="Primary key"):
+        wallets.run("INSERT INTO wallets VALUES (1, 'again', 0.0, 'active'), (2, 'again', 0.0, 'active')")
+    with pytest.raises(ValueError, match="cannot be updated"):
+        wallets.run("UPDATE wallets SET wallet_id = 99 WHERE wallet_id = 1")
+    assert len(wallets.run("SELECT * FROM wallets")) == 30
+
+
+def test_there_is_no_default_key(monkeypatch):
+    monkeypatch.delenv("DB_SHARD_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="DB_SHARD_KEY"):
+        shard._authkey()
+
+
+def test_an_in_process_cluster_generates_its_key(monkeypatch):
+    monkeypatch.delenv("DB_SHARD_KEY", raising=False)
+    started = []
+
+    class Process:
+        def __init__(self, target, args, name):
+            self.args = args
+
+        def start(self):
+            started.append(self.args[0])
+
+    monkeypatch.setattr(shard, "get_context", lambda method: type("Context", (), {"Process": Process}))
+    ShardCluster(2).start()
+    assert started == [0, 1]
+    assert len(shard._authkey()) == 64
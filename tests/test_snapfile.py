@@ -0,0 +1,113 @@
+import pytest
+
+from lipafast.db.database import Database
+from lipafast.db.snapfile import convert, is_snapshot
+from lipafast.db.store import create_schema
+
+
+def contents(table):
+    return sorted((dict(r) for r in table.scan()), key=lambda r: r["id"])
+
+
+@pytest.fixture
+def filled(db):
+    columns = {"id": int, "amount": float, "kind": str, "note": str}
+    for name, storage in (("plain", "rows"), ("packed", "columnar")):
+        db.create_table(name, columns, "id", storage=storage)
+        table = db.t(name)
+        table.create_index("kind")
+        table.create_aggregate("total", "SUM", "amount")
+        table.insert_many([{"amount": None if i == 3 else i * 1.5, "kind": ("a", "b", None)[i % 3],
+                            "note": "x" * i} for i in range(8)])
+        table.delete("id", 5)
+    return db
+
+
+def test_round_trip_loads_each_table_on_first_use(filled, path):
+    expected = {name: contents(filled.t(name)) for name in ("plain", "packed")}
+    filled.save()
+    filled.close()
+
+    reopened = Database(path)
+    try:
+        assert is_snapshot(path.with_suffix(".snap"))
+        assert reopened.tables.entries() == {"plain": None, "packed": None}
+
+        packed = reopened.t("packed")
+        assert reopened.tables.entries()["plain"] is None
+        assert contents(packed) == expected["packed"]
+        assert contents(reopened.t("plain")) == expected["plain"]
+        for name in expected:
+            table = reopened.t(name)
+            assert sorted(r["id"] for r in table.indexes["kind"].buckets["a"].values()) == [1, 4, 7]
+            assert table.aggregates["total"].value == sum(r["amount"] or 0 for r in expected[name])
+            table.insert({"amount": 1.0, "kind": "a", "note": ""})
+            assert table.find("id", 9)["kind"] == "a"  # ids carry on after the snapshot
+    finally:
+        reopened.close()
+
+
+def test_schema_of_an_unloaded_table_comes_from_the_header(filled, path):
+    expected = filled.schema("packed")
+    filled.save()
+    filled.close()
+
+    reopened = Database(path)
+    try:
+        assert reopened.schema("packed") == expected
+        assert reopened.tables.entries()["packed"] is None
+    finally:
+        reopened.close()
+
+
+def test_create_schema_leaves_existing_tables_unloaded(db, path):
+    create_schema(db)
+    db.t("wallets").insert({"wallet_id": 1, "owner": "alice", "balance": 10.0, "status": "active"})
+    db.save()
+    db.close()
+
+    reopened = Database(path)
+    try:
+        create_schema(reopened)
+        assert reopened.tables.entries()["wallets"] is None
+        assert reopened.tables.entries()["ledger"] is None
+        assert reopened.t("wallets").aggregates["total_balance"].value == 10.0
+        assert sorted(reopened.t("ledger").indexes) == ["timestamp", "transaction_id", "wallet_id"]
+    finally:
+        reopened.close()
+
+
+def test_create_schema_adds_what_an_older_schema_lacks(db, path):
+    create_schema(db)
+    db.save()
+    db.close()
+    # a snapshot written before the ledger had its reconciliation index
+    reopened = Database(path)
+    ledger = reopened.t("ledger")
+    del ledger.indexes["transaction_id"]
+    reopened.save()
+    reopened.close()
+
+    reopened = Database(path)
+    try:
+        create_schema(reopened)
+        assert "transaction_id" in reopened.t("ledger").indexes
+        assert reopened.tables.entries()["wallets"] is None
+    finally:
+        reopened.close()
+
+
+def test_convert_a_json_snapshot(filled, tmp_path):
+    json_db = Database(tmp_path / "old.json", snapshot_format="json")
+    json_db.create_table("packed", {"id": int, "amount": float}, "id", storage="columnar")
+    json_db.t("packed").insert_many([{"amount": 1.0}, {"amount": None}])
+    json_db.save()
+    json_db.close()
+
+    target = convert(tmp_path / "old.json", tmp_path / "new.snap")
+    assert is_snapshot(target)
+    converted = Database(tmp_path / "new.json")
+    try:
+        assert contents(converted.t("packed")) == [{"id": 1, "amount": 1.0}, {"id": 2, "amount": None}]
+    finally:
+        converted.close()
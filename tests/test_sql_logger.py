@@ -0,0 +1,75 @@
+import gzip
+
+import pytest
+
+from lipafast.db.sql_logger import SQLLogger
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / "sql.log"
+
+
+def lines(path):
+    return path.read_text().splitlines()
+
+
+def test_lines_are_appended_and_flushed(log_path):
+    logger = SQLLogger(log_path, flush_interval=60)
+    logger.log("SELECT * FROM wallets")
+    logger.log("DELETE FROM wallets WHERE wallet_id = 1", source="HTTP")
+    logger.flush()
+
+    first, second = lines(log_path)
+    assert first.endswith("[REPL] SELECT * FROM wallets")
+    assert second.endswith("[HTTP] DELETE FROM wallets WHERE wallet_id = 1")
+    logger.close()
+
+
+def test_threaded_logger_writes_everything_by_close(log_path):
+    logger = SQLLogger(log_path, threaded=True, flush_interval=60)
+    for i in range(100):
+        logger.log(f"SELECT {i}")
+    logger.close()
+
+    assert [line.rsplit(" ", 1)[1] for line in lines(log_path)] == [str(i) for i in range(100)]
+
+
+def test_rotation_keeps_at_most_backups_segments(log_path):
+    logger = SQLLogger(log_path, max_bytes=200, backups=2)
+    for i in range(40):
+        logger.log(f"SELECT {i}")
+    logger.close()
+
+    rolled = sorted(p.name for p in log_path.parent.iterdir())
+    assert rolled == ["sql.log", "sql.log.1", "sql.log.2"]
+    # newest statements stay in the live file, older ones in .1, oldest in .2
+    assert lines(log_path)[-1].endswith("SELECT 39")
+    assert int(lines(log_path.with_name("sql.log.2"))[-1].rsplit(" ", 1)[1]) < int(
+        lines(log_path.with_name("sql.log.1"))[0].rsplit(" ", 1)[1]
+    )
+
+
+def test_no_backups_starts_the_log_over(log_path):
+    logger = SQLLogger(log_path, max_bytes=200, backups=0)
+    for i in range(40):
+        logger.log(f"SELECT {i}")
+    logger.close()
+
+    assert [p.name for p in log_path.parent.iterdir()] == ["sql.log"]
+    assert lines(log_path)[-1].endswith("SELECT 39")
+
+
+def test_negative_backups_are_rejected(log_path):
+    with pytest.raises(ValueError, match="backups"):
+        SQLLogger(log_path, backups=-1)
+
+
+def test_compressed_segments(log_path):
+    logger = SQLLogger(log_path, max_bytes=200, backups=1, compress=True)
+    for i in range(10):
+        logger.log(f"SELECT {i}")
+    logger.close()
+
+    segment = log_path.with_name("sql.log.1.gz")
+    assert gzip.decompress(segment.read_bytes()).decode().startswith("[")
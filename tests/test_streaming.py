@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from lipafast.parser.sql_parser import SQLParser
+
+
+@pytest.fixture
+def wallets(sql):
+    values = ", ".join(f"({i}, 'owner{i}', {i * 10.0}, 'active')" for i in range(1, 11))
+    sql(f"INSERT INTO wallets VALUES {values}")
+    return sql
+
+
+def stream(repl, text, params=None):
+    return repl.execute_stream(SQLParser.parse(text), params)
+
+
+def test_stream_reads_one_snapshot(wallets, repl, db):
+    rows = stream(repl, "SELECT wallet_id, balance FROM wallets ORDER BY wallet_id")
+    assert next(rows) == {"wallet_id": 1, "balance": 10.0}
+
+    wallets("UPDATE wallets SET balance = 0 WHERE wallet_id = 5")
+
+    assert [r["balance"] for r in rows] == [i * 10.0 for i in range(2, 11)]
+    assert wallets("SELECT balance FROM wallets WHERE wallet_id = 5") == [{"balance": 0.0}]
+
+
+def test_snapshot_released_when_exhausted_or_closed(wallets, repl, db):
+    open_snapshots = lambda: db.versions.stats()["open_snapshots"]
+
+    rows = stream(repl, "SELECT * FROM wallets")
+    next(rows)
+    assert open_snapshots() == 1
+    list(rows)
+    assert open_snapshots() == 0
+
+    rows = stream(repl, "SELECT * FROM wallets")
+    next(rows)
+    rows.close()
+    assert open_snapshots() == 0
+
+
+def test_planning_errors_release_the_snapshot(wallets, repl, db):
+    with pytest.raises(ValueError):
+        stream(repl, "SELECT * FROM wallets WHERE nope = 1")
+    assert db.versions.stats()["open_snapshots"] == 0
+
+
+def test_non_select_statements_stream_their_result(wallets, repl):
+    assert list(stream(repl, "PREPARE by_id AS SELECT owner FROM wallets WHERE wallet_id = ?")) == [
+        {"message": "Statement 'by_id' prepared"}]
+    assert list(stream(repl, "EXECUTE by_id (3)")) == [{"owner": "owner3"}]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "json"])
+def test_stream_rows_formats(fmt, monkeypatch):
+    streaming = pytest.importorskip("lipafast.web.streaming")
+    monkeypatch.setattr(streaming, "CHUNK_ROWS", 3)
+    rows = [{"n": i} for i in range(7)]
+
+    body = "".join(streaming._ndjson(iter(rows)) if fmt == "ndjson" else streaming._json_array(iter(rows)))
+
+    if fmt == "ndjson":
+        assert [json.loads(line) for line in body.splitlines()] == rows
+    else:
+        assert json.loads(body) == {"result": rows}
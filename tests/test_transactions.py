@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+
+@pytest.fixture(params=["rows", "columnar"])
+def wallets(db, request):
+    db.create_table("wallets", {"wallet_id": int, "balance": float, "status": str}, "wallet_id", storage=request.param)
+    table = db.t("wallets")
+    table.create_index("status")
+    table.create_aggregate("total_balance", "SUM", "balance")
+    table.create_aggregate("active_wallets", "COUNT", where={"status": "active"})
+    table.insert_many([
+        {"wallet_id": 1, "balance": 100.0, "status": "active"},
+        {"wallet_id": 2, "balance": 50.0, "status": "active"},
+    ])
+    return table
+
+
+def test_rollback_restores_rows_indexes_and_aggregates(db, wallets):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            wallets.update("wallet_id", 1, {"balance": 10.0, "status": "frozen"})
+            wallets.delete("wallet_id", 2)
+            wallets.insert({"wallet_id": 3, "balance": 5.0, "status": "frozen"})
+            raise RuntimeError("abort")
+
+    assert sorted(w["wallet_id"] for w in wallets.scan()) == [1, 2]
+    assert wallets.find("wallet_id", 1)["balance"] == 100.0
+    assert wallets.find("wallet_id", 3) is None
+    assert wallets.find("status", "frozen") is None
+    assert sorted(w["wallet_id"] for w in wallets.indexes["status"].buckets["active"].values()) == [1, 2]
+    assert wallets.aggregates["total_balance"].value == 150.0
+    assert wallets.aggregates["active_wallets"].value == 2
+
+
+def test_commit_is_one_wal_record_and_survives_a_crash(db, wallets, reopen, path):
+    log = path.with_suffix(".wal")
+    before = len(log.read_text().splitlines())
+    with db.transaction():
+        wallets.update("wallet_id", 1, {"balance": 90.0})
+        wallets.update("wallet_id", 2, {"balance": 60.0})
+    lines = log.read_text().splitlines()
+    assert len(lines) == before + 1 and json.loads(lines[-1])["op"] == "txn"
+
+    recovered = reopen(db)
+    assert sorted((w["wallet_id"], w["balance"]) for w in recovered.t("wallets").scan()) == [(1, 90.0), (2, 60.0)]
+    assert recovered.t("wallets").aggregates["total_balance"].value == 150.0
+
+
+def test_uncommitted_writes_are_not_replayed(db, wallets, reopen):
+    db.begin()
+    wallets.update("wallet_id", 1, {"balance": 0.0})
+    wallets.insert({"wallet_id": 3, "balance": 5.0, "status": "active"})
+
+    recovered = reopen(db)
+    assert sorted((w["wallet_id"], w["balance"]) for w in recovered.t("wallets").scan()) == [(1, 100.0), (2, 50.0)]
+
+
+def test_sql_begin_commit_rollback(sql):
+    sql("INSERT INTO wallets VALUES (1, 'alice', 100.0, 'active')")
+    sql("BEGIN")
+    sql("UPDATE wallets SET balance = 0 WHERE wallet_id = 1")
+    assert sql("SELECT balance FROM wallets") == [{"balance": 0.0}]  # a transaction reads its own writes
+    sql("ROLLBACK")
+    assert sql("SELECT balance FROM wallets") == [{"balance": 100.0}]
+
+    sql("BEGIN")
+    sql("UPDATE wallets SET balance = 40 WHERE wallet_id = 1")
+    sql("COMMIT")
+    assert sql("SELECT balance FROM wallets") == [{"balance": 40.0}]
+
+
+def test_transaction_state_errors(db, wallets):
+    with pytest.raises(ValueError, match="No transaction is open"):
+        db.commit()
+    with db.transaction():
+        with pytest.raises(ValueError, match="already open"):
+            db.begin()
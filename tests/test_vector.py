@@ -0,0 +1,80 @@
+import pytest
+
+from lipafast.db import columnar, vector
+from lipafast.db.aggregate import group_rows
+from lipafast.db.predicate import Predicate
+from lipafast.db.vector import BatchScan
+from lipafast.parser.where import parse_where
+
+COLUMNS = {"transaction_id": int, "wallet_id": int, "amount": float, "direction": str, "note": str}
+
+
+@pytest.fixture
+def tables(db, monkeypatch):
+    monkeypatch.setattr(vector, "BATCH_ROWS", 7)  # several batches, the last one partial
+    monkeypatch.setattr(columnar, "DICT_LIMIT", 8)  # `note` outgrows its dictionary: a plain list
+    rows = [{"wallet_id": None if i % 11 == 0 else i % 4, "amount": None if i % 13 == 0 else i * 0.5,
+             "direction": ("debit", "credit", None)[i % 3], "note": f"n{i % 20}"} for i in range(40)]
+    for name, storage in (("ledger", "columnar"), ("plain", "rows")):
+        db.create_table(name, COLUMNS, "transaction_id", storage=storage)
+        db.t(name).insert_many([dict(r) for r in rows])
+        db.t(name).delete("transaction_id", 5)
+        db.t(name).update("transaction_id", 8, {"amount": 99.0})
+    assert db.t("ledger")._store.stats()["columns"]["note"] == "object"
+    return db.t("ledger"), db.t("plain")
+
+
+def ids(rows):
+    return sorted(r["transaction_id"] for r in rows)
+
+
+@pytest.mark.parametrize("where", [
+    "amount > 5",
+    "amount BETWEEN 2 AND 10",
+    "wallet_id IN (1, 3)",
+    "wallet_id NOT IN (1, 3)",
+    "wallet_id NOT IN (1, NULL)",
+    "wallet_id IS NULL",
+    "amount IS NOT NULL AND direction = 'debit'",
+    "direction = 'credit' OR wallet_id = 2",
+    "NOT (direction = 'debit')",
+    "direction LIKE 'cr%'",
+    "note = 'n3'",
+    "wallet_id < amount",
+    "1 = 1",
+])
+def test_batch_scan_matches_the_row_at_a_time_path(tables, where):
+    ledger, plain = tables
+    predicate = Predicate(parse_where(where), COLUMNS)
+    expected = ids(r for r in plain.scan() if predicate.test(r))
+
+    assert ids(BatchScan(ledger, predicate, ["transaction_id"]).records(["transaction_id"])) == expected
+    assert ids(ledger.scan(predicate)) == expected
+    assert ids(ledger.scan(predicate, columns=["transaction_id"])) == expected
+
+
+def test_batch_scan_reads_a_snapshot(db, tables):
+    ledger, _ = tables
+    predicate = Predicate(parse_where("amount >= 99"), COLUMNS)
+    with db.snapshot() as snapshot:
+        ledger.update("transaction_id", 8, {"amount": 1.0})
+        ledger.update("transaction_id", 9, {"amount": 100.0})
+        ledger.insert({"wallet_id": 1, "amount": 500.0, "direction": "debit", "note": "late"})
+
+        seen = BatchScan(ledger, predicate, ["transaction_id", "amount"], snapshot).records(["transaction_id", "amount"])
+        assert sorted(seen, key=lambda r: r["transaction_id"]) == [{"transaction_id": 8, "amount": 99.0}]
+    assert ids(ledger.scan(predicate)) == [9, 41]
+
+
+@pytest.mark.parametrize("group_by", [[], ["direction"], ["wallet_id"]])
+def test_batch_aggregates_match_rows(tables, group_by):
+    ledger, plain = tables
+    items = [{"func": None, "column": c, "alias": c} for c in group_by] + [
+        {"func": func, "column": column, "alias": f"{func}_{column}"}
+        for func, column in (("SUM", "amount"), ("COUNT", None), ("COUNT", "wallet_id"), ("MIN", "amount"), ("MAX", "amount"))
+    ]
+    predicate = Predicate(parse_where("transaction_id > 3"), COLUMNS)
+    key = lambda row: [str(row.get(c)) for c in group_by]
+
+    assert sorted(group_rows(ledger, items, group_by, predicate), key=key) == \
+        sorted(group_rows(plain, items, group_by, predicate), key=key)
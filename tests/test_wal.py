@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from lipafast.db.wal import WriteAheadLog
+
+
+@pytest.fixture
+def wallets(db):
+    db.create_table("wallets", {"wallet_id": int, "balance": float}, "wallet_id")
+    return db.t("wallets")
+
+
+def balances(database):
+    return sorted((w["wallet_id"], w["balance"]) for w in database.t("wallets").scan())
+
+
+def test_committed_writes_replay_after_a_crash(db, wallets, reopen):
+    wallets.insert({"wallet_id": 1, "balance": 100.0})
+    wallets.insert({"wallet_id": 2, "balance": 50.0})
+    wallets.update("wallet_id", 1, {"balance": 60.0})
+    wallets.delete("wallet_id", 2)
+    db = reopen(db)
+
+    assert balances(db) == [(1, 60.0)]
+
+
+def test_every_mutation_appends_one_record_instead_of_rewriting_the_snapshot(db, wallets, path):
+    wallets.insert({"wallet_id": 1, "balance": 100.0})
+    wallets.update("wallet_id", 1, {"balance": 60.0})
+
+    lines = path.with_suffix(".wal").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["op"] for r in records] == ["create_table", "insert", "update"]
+    assert [r["lsn"] for r in records] == [1, 2, 3]
+    assert not path.exists() and not path.with_suffix(".snap").exists()
+
+
+def test_checkpoint_truncates_the_log_and_recovery_starts_from_it(db, wallets, reopen, path):
+    wallets.insert({"wallet_id": 1, "balance": 100.0})
+    db.save()
+    assert path.with_suffix(".wal").read_text() == ""
+
+    wallets.update("wallet_id", 1, {"balance": 75.0})
+    db = reopen(db)
+
+    assert balances(db) == [(1, 75.0)]
+    assert db.wal.lsn == 3  # numbering continues after the checkpoint
+
+
+def test_torn_tail_is_dropped_and_cut_off(db, wallets, reopen, path):
+    wallets.insert({"wallet_id": 1, "balance": 100.0})
+    wal = path.with_suffix(".wal")
+    db = reopen(db)
+    with open(wal, "a") as f:
+        f.write('{"op":"insert","table":"wallets","row":{"wallet_id":2,')  # killed mid-write
+
+    db = reopen(db)
+    assert balances(db) == [(1, 100.0)]
+    db.t("wallets").insert({"wallet_id": 3, "balance": 5.0})
+    assert all(line.endswith("}") for line in wal.read_text().splitlines())
+
+    db = reopen(db)
+    assert balances(db) == [(1, 100.0), (3, 5.0)]
+
+
+def test_unknown_fsync_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown fsync mode"):
+        WriteAheadLog(tmp_path / "db.wal", fsync="sometimes")
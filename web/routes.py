@@ -1,13 +1,17 @@
 from pathlib import Path
-from fastapi import APIRouter, Request, Form, Body
+from typing import Optional
+from fastapi import APIRouter, Request, Form, Body, Response
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-from datetime import datetime
 
 from ..parser.sql_parser import SQLParser
-from ..repl import execute
+from ..repl import execute, execute_page, execute_stream
+from .streaming import stream_rows
 from ..db.sql_logger import log_sql
-from ..db.store import db
+from ..db.store import db, router as shards
+from ..fintech import ledger
+from ..fintech.duplicates import detector
+from ..fintech.reconcile import reconcile
 
 router = APIRouter()
 
@@ -15,109 +19,110 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
 
+# wallet operations run here, or in the shard that owns the wallet (db/shard.py)
+def wallet_op(op, wallet_id, *args):
+    if shards is not None:
+        return shards.call(wallet_id, op.__name__, wallet_id, *args)
+    return op(db, wallet_id, *args)
+
+
 # ================= DASHBOARD =================
+# plain `def`: building the dashboard scans tables (or waits on shards)
 @router.get("/")
-async def dashboard(request: Request):
-    wallets = db.t("wallets").rows
-    ledger = db.t("ledger").rows if "ledger" in db.tables else []
-
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "drivers": wallets,
-            "recent_transactions": ledger[-10:],
-            "total_drivers": len(wallets),
-            "active_drivers": len([w for w in wallets if w["status"] == "active"]),
-            "total_balance": sum(w["balance"] for w in wallets),
-            "total_spent": sum(tx["amount"] for tx in ledger if tx["direction"] == "debit"),
-        }
-    )
+def dashboard(request: Request):
+    context = shards.dashboard() if shards is not None else ledger.dashboard(db)
+    return templates.TemplateResponse("index.html", {"request": request, **context})
 
 
 # ================= CREATE =================
+# wallet routes are plain `def` so FastAPI runs them in its threadpool: they
+# wait on row locks and on the WAL, which must not stall the event loop
 @router.post("/wallet/new")
-async def create_wallet(
+def create_wallet(
     wallet_id: int = Form(...),
     owner: str = Form(...),
     balance: float = Form(...)
 ):
-    wallets = db.t("wallets")
-
-    if wallets.find("wallet_id", wallet_id):
-        return RedirectResponse("/?error=Wallet exists", status_code=303)
-
-    wallets.insert({
-        "wallet_id": wallet_id,
-        "owner": owner,
-        "balance": balance,
-        "status": "active"
-    })
+    try:
+        wallet_op(ledger.open_wallet, wallet_id, owner, balance)
+    except ValueError as e:
+        return RedirectResponse(f"/?error={e}", status_code=303)
 
     return RedirectResponse("/?message=Wallet created", status_code=303)
 
 
 # ================= UPDATE (PUT) =================
 @router.put("/wallet/edit")
-async def edit_wallet(payload: dict = Body(...)):
-    wallets = db.t("wallets")
-
-    wallet = wallets.find("wallet_id", payload["wallet_id"])
-    if not wallet:
-        return JSONResponse({"error": "Wallet not found"}, status_code=404)
-    
-    if "owner" in payload and payload["owner"]:
-        wallet["owner"] = payload["owner"]
-
-    if payload.get("topup", 0) > 0:
-        wallet["balance"] += payload["topup"]
+def edit_wallet(payload: dict = Body(...)):
+    try:
+        wallet_op(ledger.edit_wallet, payload["wallet_id"], payload.get("owner"), payload.get("topup", 0))
+    except LookupError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
 
     return {"message": "Wallet updated"}
 
 
 # ================= DELETE =================
 @router.delete("/wallet/delete")
-async def delete_wallet(payload: dict = Body(...)):
-    wallets = db.t("wallets")
-    wallet = wallets.find("wallet_id", payload["wallet_id"])
-
-    if not wallet:
-        return JSONResponse({"error": "Wallet not found"}, status_code=404)
+def delete_wallet(payload: dict = Body(...)):
+    try:
+        wallet_op(ledger.deactivate_wallet, payload["wallet_id"])
+    except LookupError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
 
-    wallet["status"] = "inactive"
     return {"message": "Wallet deactivated"}
 
 
 # ================= PAY =================
 @router.post("/wallet/pay")
-async def pay_wallet(
+def pay_wallet(
     wallet_id: int = Form(...),
-    amount: int = Form(...)
+    amount: int = Form(...),
+    # a client retrying the same payment sends the same key; the retry is refused
+    idempotency_key: Optional[str] = Form(None)
 ):
-    wallets = db.t("wallets")
-    wallet = wallets.find("wallet_id", wallet_id)
+    # the balance check and the debit happen under the wallet's row lock and
+    # commit together as one WAL write (fintech/ledger.py)
+    try:
+        wallet_op(ledger.pay, wallet_id, amount, idempotency_key)
+    except ValueError as e:
+        return RedirectResponse(f"/?error={e}", status_code=303)
 
-    if not wallet or wallet["status"] != "active":
-        return RedirectResponse("/?error=Wallet inactive", status_code=303)
+    return RedirectResponse("/?message=Payment successful", status_code=303)
 
-    if wallet["balance"] < amount:
-        return RedirectResponse("/?error=Insufficient funds", status_code=303)
 
-    wallet["balance"] -= amount
+# ================= FRAUD =================
+@router.get("/fraud/duplicates")
+def duplicate_payments():
+    # suspected duplicate payments and detector counters (fintech/duplicates.py)
+    return shards.duplicates() if shards is not None else detector.summary()
 
-    db.t("ledger").insert({
-        "wallet_id": wallet_id,
-        "owner": wallet["owner"],
-        "amount": amount,
-        "direction": "debit",
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
 
-    return RedirectResponse("/?message=Payment successful", status_code=303)
+# ================= RECONCILIATION =================
+@router.post("/reconcile")
+def reconcile_balances(payload: dict = Body(default={})):
+    # only ledger rows since the last run are read (fintech/reconcile.py)
+    all_wallets = payload.get("all_wallets", True)
+    return shards.reconcile(all_wallets) if shards is not None else reconcile(db, all_wallets)
+
+
+# ================= BATCH =================
+@router.post("/wallet/batch")
+def batch_wallets(payload: dict = Body(...)):
+    # {"entries": [{"wallet_id": 1, "amount": 500, "direction": "credit"}, ...], "atomic": true}
+    try:
+        entries = [(e["wallet_id"], e["amount"], e.get("direction", "debit")) for e in payload["entries"]]
+    except (KeyError, TypeError):
+        return JSONResponse({"error": "entries must be a list of {wallet_id, amount, direction}"}, status_code=400)
+
+    atomic = payload.get("atomic", True)
+    if shards is not None:
+        return shards.batch(entries, atomic)
+    return ledger.batch(db, entries, atomic)
 
 
 @router.post("/sql")
-def run_sql(payload: dict = Body(...)):
+def run_sql(response: Response, payload: dict = Body(...)):
     sql = payload.get("sql")
 
     if not sql:
@@ -127,9 +132,25 @@ def run_sql(payload: dict = Body(...)):
         )
 
     try:
+        # read-your-writes on a replica: min_lsn is the X-LSN header a write on the primary returned
+        min_lsn = payload.get("min_lsn")
+        if min_lsn is not None and db is not None and not db.wait_for(min_lsn, timeout=5.0):
+            raise ValueError(f"Replica has not caught up to LSN {min_lsn}")
         parsed = SQLParser.parse(sql)
+        if parsed["type"] == "COPY":
+            raise ValueError("COPY reads files on the server and is only available from the REPL")
+        if parsed["type"] in ("BEGIN", "COMMIT", "ROLLBACK"):
+            # transactions belong to one thread; HTTP requests may land on any worker
+            raise ValueError("Transactions are only available from the REPL; /sql runs each statement on its own")
         log_sql(sql, source="HTTP")
-        return execute(parsed)
+        if payload.get("stream"):
+            return stream_rows(execute_stream(parsed, payload.get("params")), payload["stream"])
+        if payload.get("page_size") is not None or payload.get("cursor") is not None:
+            return execute_page(parsed, payload.get("params"), payload.get("page_size") or 100, payload.get("cursor"))
+        result = execute(parsed, payload.get("params"))
+        if db is not None:
+            response.headers["X-LSN"] = str(db.visible_lsn)
+        return result
 
     except Exception as e:
         return JSONResponse(
@@ -0,0 +1,68 @@
+import json
+from itertools import chain, islice
+
+from fastapi.responses import StreamingResponse
+
+# rows serialized per chunk handed to the server; each chunk is only produced
+# once the previous one has been written, so a slow client slows the scan down
+# instead of letting output pile up in memory
+CHUNK_ROWS = 500
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+_END = object()
+
+
+def _encode(row):
+    return json.dumps(row, default=str)
+
+
+def _ndjson(rows):
+    try:
+        while True:
+            batch = list(islice(rows, CHUNK_ROWS))
+            if not batch:
+                break
+            yield "".join(_encode(r) + "\n" for r in batch)
+    except Exception as e:
+        # the status line is already sent; report the failure as the last record
+        yield _encode({"error": str(e)}) + "\n"
+
+
+def _json_array(rows):
+    yield '{"result": ['
+    first = True
+    try:
+        while True:
+            batch = list(islice(rows, CHUNK_ROWS))
+            if not batch:
+                break
+            body = ",".join(_encode(r) for r in batch)
+            yield body if first else "," + body
+            first = False
+        yield "]}"
+    except Exception as e:
+        yield '], "error": ' + json.dumps(str(e)) + "}"
+
+
+def stream_rows(rows, fmt="ndjson"):
+    """
+    Wrap a row iterator in a StreamingResponse (NDJSON lines, or one JSON
+    object whose "result" array is written in chunks). The first row is
+    pulled eagerly so planning errors still surface as a normal 400.
+    """
+    if fmt is True:
+        fmt = "ndjson"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown stream format '{fmt}'. Expected one of: {', '.join(FORMATS)}")
+
+    rows = iter(rows)
+    first = next(rows, _END)
+    if first is not _END:
+        rows = chain([first], rows)
+
+    body = _ndjson(rows) if fmt == "ndjson" else _json_array(rows)
+    return StreamingResponse(body, media_type=FORMATS[fmt])